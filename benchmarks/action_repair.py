@@ -0,0 +1,80 @@
+"""Measures how many invalid LLM actions the action index repairs.
+
+Runs every entry of a corpus of bad sdk calls through the validation stage's
+resolver and compares the result with the expected catalog entry, or with
+a drop when nothing should match. Exits with an error when a repair is
+wrong, since a wrong action ends up in the policy.
+
+    python -m benchmarks.action_repair
+    python -m benchmarks.action_repair --corpus path/to/calls.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from deployment_helper.core.aws_action_index import get_aws_action_index
+
+DEFAULT_CORPUS = os.path.join(
+    os.path.dirname(__file__), "data", "bad_aws_sdk_calls.jsonl"
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        calls = [json.loads(line) for line in f if line.strip()]
+
+    started_at = time.perf_counter()
+    action_index = get_aws_action_index()
+    build_seconds = time.perf_counter() - started_at
+
+    outcomes: Counter[str] = Counter()
+    repairs: Counter[str] = Counter()
+    started_at = time.perf_counter()
+    for call in calls:
+        resolved = action_index.resolve(call["service"], call["action"])
+        found = [f"{entry['service']}:{entry['action']}" for entry in resolved]
+
+        if not resolved:
+            outcome = "dropped" if not call["expected"] else "missed"
+        else:
+            repairs.update(entry["repair"] for entry in resolved)
+            outcome = "repaired" if found == call["expected"] else "wrong"
+
+        outcomes[outcome] += 1
+        if args.verbose or outcome == "wrong":
+            print(
+                f"{outcome:>8}: {call['service']}:{call['action']} -> {found}, "
+                f"expected {call['expected']}"
+            )
+    resolve_seconds = time.perf_counter() - started_at
+
+    repairable = sum(1 for call in calls if call["expected"])
+    print(
+        f"{len(calls)} calls: {outcomes['repaired']}/{repairable} repaired, "
+        f"{outcomes['missed']} missed, {outcomes['dropped']} dropped as expected, "
+        f"{outcomes['wrong']} wrong"
+    )
+    print(
+        "repairs by kind: "
+        + ", ".join(f"{repair}={count}" for repair, count in sorted(repairs.items()))
+    )
+    print(
+        f"index built in {build_seconds * 1000:.0f} ms, "
+        f"{resolve_seconds / len(calls) * 1e6:.0f} us per call"
+    )
+
+    if outcomes["wrong"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
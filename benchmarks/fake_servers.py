@@ -0,0 +1,345 @@
+"""Local aiohttp stand-ins for the GitHub, OpenAI and Cohere APIs.
+
+Each server answers just enough of its API for the pipeline to run, counts
+requests per endpoint and can inject latency, 5xx errors and 429s.
+"""
+
+import asyncio
+import base64
+import dataclasses
+import gzip
+import hashlib
+import io
+import json
+import random
+import re
+import tarfile
+import time
+import uuid
+from collections import Counter
+
+from aiohttp import web
+
+# Action reported for each service found in a prompt's source code.
+AWS_SERVICE_ACTIONS = {
+    "s3": "GetObject",
+    "dynamodb": "GetItem",
+    "sqs": "SendMessage",
+    "sns": "Publish",
+    "ses": "ListTemplates",
+    "lambda": "InvokeFunction",
+}
+
+AWS_DOCUMENT_HINTS = ("aws", "boto3", "S3Client", "SQSClient", "DynamoDBClient")
+
+
+@dataclasses.dataclass
+class FakeServerConfig:
+    latency_seconds: float = 0.0
+    # Share of requests answered with a 500.
+    error_rate: float = 0.0
+    # Share of requests answered with a 429 and a retry-after header.
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 0.05
+    # Throughput of streamed responses such as the tarball, unlimited if 0.
+    bytes_per_second: float = 0.0
+    seed: int = 0
+
+
+def git_blob_sha(data: bytes) -> str:
+    # Kept local so the servers run without importing deployment_helper, whose
+    # import requires API keys and would add to the measured process.
+    return hashlib.sha1(f"blob {len(data)}\0".encode() + data).hexdigest()
+
+
+class FakeServer:
+    upstream: str
+
+    def __init__(self, config: FakeServerConfig):
+        self.config = config
+        self.requests: Counter[str] = Counter()
+        self.responses: Counter[str] = Counter()
+
+        self._random = random.Random(config.seed)
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    def routes(self) -> list[web.RouteDef]:
+        raise NotImplementedError
+
+    def reset(self):
+        self.requests.clear()
+        self.responses.clear()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        endpoint = request.match_info.route.name or "unknown"
+        self.requests[endpoint] += 1
+
+        if self.config.latency_seconds:
+            await asyncio.sleep(self.config.latency_seconds)
+
+        roll = self._random.random()
+        if roll < self.config.rate_limit_rate:
+            response = self.rate_limited()
+        elif roll < self.config.rate_limit_rate + self.config.error_rate:
+            response = web.json_response({"message": "injected error"}, status=500)
+        else:
+            response = await handler(request)
+
+        self.responses[str(response.status)] += 1
+        return response
+
+    def rate_limited(self) -> web.Response:
+        return web.json_response(
+            {"message": "rate limited"},
+            status=429,
+            headers={"retry-after": str(self.config.retry_after_seconds)},
+        )
+
+    async def start(self) -> str:
+        app = web.Application(middlewares=[self._middleware], client_max_size=0)
+        app.add_routes(self.routes())
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+
+        host, port = site._server.sockets[0].getsockname()[:2]  # type: ignore
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class FakeGithub(FakeServer):
+    """Serves one repository through the tree, contents and tarball APIs."""
+
+    upstream = "github"
+
+    def __init__(self, config: FakeServerConfig, files: dict[str, str]):
+        super().__init__(config)
+        self.files = {path: content.encode("utf-8") for path, content in files.items()}
+        self._tarball: bytes | None = None
+
+    def routes(self) -> list[web.RouteDef]:
+        repository = "/repos/{owner}/{repo}"
+        return [
+            web.get(f"{repository}/git/trees/{{ref}}", self.tree, name="tree"),
+            web.get(
+                f"{repository}/contents/{{path:.+}}", self.contents, name="contents"
+            ),
+            web.get(f"{repository}/tarball/{{ref}}", self.tarball, name="tarball"),
+        ]
+
+    async def tree(self, request: web.Request) -> web.Response:
+        owner, repo = request.match_info["owner"], request.match_info["repo"]
+        tree = []
+        for path, data in self.files.items():
+            sha = git_blob_sha(data)
+            tree.append(
+                {
+                    "path": path,
+                    "type": "blob",
+                    "sha": sha,
+                    "size": len(data),
+                    "url": f"{self.url}/repos/{owner}/{repo}/git/blobs/{sha}",
+                }
+            )
+        return web.json_response({"sha": "0" * 40, "tree": tree, "truncated": False})
+
+    async def contents(self, request: web.Request) -> web.Response:
+        data = self.files.get(request.match_info["path"])
+        if data is None:
+            return web.json_response({"message": "Not Found"}, status=404)
+
+        return web.json_response(
+            {
+                "type": "file",
+                "encoding": "base64",
+                "sha": git_blob_sha(data),
+                "size": len(data),
+                "content": base64.b64encode(data).decode("ascii"),
+            }
+        )
+
+    async def tarball(self, request: web.Request) -> web.StreamResponse:
+        if self._tarball is None:
+            self._tarball = self._build_tarball(request.match_info["repo"])
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-gzip"})
+        await response.prepare(request)
+        chunk_size = 64 * 1024
+        for offset in range(0, len(self._tarball), chunk_size):
+            await response.write(self._tarball[offset : offset + chunk_size])
+            if self.config.bytes_per_second:
+                await asyncio.sleep(chunk_size / self.config.bytes_per_second)
+        await response.write_eof()
+        return response
+
+    def _build_tarball(self, repo: str) -> bytes:
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as compressed:
+            with tarfile.open(fileobj=compressed, mode="w") as archive:
+                for path, data in self.files.items():
+                    info = tarfile.TarInfo(f"owner-{repo}-0000000/{path}")
+                    info.size = len(data)
+                    archive.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+
+def _source_section(prompt: str) -> str:
+    return prompt.rpartition("INPUT:")[2]
+
+
+def _services_in(text: str) -> list[str]:
+    lowered = text.lower()
+    return [
+        service
+        for service in AWS_SERVICE_ACTIONS
+        if re.search(rf"\b{service}\b|{service}client|service/{service}", lowered)
+    ]
+
+
+def _file_sections(prompt: str) -> dict[str, str]:
+    sections = re.split(r"^File Path: ", _source_section(prompt), flags=re.MULTILINE)
+    return {
+        section.partition("\n")[0].strip(): section.partition("\n")[2]
+        for section in sections[1:]
+    }
+
+
+def _sdk_calls(source: str) -> list[dict]:
+    return [
+        {
+            "service": service,
+            "action": AWS_SERVICE_ACTIONS[service],
+            "resource": "*",
+            "reasoning": f"{service} client used in the source",
+        }
+        for service in _services_in(source)
+    ]
+
+
+class FakeOpenAI(FakeServer):
+    """Answers chat completions with schema-shaped JSON for each pipeline step."""
+
+    upstream = "openai"
+
+    def __init__(self, config: FakeServerConfig):
+        super().__init__(config)
+        self.tokens: Counter[str] = Counter()
+
+    def reset(self):
+        super().reset()
+        self.tokens.clear()
+
+    def routes(self) -> list[web.RouteDef]:
+        return [web.post("/v1/chat/completions", self.completions, name="completions")]
+
+    def rate_limited(self) -> web.Response:
+        return web.json_response(
+            {
+                "error": {
+                    "message": "Rate limit reached",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded",
+                }
+            },
+            status=429,
+            headers={"retry-after-ms": str(self.config.retry_after_seconds * 1000)},
+        )
+
+    async def completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        schema_name = (
+            body.get("response_format", {}).get("json_schema", {}).get("name", "")
+        )
+
+        content = json.dumps(self._answer(schema_name, prompt))
+
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        self.tokens["prompt"] += prompt_tokens
+        self.tokens["completion"] += completion_tokens
+
+        return web.json_response(
+            {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        )
+
+    def _answer(self, schema_name: str, prompt: str) -> dict:
+        if schema_name == "AwsServices":
+            return {"service_names": _services_in(_source_section(prompt))}
+        if schema_name == "AwsSdkCalls":
+            return {"sdk_calls": _sdk_calls(_source_section(prompt))}
+        if schema_name == "MultiFileAwsServices":
+            return {
+                "files": [
+                    {"file_path": path, "service_names": _services_in(source)}
+                    for path, source in _file_sections(prompt).items()
+                ]
+            }
+        if schema_name == "MultiFileAwsSdkCalls":
+            return {
+                "files": [
+                    {"file_path": path, "sdk_calls": _sdk_calls(source)}
+                    for path, source in _file_sections(prompt).items()
+                ]
+            }
+
+        return {}
+
+
+class FakeCohere(FakeServer):
+    """Scores documents by how many AWS hints they contain."""
+
+    upstream = "cohere"
+
+    def routes(self) -> list[web.RouteDef]:
+        return [web.post("/v2/rerank", self.rerank, name="rerank")]
+
+    async def rerank(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        documents = body["documents"]
+
+        scores = [
+            min(1.0, 0.005 + 0.2 * sum(hint in document for hint in AWS_DOCUMENT_HINTS))
+            for document in documents
+        ]
+        ranked = sorted(range(len(documents)), key=lambda idx: -scores[idx])
+        if body.get("top_n") is not None:
+            ranked = ranked[: body["top_n"]]
+
+        return web.json_response(
+            {
+                "id": uuid.uuid4().hex,
+                "results": [
+                    {"index": idx, "relevance_score": scores[idx]} for idx in ranked
+                ],
+                "meta": {"billed_units": {"search_units": 1}},
+            }
+        )
+
+
+__ALL__ = ["FakeCohere", "FakeGithub", "FakeOpenAI", "FakeServerConfig"]
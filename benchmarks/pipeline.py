@@ -0,0 +1,281 @@
+"""End-to-end benchmark of `generate_iam_policy_from_repository`.
+
+Runs the pipeline against local stand-ins for GitHub, OpenAI and Cohere on
+synthetic repositories of several sizes. Each size runs in a fresh process
+with cold caches, so wall time and peak RSS are not skewed by earlier runs
+or by the fake servers. Results are written as JSON and can be compared
+against an earlier run:
+
+    python -m benchmarks.pipeline --sizes 50 200 1000
+    python -m benchmarks.pipeline --compare benchmarks/results/<earlier>.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.fake_servers import FakeCohere, FakeGithub, FakeOpenAI, FakeServerConfig
+from benchmarks.synthetic_repo import generate_repository
+
+DEFAULT_SIZES = (50, 200, 1000)
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+REPOSITORY_NAME = "benchmark/synthetic"
+
+
+class _StageTotals:
+    def __init__(self):
+        self.totals: dict[str, dict[str, float]] = defaultdict(
+            lambda: {"count": 0, "total_seconds": 0.0}
+        )
+
+    def stage_started(self, name: str):
+        pass
+
+    def stage_finished(self, name: str, started_at: float, duration: float):
+        self.totals[name]["count"] += 1
+        self.totals[name]["total_seconds"] += duration
+
+
+def _peak_rss_kb() -> int:
+    # ru_maxrss survives exec on Linux, so it would report the peak of the
+    # forked benchmark process; VmHWM only covers this program.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_child(output_path: str):
+    """Runs the pipeline once in this process and writes its measurements."""
+    from deployment_helper.core.clients.github import close_github_client
+    from deployment_helper.core.llm_engine import generate_iam_policy_from_repository
+    from deployment_helper.core.stages import track_stages
+
+    stage_totals = _StageTotals()
+
+    async def run() -> tuple[str, float]:
+        with track_stages(stage_totals):
+            started_at = time.perf_counter()
+            try:
+                iam_policy = await generate_iam_policy_from_repository(
+                    github_access_token="benchmark",
+                    cohere_api_key=os.environ["COHERE_API_KEY"],
+                    openai_api_key=os.environ["OPENAI_API_KEY"],
+                    github_repository_name=REPOSITORY_NAME,
+                    github_branch_name="main",
+                )
+            finally:
+                await close_github_client()
+        return iam_policy, time.perf_counter() - started_at
+
+    iam_policy, wall_seconds = asyncio.run(run())
+
+    result = {
+        "wall_seconds": round(wall_seconds, 4),
+        "peak_rss_mb": round(_peak_rss_kb() / 1024, 1),
+        "stages": {
+            name: {
+                "count": totals["count"],
+                "total_seconds": round(totals["total_seconds"], 4),
+            }
+            for name, totals in stage_totals.totals.items()
+        },
+        "policy_statements": len(json.loads(iam_policy).get("Statement", [])),
+    }
+
+    with open(output_path, "w") as f:
+        json.dump(result, f)
+
+
+async def _benchmark_size(size: int, args: argparse.Namespace) -> dict:
+    files = generate_repository(size, aws_density=args.aws_density, seed=args.seed)
+
+    def server_config(seed_offset: int) -> FakeServerConfig:
+        return FakeServerConfig(
+            latency_seconds=args.latency,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            bytes_per_second=args.bandwidth,
+            seed=args.seed + seed_offset,
+        )
+
+    github = FakeGithub(server_config(0), files)
+    openai = FakeOpenAI(server_config(1))
+    cohere = FakeCohere(server_config(2))
+    servers = (github, openai, cohere)
+
+    for server in servers:
+        await server.start()
+
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            output_path = os.path.join(cache_dir, "result.json")
+            env = {
+                **os.environ,
+                "DEPLOYMENT_HELPER_GITHUB_API_URL": github.url,
+                "OPENAI_BASE_URL": f"{openai.url}/v1",
+                "CO_API_URL": cohere.url,
+                "OPENAI_API_KEY": "benchmark",
+                "COHERE_API_KEY": "benchmark",
+                "DEPLOYMENT_HELPER_CACHE_DIR": os.path.join(cache_dir, "cache"),
+                "DEPLOYMENT_HELPER_OPENAI_REQUESTS_PER_MINUTE": str(args.openai_rpm),
+                "DEPLOYMENT_HELPER_OPENAI_TOKENS_PER_MINUTE": str(args.openai_tpm),
+            }
+
+            process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-m",
+                "benchmarks.pipeline",
+                "--child-output",
+                output_path,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(
+                    f"benchmark run for {size} files failed:\n{stderr.decode()}"
+                )
+
+            with open(output_path) as f:
+                result = json.load(f)
+    finally:
+        for server in servers:
+            await server.stop()
+
+    return {
+        "files": size,
+        "source_bytes": sum(len(content) for content in files.values()),
+        **result,
+        "requests": {server.upstream: dict(server.requests) for server in servers},
+        "responses": {server.upstream: dict(server.responses) for server in servers},
+        "tokens": dict(openai.tokens),
+    }
+
+
+def _change(key: str, current_value: float, previous_value: float) -> str:
+    if not previous_value:
+        return f"{key}: {current_value}"
+    percent = 100 * (current_value - previous_value) / previous_value
+    return f"{key}: {previous_value} -> {current_value} ({percent:+.1f}%)"
+
+
+def _compare(baseline: dict, current: dict):
+    baseline_runs = {run["files"]: run for run in baseline["runs"]}
+
+    for run in current["runs"]:
+        previous = baseline_runs.get(run["files"])
+        if previous is None:
+            continue
+
+        changes = [
+            _change(key, run[key], previous[key])
+            for key in ("wall_seconds", "peak_rss_mb")
+        ]
+        changes.append(
+            _change(
+                "prompt_tokens",
+                run["tokens"].get("prompt", 0),
+                previous["tokens"].get("prompt", 0),
+            )
+        )
+        print(f"{run['files']} files | " + " | ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--aws-density", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--bandwidth", type=float, default=0.0, help="bytes per second, 0 is unlimited"
+    )
+    # Pacing limits of the pipeline's OpenAI client; high by default so the
+    # benchmark measures the pipeline rather than the configured quota.
+    parser.add_argument("--openai-rpm", type=int, default=100_000)
+    parser.add_argument("--openai-tpm", type=int, default=100_000_000)
+    parser.add_argument(
+        "--max-peak-rss-mb",
+        type=float,
+        help="exit with an error when a run's peak RSS exceeds this",
+    )
+    parser.add_argument("--output", help="results file, defaults to benchmarks/results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_output:
+        _run_child(args.child_output)
+        return
+
+    runs = []
+    for size in args.sizes:
+        run = asyncio.run(_benchmark_size(size, args))
+        print(
+            f"{size} files: {run['wall_seconds']}s, {run['peak_rss_mb']} MB peak RSS, "
+            f"{sum(run['requests']['openai'].values())} openai requests, "
+            f"{run['tokens'].get('prompt', 0)} prompt tokens"
+        )
+        runs.append(run)
+
+    results = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare", "child_output", "max_peak_rss_mb")
+        },
+        "runs": runs,
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"pipeline-{timestamp}.json")
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            _compare(json.load(f), results)
+
+    if args.max_peak_rss_mb is not None:
+        over_budget = [
+            run for run in runs if run["peak_rss_mb"] > args.max_peak_rss_mb
+        ]
+        for run in over_budget:
+            print(
+                f"{run['files']} files: peak RSS {run['peak_rss_mb']} MB exceeds "
+                f"{args.max_peak_rss_mb} MB"
+            )
+        if over_budget:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Compares prompt sizes with and without source-aware catalog pruning.
+
+Walks a local checkout and, for every source file, builds the service
+detection and sdk calls prompts with the full catalog and with the pruned
+one. Tokens are counted with the model's tokenizer when tiktoken is
+installed, and with the character based estimate the OpenAI client paces
+requests with otherwise.
+
+With `--invoke N`, both prompts of the first N files are also sent to the
+OpenAI API (honouring OPENAI_BASE_URL) one at a time, reporting the prompt
+tokens from the response usage and the median latency of each variant.
+
+    python benchmarks/prompt_pruning.py path/to/checkout --invoke 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import typing as ty
+
+from pydantic import BaseModel
+
+from deployment_helper.core import aws_iam_actions
+from deployment_helper.core.clients import openai
+from deployment_helper.core.clients.openai import estimate_tokens
+from deployment_helper.core.llm_engine import _is_source_code
+from deployment_helper.core.llm_engine.aws_analyzer import (
+    AwsSdkCalls,
+    AwsServices,
+    build_aws_sdk_calls_prompt,
+    build_aws_services_prompt,
+)
+from deployment_helper.core.llm_engine.catalog_pruning import SourceIdentifiers
+
+STAGES: dict[str, type[BaseModel]] = {
+    "services_prompt": AwsServices,
+    "sdk_calls_prompt": AwsSdkCalls,
+}
+
+
+def _iter_source_files(root: str):
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = [name for name in dir_names if not name.startswith(".")]
+        for file_name in file_names:
+            path = os.path.join(dir_path, file_name)
+            if not _is_source_code(path):
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    yield os.path.relpath(path, root), f.read()
+            except (OSError, UnicodeDecodeError):
+                continue
+
+
+def _detected_services(source_code: str) -> dict[str, set[str]]:
+    """Stands in for the service detection stage: services named in the file."""
+    identifiers = SourceIdentifiers(source_code)
+    return {
+        service: actions
+        for service, actions in aws_iam_actions.AWS_SERVICES_MAP.items()
+        if service in identifiers.words or service in identifiers.normalized
+    }
+
+
+def _token_counter() -> tuple[str, ty.Callable[[str], int]]:
+    try:
+        import tiktoken
+    except ImportError:
+        return "estimate", estimate_tokens
+
+    encoding = tiktoken.encoding_for_model(openai.MODEL_NAME)
+    return encoding.name, lambda text: len(encoding.encode(text))
+
+
+class _Invocation(ty.NamedTuple):
+    prompt_tokens: int
+    completion_tokens: int
+    seconds: float
+
+
+async def _invoke(prompt: str, response_format: type[BaseModel]) -> _Invocation:
+    openai_client = openai.get_openai_client(os.environ["OPENAI_API_KEY"])
+
+    started_at = time.perf_counter()
+    completion = await openai_client.request(
+        lambda: openai_client.client.beta.chat.completions.parse(
+            messages=[{"role": "user", "content": prompt}],
+            model=openai.MODEL_NAME,
+            n=1,
+            response_format=response_format,
+        ),
+        estimated_tokens=estimate_tokens(prompt)
+        + openai.OPENAI_ESTIMATED_COMPLETION_TOKENS,
+    )
+    seconds = time.perf_counter() - started_at
+
+    return _Invocation(
+        prompt_tokens=completion.usage.prompt_tokens,
+        completion_tokens=completion.usage.completion_tokens,
+        seconds=seconds,
+    )
+
+
+async def _invoke_prompts(
+    prompts: list[dict[tuple[str, str], str]],
+) -> dict[str, float]:
+    """Sends the prompts one at a time and sums up usage and latency."""
+    # Sequential requests keep client side pacing and concurrency limits out
+    # of the latencies.
+    invocations: dict[tuple[str, str], list[_Invocation]] = {}
+    for idx, file_prompts in enumerate(prompts):
+        # Alternating the variants keeps server side warm-up from favouring
+        # either of them.
+        keys = sorted(file_prompts, reverse=idx % 2 == 1)
+        for key in keys:
+            invocation = await _invoke(file_prompts[key], STAGES[key[0]])
+            invocations.setdefault(key, []).append(invocation)
+
+    results: dict[str, float] = {"invoked_files": len(prompts)}
+    for (stage, variant), stage_invocations in sorted(invocations.items()):
+        prefix = f"{stage}_{variant}"
+        results[f"{prefix}_api_prompt_tokens"] = sum(
+            invocation.prompt_tokens for invocation in stage_invocations
+        )
+        results[f"{prefix}_api_completion_tokens"] = sum(
+            invocation.completion_tokens for invocation in stage_invocations
+        )
+        results[f"{prefix}_latency_median_ms"] = round(
+            1000 * statistics.median(i.seconds for i in stage_invocations), 1
+        )
+
+    for stage in STAGES:
+        full = results[f"{stage}_full_api_prompt_tokens"]
+        pruned = results[f"{stage}_pruned_api_prompt_tokens"]
+        results[f"{stage}_api_reduction_percent"] = (
+            round(100 * (full - pruned) / full, 1) if full else 0.0
+        )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="local checkout to measure")
+    parser.add_argument(
+        "--invoke",
+        type=int,
+        default=0,
+        metavar="N",
+        help="send the prompts of the first N files to the OpenAI API",
+    )
+    args = parser.parse_args()
+
+    token_counter_name, count_tokens = _token_counter()
+    prompts: list[dict[tuple[str, str], str]] = []
+
+    totals: dict[str, ty.Any] = {
+        "token_counter": token_counter_name,
+        "files": 0,
+        "services_prompt_full_tokens": 0,
+        "services_prompt_pruned_tokens": 0,
+        "sdk_calls_prompt_full_tokens": 0,
+        "sdk_calls_prompt_pruned_tokens": 0,
+    }
+    pruning_seconds: list[float] = []
+
+    for file_path, source_code in _iter_source_files(args.path):
+        aws_services = _detected_services(source_code)
+        totals["files"] += 1
+
+        services_prompt_full = build_aws_services_prompt(
+            source_code=source_code, file_path=file_path, prune_catalog=False
+        )
+        sdk_calls_prompt_full = build_aws_sdk_calls_prompt(
+            source_code=source_code,
+            file_path=file_path,
+            aws_services=aws_services,
+            prune_catalog=False,
+        )
+        totals["services_prompt_full_tokens"] += count_tokens(services_prompt_full)
+        totals["sdk_calls_prompt_full_tokens"] += count_tokens(sdk_calls_prompt_full)
+
+        started_at = time.perf_counter()
+        services_prompt = build_aws_services_prompt(
+            source_code=source_code, file_path=file_path
+        )
+        sdk_calls_prompt = build_aws_sdk_calls_prompt(
+            source_code=source_code, file_path=file_path, aws_services=aws_services
+        )
+        pruning_seconds.append(time.perf_counter() - started_at)
+
+        totals["services_prompt_pruned_tokens"] += count_tokens(services_prompt)
+        totals["sdk_calls_prompt_pruned_tokens"] += count_tokens(sdk_calls_prompt)
+
+        if len(prompts) < args.invoke:
+            prompts.append(
+                {
+                    ("services_prompt", "full"): services_prompt_full,
+                    ("services_prompt", "pruned"): services_prompt,
+                    ("sdk_calls_prompt", "full"): sdk_calls_prompt_full,
+                    ("sdk_calls_prompt", "pruned"): sdk_calls_prompt,
+                }
+            )
+
+    for stage in ("services_prompt", "sdk_calls_prompt"):
+        full = totals[f"{stage}_full_tokens"]
+        pruned = totals[f"{stage}_pruned_tokens"]
+        totals[f"{stage}_reduction_percent"] = (
+            round(100 * (full - pruned) / full, 1) if full else 0.0
+        )
+
+    if pruning_seconds:
+        totals["pruning_median_ms"] = round(
+            1000 * statistics.median(pruning_seconds), 3
+        )
+
+    if prompts:
+        totals.update(asyncio.run(_invoke_prompts(prompts)))
+
+    print(json.dumps(totals, indent=2))
+
+
+if __name__ == "__main__":
+    main()
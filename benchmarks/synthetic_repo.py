@@ -0,0 +1,217 @@
+"""Generates synthetic repositories of mixed languages and AWS usage.
+
+Files are modelled on real application code such as the `output.txt` sample
+(a Go SES client): a mix of AWS SDK callers in Python, JavaScript and Go,
+plain application code without AWS usage, and documentation.
+"""
+
+import random
+
+PYTHON_SERVICES = {
+    "s3": ["put_object", "get_object", "delete_object", "list_objects_v2"],
+    "dynamodb": ["put_item", "get_item", "query", "update_item"],
+    "sqs": ["send_message", "receive_message", "delete_message"],
+    "sns": ["publish"],
+    "ses": ["send_email", "list_templates"],
+    "lambda": ["invoke"],
+}
+
+JS_SERVICES = {
+    "s3": ("S3Client", ["PutObjectCommand", "GetObjectCommand"]),
+    "dynamodb": ("DynamoDBClient", ["PutItemCommand", "QueryCommand"]),
+    "sqs": ("SQSClient", ["SendMessageCommand"]),
+    "ses": ("SESClient", ["SendTemplatedEmailCommand", "ListTemplatesCommand"]),
+}
+
+GO_SERVICES = {
+    "ses": ["ListTemplates", "GetTemplate", "DeleteTemplate", "CreateTemplate"],
+    "s3": ["PutObject", "GetObject", "ListObjectsV2"],
+    "sqs": ["SendMessage", "ReceiveMessage"],
+}
+
+
+def _python_aws_file(rng: random.Random, index: int, functions: int) -> str:
+    service = rng.choice(list(PYTHON_SERVICES))
+    lines = [
+        "import logging",
+        "",
+        "import boto3",
+        "",
+        f'client = boto3.client("{service}")',
+        "logger = logging.getLogger(__name__)",
+        "",
+    ]
+    for fn in range(functions):
+        method = rng.choice(PYTHON_SERVICES[service])
+        lines += [
+            "",
+            f"def handle_{service}_{index}_{fn}(resource_name, payload):",
+            f'    """Handles {method} for the {service} resource."""',
+            "    logger.info('processing %s', resource_name)",
+            f"    response = client.{method}(Name=resource_name, Payload=payload)",
+            "    if not response:",
+            "        raise RuntimeError('empty response')",
+            "    return response",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def _python_plain_file(rng: random.Random, index: int, functions: int) -> str:
+    lines = ["import dataclasses", "import json", ""]
+    for fn in range(functions):
+        lines += [
+            "",
+            "@dataclasses.dataclass",
+            f"class Record{index}_{fn}:",
+            "    name: str",
+            "    value: int",
+            "",
+            "    def to_json(self):",
+            "        return json.dumps(dataclasses.asdict(self))",
+            "",
+            f"def merge_{index}_{fn}(left, right):",
+            f"    return {{**left, **right, 'seed': {rng.randint(0, 10_000)}}}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def _js_aws_file(rng: random.Random, index: int, functions: int) -> str:
+    service = rng.choice(list(JS_SERVICES))
+    client_name, commands = JS_SERVICES[service]
+    lines = [
+        f"import {{ {client_name}, {', '.join(commands)} }} "
+        f"from '@aws-sdk/client-{service}';",
+        "",
+        f"const client = new {client_name}({{}});",
+        "",
+    ]
+    for fn in range(functions):
+        command = rng.choice(commands)
+        lines += [
+            f"export async function handle{index}_{fn}(name, payload) {{",
+            f"  const result = await client.send(new {command}({{ Name: name }}));",
+            "  if (!result) {",
+            "    throw new Error('empty response');",
+            "  }",
+            "  return { ...result, payload };",
+            "}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def _js_plain_file(rng: random.Random, index: int, functions: int) -> str:
+    lines = ["import { format } from 'util';", ""]
+    for fn in range(functions):
+        lines += [
+            f"export function render{index}_{fn}(items) {{",
+            "  return items",
+            "    .filter((item) => item.visible)",
+            f"    .map((item) => format('%s-%d', item.name, {rng.randint(0, 99)}));",
+            "}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def _go_aws_file(rng: random.Random, index: int, functions: int) -> str:
+    service = rng.choice(list(GO_SERVICES))
+    lines = [
+        "package repo",
+        "",
+        "import (",
+        '\t"log"',
+        "",
+        '\t"github.com/aws/aws-sdk-go/aws"',
+        '\t"github.com/aws/aws-sdk-go/aws/session"',
+        f'\t"github.com/aws/aws-sdk-go/service/{service}"',
+        ")",
+        "",
+        f"var svc{index} = {service}.New(session.Must(session.NewSession()))",
+        "",
+    ]
+    for fn in range(functions):
+        operation = rng.choice(GO_SERVICES[service])
+        lines += [
+            f"func Handle{index}_{fn}(name *string) error {{",
+            f"\t_, err := svc{index}.{operation}(&{service}.{operation}Input{{",
+            "\t\tName: aws.String(*name),",
+            "\t})",
+            "\tif err != nil {",
+            '\t\tlog.Println("request failed: ", err)',
+            "\t\treturn err",
+            "\t}",
+            "\treturn nil",
+            "}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def _go_plain_file(rng: random.Random, index: int, functions: int) -> str:
+    lines = ["package component", "", 'import "fmt"', ""]
+    for fn in range(functions):
+        lines += [
+            f"func Label{index}_{fn}(name string) string {{",
+            f'\treturn fmt.Sprintf("%s-{rng.randint(0, 99)}", name)',
+            "}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def _markdown_file(rng: random.Random, index: int, functions: int) -> str:
+    paragraphs = [
+        f"## Section {section}\n\nThis module renders the list of templates "
+        "and lets users download or delete them.\n"
+        for section in range(functions)
+    ]
+    return f"# Component {index}\n\n" + "\n".join(paragraphs)
+
+
+_GENERATORS = {
+    "py": (_python_aws_file, _python_plain_file),
+    "js": (_js_aws_file, _js_plain_file),
+    "go": (_go_aws_file, _go_plain_file),
+}
+
+
+def generate_repository(
+    files_count: int,
+    *,
+    aws_density: float = 0.2,
+    large_file_ratio: float = 0.02,
+    seed: int = 0,
+) -> dict[str, str]:
+    """Returns `files_count` source files keyed by path.
+
+    `aws_density` is the share of files calling the AWS SDK and
+    `large_file_ratio` the share of files with hundreds of functions, which
+    exercise chunked analysis.
+    """
+    rng = random.Random(seed)
+    files: dict[str, str] = {}
+
+    for index in range(files_count):
+        functions = rng.randint(2, 12)
+        if rng.random() < large_file_ratio:
+            functions = rng.randint(150, 400)
+
+        if rng.random() < 0.05:
+            files[f"docs/component_{index}.md"] = _markdown_file(rng, index, functions)
+            continue
+
+        extension = rng.choice(list(_GENERATORS))
+        aws_generator, plain_generator = _GENERATORS[extension]
+
+        if rng.random() < aws_density:
+            path = f"src/aws/{extension}/handler_{index}.{extension}"
+            files[path] = aws_generator(rng, index, functions)
+        else:
+            path = f"src/app/{extension}/module_{index}.{extension}"
+            files[path] = plain_generator(rng, index, functions)
+
+    return files
+
+
+__ALL__ = ["generate_repository"]
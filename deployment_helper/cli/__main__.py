@@ -1,31 +1,132 @@
 import asyncio
 import argparse
+import json
+import sys
+import typing as ty
 
-from deployment_helper.core import run_from_cli
+import structlog
+
+from deployment_helper.core import (
+    BATCH_PARALLELISM,
+    run_batch_from_cli,
+    run_from_cli,
+    run_from_local_checkout,
+    run_per_service_from_cli,
+)
 
 parser = argparse.ArgumentParser(
     prog="DeploymentHelperApp",
     description="Constructs iam policy based on your source code.",
 )
 
-parser.add_argument(
-    "--repository", required=True, help="Github Repository for which you want to run."
+source = parser.add_mutually_exclusive_group(required=True)
+source.add_argument(
+    "--repository", help="Github Repository for which you want to run."
+)
+source.add_argument(
+    "--path",
+    help="Local checkout to analyse instead of fetching from Github. "
+    "Files ignored by git are skipped.",
+)
+source.add_argument(
+    "--batch",
+    metavar="FILE",
+    help="File listing one 'owner/repository [branch]' per line, '-' for stdin. "
+    "Prints one JSON line per repository as it finishes.",
 )
 parser.add_argument(
     "--branch",
     required=False,
     default="main",
-    help="Github branch name. default: 'main'",
+    help="Github branch name, also the default in batch mode. default: 'main'",
+)
+parser.add_argument(
+    "--parallelism",
+    type=int,
+    default=BATCH_PARALLELISM,
+    help=f"Repositories analysed at once in batch mode. default: {BATCH_PARALLELISM}",
 )
+parser.add_argument(
+    "--per-service",
+    action="store_true",
+    help="Print one policy per service of a monorepo, with service roots "
+    "detected from serverless.yml, Dockerfile or go.mod files.",
+)
+parser.add_argument(
+    "--service-root",
+    metavar="DIR",
+    action="append",
+    dest="service_roots",
+    help="Service root directory, repeatable. Implies --per-service and "
+    "replaces detection.",
+)
+
+
+def _read_repositories(lines: ty.Iterable[str], default_branch: str):
+    repositories: list[tuple[str, str]] = []
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+
+        repository, _, branch = line.partition(" ")
+        repositories.append((repository, branch.strip() or default_branch))
+
+    return repositories
+
+
+async def _run_batch(repositories: list[tuple[str, str]], parallelism: int) -> int:
+    failed = 0
+    async for result in run_batch_from_cli(
+        repositories=repositories,
+        parallelism=parallelism,
+    ):
+        failed += result["status"] != "ok"
+        print(json.dumps(result), flush=True)
+
+    return failed
 
 
 def main():
     args = parser.parse_args()
 
-    iam_policy = asyncio.run(run_from_cli(
-        github_repository_name=args.repository,
-        github_branch_name=args.branch,
-    ))
+    if args.batch is not None and (args.per_service or args.service_roots):
+        parser.error("--per-service is not supported with --batch")
+
+    if args.batch is not None:
+        # stdout carries the results, so logs go to stderr.
+        structlog.configure(logger_factory=structlog.PrintLoggerFactory(sys.stderr))
+
+        if args.batch == "-":
+            repositories = _read_repositories(sys.stdin, args.branch)
+        else:
+            with open(args.batch) as f:
+                repositories = _read_repositories(f, args.branch)
+
+        failed = asyncio.run(_run_batch(repositories, args.parallelism))
+        sys.exit(1 if failed else 0)
+
+    if args.per_service or args.service_roots:
+        iam_policies = asyncio.run(run_per_service_from_cli(
+            github_repository_name=args.repository,
+            github_branch_name=args.branch,
+            path=args.path,
+            service_roots=args.service_roots,
+        ))
+
+        for service_root, iam_policy in iam_policies.items():
+            print(f"IAM Policy Generated for {service_root or '.'}:")
+
+            print(iam_policy)
+        return
+
+    if args.path is not None:
+        iam_policy = asyncio.run(run_from_local_checkout(path=args.path))
+    else:
+        iam_policy = asyncio.run(run_from_cli(
+            github_repository_name=args.repository,
+            github_branch_name=args.branch,
+        ))
 
     print("IAM Policy Generated:")
 
@@ -34,4 +135,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
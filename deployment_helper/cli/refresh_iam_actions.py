@@ -0,0 +1,33 @@
+import argparse
+
+from deployment_helper.core.aws_iam_actions import (
+    AWS_IAM_ACTIONS_SNAPSHOT_PATH,
+    fetch_aws_iam_actions,
+    write_aws_iam_actions_snapshot,
+)
+
+parser = argparse.ArgumentParser(
+    prog="DeploymentHelperRefreshIamActions",
+    description="Regenerates the bundled AWS IAM action catalog snapshot.",
+)
+
+parser.add_argument(
+    "--output",
+    required=False,
+    default=AWS_IAM_ACTIONS_SNAPSHOT_PATH,
+    help="Snapshot path. default: the snapshot bundled with the package",
+)
+
+
+def main():
+    args = parser.parse_args()
+
+    services = fetch_aws_iam_actions()
+    write_aws_iam_actions_snapshot(services, path=args.output)
+
+    actions_count = sum(len(actions) for actions in services.values())
+    print(f"Wrote {len(services)} services, {actions_count} actions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,26 @@
+import asyncio
 import base64
+import functools
+import json
 import os
+import time
+import typing as ty
 import structlog
 import logging
 
 from deployment_helper.core.clients import github
-from deployment_helper.core.llm_engine import generate_iam_policy_from_repository
+from deployment_helper.core.stages import stage
+from deployment_helper.core.file_sources import (
+    FileSource,
+    GithubRepositorySource,
+    LocalCheckoutSource,
+)
+from deployment_helper.core.llm_engine import (
+    generate_iam_policies_per_service,
+    generate_iam_policy_from_file_source,
+    generate_iam_policy_from_pull_request,
+    generate_iam_policy_from_repository,
+)
 
 structlog.configure(
     wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
@@ -17,40 +33,62 @@ OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
 GITHUB_REPOSITORY_NAME = "regmicmahesh/test-pull-request"
 GITHUB_BRANCH_NAME = "main"
 
+# Repositories analysed at once in batch mode.
+BATCH_PARALLELISM = int(os.environ.get("DEPLOYMENT_HELPER_BATCH_PARALLELISM", 4))
 
-async def run_with_github_apps_installation(
-    *,
-    github_repository_name: str,
-    github_branch_name: str,
-    pull_request_id: int,
-):
+
+class BatchResult(ty.TypedDict):
+    repository: str
+    branch: str
+    status: ty.Literal["ok", "error"]
+    iam_policy: ty.Any | None
+    error: str | None
+    duration_seconds: float
+
+
+@functools.cache
+def _github_app_auth() -> github.GithubAppAuth:
     github_app_private_key_base64 = os.environ["GITHUB_APP_PRIVATE_KEY"]
     github_app_private_key = base64.b64decode(github_app_private_key_base64)
 
     github_app_client_id = os.environ["GITHUB_APP_CLIENT_ID"]
 
-    github_access_token = await github.get_github_apps_access_token(
-        repository_path=github_repository_name,
-        jwt_private_key=github_app_private_key,
+    return github.get_github_app_auth(
         client_id=github_app_client_id,
+        private_key=github_app_private_key,
     )
 
-    iam_policy = await generate_iam_policy_from_repository(
+
+async def run_with_github_apps_installation(
+    *,
+    github_repository_name: str,
+    github_head_sha: str,
+    github_previous_head_sha: str | None = None,
+    pull_request_id: int,
+):
+    with stage("authenticate"):
+        github_access_token = await _github_app_auth().access_token(
+            repository_path=github_repository_name,
+        )
+
+    iam_policy = await generate_iam_policy_from_pull_request(
         github_access_token=github_access_token,
         cohere_api_key=COHERE_API_KEY,
         openai_api_key=OPENAI_API_KEY,
         github_repository_name=github_repository_name,
-        github_branch_name=github_branch_name,
+        github_head_sha=github_head_sha,
+        github_previous_head_sha=github_previous_head_sha,
     )
 
     content = {"body": f"Here is your IAM Policy.\n```json\n{iam_policy}\n```"}
 
-    await github.add_comment_to_github_issue(
-        github_access_token=github_access_token,
-        repository_path=github_repository_name,
-        issue_id=pull_request_id,
-        content=content,
-    )
+    with stage("comment"):
+        await github.add_comment_to_github_issue(
+            github_access_token=github_access_token,
+            repository_path=github_repository_name,
+            issue_id=pull_request_id,
+            content=content,
+        )
 
     return iam_policy
 
@@ -62,12 +100,122 @@ async def run_from_cli(
 ):
     github_access_token = os.environ["GITHUB_TOKEN"]
 
-    iam_policy = await generate_iam_policy_from_repository(
-        github_access_token=github_access_token,
+    try:
+        iam_policy = await generate_iam_policy_from_repository(
+            github_access_token=github_access_token,
+            cohere_api_key=COHERE_API_KEY,
+            openai_api_key=OPENAI_API_KEY,
+            github_repository_name=github_repository_name,
+            github_branch_name=github_branch_name,
+        )
+    finally:
+        await github.close_github_client()
+
+    return iam_policy
+
+
+async def run_from_local_checkout(*, path: str):
+    """Analyses a working tree on disk, without GitHub access."""
+    return await generate_iam_policy_from_file_source(
+        logger=structlog.get_logger().bind(path=path),
         cohere_api_key=COHERE_API_KEY,
         openai_api_key=OPENAI_API_KEY,
-        github_repository_name=github_repository_name,
-        github_branch_name=github_branch_name,
+        file_source=LocalCheckoutSource(path=path),
     )
 
-    return iam_policy
+
+async def run_per_service_from_cli(
+    *,
+    github_repository_name: str | None = None,
+    github_branch_name: str = "main",
+    path: str | None = None,
+    service_roots: list[str] | None = None,
+) -> dict[str, str]:
+    """Analyses a monorepo once, returning a policy per service root."""
+    file_source: FileSource
+    if path is not None:
+        logger = structlog.get_logger().bind(path=path)
+        file_source = LocalCheckoutSource(path=path)
+    else:
+        logger = structlog.get_logger().bind(
+            repository_name=github_repository_name,
+            branch_name=github_branch_name,
+        )
+        file_source = GithubRepositorySource(
+            github_access_token=os.environ["GITHUB_TOKEN"],
+            repository_path=github_repository_name,
+            branch_name=github_branch_name,
+        )
+
+    try:
+        return await generate_iam_policies_per_service(
+            logger=logger,
+            cohere_api_key=COHERE_API_KEY,
+            openai_api_key=OPENAI_API_KEY,
+            file_source=file_source,
+            service_roots=service_roots,
+        )
+    finally:
+        await github.close_github_client()
+
+
+async def run_batch_from_cli(
+    *,
+    logger=structlog.get_logger(),
+    repositories: ty.Iterable[tuple[str, str]],
+    parallelism: int = BATCH_PARALLELISM,
+) -> ty.AsyncIterator[BatchResult]:
+    """Analyses many repositories in one process, yielding each as it finishes.
+
+    Repositories share the process-wide clients and caches. A failure is
+    reported in that repository's result and does not stop the others.
+    """
+    github_access_token = os.environ["GITHUB_TOKEN"]
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def run(repository: str, branch: str) -> BatchResult:
+        async with semaphore:
+            started_at = time.perf_counter()
+            try:
+                iam_policy = await generate_iam_policy_from_repository(
+                    logger=logger,
+                    github_access_token=github_access_token,
+                    cohere_api_key=COHERE_API_KEY,
+                    openai_api_key=OPENAI_API_KEY,
+                    github_repository_name=repository,
+                    github_branch_name=branch,
+                )
+            except Exception as e:
+                logger.error(
+                    "repository analysis failed",
+                    repository_name=repository,
+                    branch_name=branch,
+                    exc_info=e,
+                )
+                return BatchResult(
+                    repository=repository,
+                    branch=branch,
+                    status="error",
+                    iam_policy=None,
+                    error=f"{type(e).__name__}: {e}",
+                    duration_seconds=round(time.perf_counter() - started_at, 3),
+                )
+
+            return BatchResult(
+                repository=repository,
+                branch=branch,
+                status="ok",
+                iam_policy=json.loads(iam_policy),
+                error=None,
+                duration_seconds=round(time.perf_counter() - started_at, 3),
+            )
+
+    tasks = [asyncio.create_task(run(*repository)) for repository in repositories]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await github.close_github_client()
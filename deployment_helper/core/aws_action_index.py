@@ -0,0 +1,350 @@
+import functools
+import re
+import typing as ty
+from collections import defaultdict
+
+from deployment_helper.core import aws_iam_actions
+
+# boto3 service names whose IAM prefix differs from the service name.
+BOTO3_SERVICE_PREFIXES = {
+    "apigatewayv2": "apigateway",
+    "apigatewaymanagementapi": "execute-api",
+    "bedrock-runtime": "bedrock",
+    "bedrock-agent-runtime": "bedrock",
+    "dynamodbstreams": "dynamodb",
+    "elb": "elasticloadbalancing",
+    "elbv2": "elasticloadbalancing",
+    "iot-data": "iot",
+    "lex-runtime": "lex",
+    "lexv2-runtime": "lex",
+    "s3control": "s3",
+    "sagemaker-runtime": "sagemaker",
+    "sesv2": "ses",
+    "stepfunctions": "states",
+    "timestream-query": "timestream",
+    "timestream-write": "timestream",
+}
+
+# Client methods whose IAM actions cannot be derived from the method name.
+METHOD_ACTION_OVERRIDES: dict[tuple[str, str], tuple[str, ...]] = {
+    ("s3", "copy"): ("GetObject", "PutObject"),
+    ("s3", "copy_object"): ("GetObject", "PutObject"),
+    ("s3", "upload_part_copy"): ("GetObject", "PutObject"),
+    ("s3", "complete_multipart_upload"): ("PutObject",),
+    ("s3", "create_multipart_upload"): ("PutObject",),
+    ("s3", "delete_objects"): ("DeleteObject",),
+    ("s3", "download_file"): ("GetObject",),
+    ("s3", "download_fileobj"): ("GetObject",),
+    ("s3", "get_bucket_lifecycle_configuration"): ("GetLifecycleConfiguration",),
+    ("s3", "get_bucket_notification_configuration"): ("GetBucketNotification",),
+    ("s3", "head_bucket"): ("ListBucket",),
+    ("s3", "head_object"): ("GetObject",),
+    ("s3", "list_buckets"): ("ListAllMyBuckets",),
+    ("s3", "list_multipart_uploads"): ("ListBucketMultipartUploads",),
+    ("s3", "list_object_versions"): ("ListBucketVersions",),
+    ("s3", "list_objects"): ("ListBucket",),
+    ("s3", "list_objects_v2"): ("ListBucket",),
+    ("s3", "put_bucket_lifecycle_configuration"): ("PutLifecycleConfiguration",),
+    ("s3", "put_bucket_notification_configuration"): ("PutBucketNotification",),
+    ("s3", "select_object_content"): ("GetObject",),
+    ("s3", "upload_file"): ("PutObject",),
+    ("s3", "upload_fileobj"): ("PutObject",),
+    ("s3", "upload_part"): ("PutObject",),
+    ("sqs", "change_message_visibility_batch"): ("ChangeMessageVisibility",),
+    ("sqs", "delete_message_batch"): ("DeleteMessage",),
+    ("sqs", "send_message_batch"): ("SendMessage",),
+    ("lambda", "invoke"): ("InvokeFunction",),
+    ("lambda", "invoke_with_response_stream"): ("InvokeFunction",),
+}
+
+# Other spellings of service names models use, besides the boto3 ones.
+SERVICE_ALIASES = {
+    "cloudwatchevents": "events",
+    "cloudwatchlogs": "logs",
+    "efs": "elasticfilesystem",
+    "elasticsearch": "es",
+    "emr": "elasticmapreduce",
+    "eventbridge": "events",
+    "kinesisfirehose": "firehose",
+    "pinpoint": "mobiletargeting",
+    "sfn": "states",
+}
+
+# Suffixes SDKs add to operation names, e.g. GetObjectCommand in the
+# JavaScript SDK or getObjectAsync in the Java one.
+_OPERATION_SUFFIXES = ("command", "async", "request", "input", "withcontext")
+
+_SERVICE_AFFIXES = re.compile(r"^(amazon|aws)|client$")
+
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9*?]")
+
+# Distinct service and action pairs whose resolution is remembered; model
+# output is unbounded, so old entries are dropped.
+RESOLVED_CACHE_SIZE = 4096
+
+Repair = ty.Literal["exact", "normalized", "method", "service", "fuzzy", "wildcard"]
+
+
+class ResolvedAwsAction(ty.TypedDict):
+    service: str
+    action: str
+    # How the action was matched, "exact" when it was valid as given.
+    repair: Repair
+
+
+def _key(name: str) -> str:
+    """Folds case and style, so GetObject, get_object and getObject match."""
+    return _NON_ALPHANUMERIC.sub("", name.lower())
+
+
+def _action_keys(action: str) -> list[str]:
+    """Returns the action's key, then the keys without an SDK suffix."""
+    key = _key(action)
+    return [key] + [
+        key.removesuffix(suffix)
+        for suffix in _OPERATION_SUFFIXES
+        if key.endswith(suffix) and key != suffix
+    ]
+
+
+def _edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance, or max_distance + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+
+    return previous[-1]
+
+
+def _max_edit_distance(key: str) -> int:
+    # Short names are too close to each other to correct more than one edit.
+    return 1 if len(key) < 12 else 2
+
+
+def _closest(key: str, candidates: ty.Iterable[str]) -> str | None:
+    """Returns the single closest candidate within the allowed distance."""
+    max_distance = _max_edit_distance(key)
+
+    best: list[str] = []
+    best_distance = max_distance + 1
+    for candidate in candidates:
+        distance = _edit_distance(key, candidate, max_distance)
+        if distance < best_distance:
+            best, best_distance = [candidate], distance
+        elif distance == best_distance and distance <= max_distance:
+            best.append(candidate)
+
+    # Ties are ambiguous, e.g. GetObject for a misspelled PutObject.
+    return best[0] if len(best) == 1 else None
+
+
+class AwsActionIndex:
+    """Lookup structures over the IAM actions catalog, built once.
+
+    Resolves service and action names as language models and SDKs write
+    them to the catalog's spelling: case and separators are ignored, SDK
+    suffixes are stripped, SDK methods named unlike their IAM action are
+    mapped, a wrong service prefix is corrected when the action exists in
+    one matching service only, small typos are fixed when a single catalog
+    entry is close enough, and wildcards are expanded to the actions they
+    match.
+    """
+
+    def __init__(self, services_map: ty.Mapping[str, ty.Iterable[str]]):
+        self.services_map = services_map
+
+        self._services: dict[str, str] = {_key(name): name for name in services_map}
+        self._services.update(
+            (_key(alias), service)
+            for alias, service in {**BOTO3_SERVICE_PREFIXES, **SERVICE_ALIASES}.items()
+            if service in services_map
+        )
+
+        self._actions: dict[str, dict[str, str]] = {
+            service: {_key(action): action for action in actions}
+            for service, actions in services_map.items()
+        }
+
+        self._method_actions: dict[tuple[str, str], tuple[str, ...]] = {
+            (service, _key(method)): actions
+            for (service, method), actions in METHOD_ACTION_OVERRIDES.items()
+        }
+
+        # SDK method names fold to the same key as their action, so this is
+        # also the reverse map from a method name to the services offering it.
+        self._action_services: dict[str, list[str]] = defaultdict(list)
+        for service, actions in sorted(self._actions.items()):
+            for key in actions:
+                self._action_services[key].append(service)
+
+        self._resolve_cached = functools.lru_cache(maxsize=RESOLVED_CACHE_SIZE)(
+            self._resolve
+        )
+
+    def resolve_service(self, service: str) -> str | None:
+        key = _key(service)
+        found = self._services.get(key) or self._services.get(
+            _SERVICE_AFFIXES.sub("", key)
+        )
+        if found is not None:
+            return found
+
+        closest = _closest(key, self._services) if len(key) > 3 else None
+        return self._services[closest] if closest is not None else None
+
+    def lookup(self, service: str, action: str) -> str | None:
+        """Returns the catalog spelling of an action, ignoring case and style."""
+        actions = self._actions.get(service)
+        if actions is None:
+            return None
+
+        for key in _action_keys(action):
+            found = actions.get(key)
+            if found is not None:
+                return found
+
+        return None
+
+    def services_for_method(self, method: str) -> list[str]:
+        """Returns the services offering an action named like the SDK method."""
+        for key in _action_keys(method):
+            services = self._action_services.get(key)
+            if services:
+                return list(services)
+
+        return []
+
+    def expand(self, service: str, pattern: str) -> list[str]:
+        """Returns the actions of a service matched by a wildcard pattern."""
+        regex = re.compile(
+            ".*".join(map(re.escape, pattern.split("*"))).replace(r"\?", "."),
+            re.IGNORECASE,
+        )
+        return sorted(
+            action
+            for action in self.services_map.get(service, ())
+            if regex.fullmatch(action)
+        )
+
+    def is_valid(self, service: str, action: str) -> bool:
+        return action in self.services_map.get(service, ())
+
+    def resolve(self, service: str, action: str) -> list[ResolvedAwsAction]:
+        """Maps a possibly invalid service and action to catalog entries.
+
+        Usually returns a single entry, several for SDK methods that need
+        more than one action, and none when nothing matches unambiguously.
+        """
+        return list(self._resolve_cached(service, action))
+
+    def _resolve(self, service: str, action: str) -> list[ResolvedAwsAction]:
+        if self.is_valid(service, action):
+            return [ResolvedAwsAction(service=service, action=action, repair="exact")]
+
+        # Models sometimes put the prefix in the action, e.g. "s3:getObject",
+        # or the client, e.g. "s3.put_object".
+        action = action.strip()
+        if ":" in action:
+            prefix, _, action = action.rpartition(":")
+            service = prefix if self.resolve_service(prefix) else service
+        action = action.rpartition(".")[2]
+
+        resolved_service = self.resolve_service(service)
+
+        if "*" in action or "?" in action:
+            # A wildcard naming no action, such as "*", grants the whole
+            # service, which the code never needs.
+            if resolved_service is None or not action.strip("*?"):
+                return []
+            expanded = self.expand(resolved_service, action)
+            if len(expanded) == len(self._actions[resolved_service]):
+                return []
+            return [
+                ResolvedAwsAction(
+                    service=resolved_service, action=found, repair="wildcard"
+                )
+                for found in expanded
+            ]
+
+        if resolved_service is not None:
+            found = self.lookup(resolved_service, action)
+            if found is not None:
+                return [
+                    ResolvedAwsAction(
+                        service=resolved_service, action=found, repair="normalized"
+                    )
+                ]
+
+            for key in _action_keys(action):
+                method_actions = self._method_actions.get((resolved_service, key))
+                if method_actions is not None:
+                    return [
+                        ResolvedAwsAction(
+                            service=resolved_service, action=found, repair="method"
+                        )
+                        for found in method_actions
+                    ]
+
+        # Prefer services named like the requested one, e.g. s3express for
+        # an "s3" action that only exists there.
+        candidates = self.services_for_method(action)
+        service_key = _key(service)
+        related = [
+            candidate
+            for candidate in candidates
+            if service_key
+            and (_key(candidate) in service_key or service_key in _key(candidate))
+        ]
+        if len(related) == 1 or len(candidates) == 1:
+            found_service = related[0] if len(related) == 1 else candidates[0]
+            found = self.lookup(found_service, action)
+            if found is not None:
+                return [
+                    ResolvedAwsAction(
+                        service=found_service, action=found, repair="service"
+                    )
+                ]
+
+        if resolved_service is not None:
+            actions = self._actions[resolved_service]
+            closest = _closest(_key(action), actions)
+            if closest is not None:
+                return [
+                    ResolvedAwsAction(
+                        service=resolved_service,
+                        action=actions[closest],
+                        repair="fuzzy",
+                    )
+                ]
+
+        return []
+
+
+@functools.cache
+def get_aws_action_index() -> AwsActionIndex:
+    return AwsActionIndex(aws_iam_actions.AWS_SERVICES_MAP)
+
+
+__ALL__ = [
+    "AwsActionIndex",
+    "BOTO3_SERVICE_PREFIXES",
+    "METHOD_ACTION_OVERRIDES",
+    "RESOLVED_CACHE_SIZE",
+    "ResolvedAwsAction",
+    "SERVICE_ALIASES",
+    "get_aws_action_index",
+]
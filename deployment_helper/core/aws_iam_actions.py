@@ -1,11 +1,26 @@
-import requests
+import datetime
+import functools
+import gzip
 import json
+import os
+import sys
 
 IAM_POLICIES_URL = "https://awspolicygen.s3.amazonaws.com/js/policies.js"
 
+# Versioned snapshot of the catalog shipped with the package. Regenerate it
+# with `deployment-helper-refresh-iam-actions`.
+AWS_IAM_ACTIONS_SNAPSHOT_PATH = os.path.join(
+    os.path.dirname(__file__), "data", "aws_iam_actions.json.gz"
+)
+AWS_IAM_ACTIONS_SNAPSHOT_FORMAT = 1
 
-def _extract_all_iam_service_actions():
-    resp = requests.get(IAM_POLICIES_URL)
+
+def fetch_aws_iam_actions() -> dict[str, list[str]]:
+    """Downloads the policy generator catalog and returns actions per service."""
+    import requests
+
+    resp = requests.get(IAM_POLICIES_URL, timeout=60)
+    resp.raise_for_status()
 
     # Strip out the part which is "app.PolicyEditorConfig={"
     valid_text = resp.text[23:]
@@ -14,16 +29,94 @@ def _extract_all_iam_service_actions():
 
     service_map = resp_json["serviceMap"]
 
-    services: dict[str, set[str]] = {}
+    services: dict[str, list[str]] = {}
     for _, svc_item in service_map.items():
-        services[svc_item["StringPrefix"]] = set(svc_item["Actions"])
+        services[svc_item["StringPrefix"]] = sorted(set(svc_item["Actions"]))
 
     return services
 
 
-AWS_SERVICES_MAP = _extract_all_iam_service_actions()
+def write_aws_iam_actions_snapshot(
+    services: dict[str, list[str]],
+    *,
+    source: str = IAM_POLICIES_URL,
+    path: str = AWS_IAM_ACTIONS_SNAPSHOT_PATH,
+):
+    """Writes a byte-stable snapshot, only the version changes between runs."""
+    snapshot = {
+        "format": AWS_IAM_ACTIONS_SNAPSHOT_FORMAT,
+        "version": datetime.date.today().isoformat(),
+        "source": source,
+        "services": {
+            service: sorted(actions) for service, actions in sorted(services.items())
+        },
+    }
+
+    data = json.dumps(snapshot, separators=(",", ":")).encode("utf-8")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+
+
+def _read_aws_iam_actions_snapshot() -> dict:
+    with gzip.open(AWS_IAM_ACTIONS_SNAPSHOT_PATH, "rb") as f:
+        snapshot = json.loads(f.read())
+
+    if snapshot["format"] != AWS_IAM_ACTIONS_SNAPSHOT_FORMAT:
+        raise ValueError(
+            f"unsupported aws iam actions snapshot format: {snapshot['format']}"
+        )
+
+    return snapshot
+
+
+@functools.cache
+def _load_aws_iam_actions() -> tuple[str, dict[str, set[str]]]:
+    """Returns the snapshot version and the actions of every service prefix.
+
+    Only the derived map is kept; the decoded snapshot is dropped as soon
+    as it has been converted.
+    """
+    snapshot = _read_aws_iam_actions_snapshot()
+
+    # Action names repeat across services (e.g. "TagResource"); interning
+    # keeps a single copy of each per process.
+    services = {
+        service: {sys.intern(action) for action in actions}
+        for service, actions in snapshot["services"].items()
+    }
+    return snapshot["version"], services
+
+
+def load_aws_services_map() -> dict[str, set[str]]:
+    """Returns the actions of every service prefix, loaded on first use."""
+    return _load_aws_iam_actions()[1]
+
+
+@functools.cache
+def load_aws_service_names() -> list[str]:
+    return [el for el in load_aws_services_map()]
+
+
+def get_aws_iam_actions_snapshot_version() -> str:
+    return _load_aws_iam_actions()[0]
+
+
+def __getattr__(name: str):
+    # AWS_SERVICES_MAP and AWS_SERVICE_NAMES are loaded lazily so importing
+    # this module does not pay for reading the catalog.
+    if name == "AWS_SERVICES_MAP":
+        return load_aws_services_map()
+    if name == "AWS_SERVICE_NAMES":
+        return load_aws_service_names()
 
-AWS_SERVICE_NAMES = [el for el in AWS_SERVICES_MAP]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-__ALL__ = ["AWS_SERVICES_MAP", "AWS_SERVICE_NAMES", "is_valid_aws_service_action"]
+__ALL__ = [
+    "AWS_SERVICES_MAP",
+    "AWS_SERVICE_NAMES",
+    "load_aws_services_map",
+    "load_aws_service_names",
+]
@@ -0,0 +1,208 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import typing as ty
+
+import structlog
+
+from deployment_helper.core.metrics import CACHE_LOOKUPS_TOTAL
+
+CACHE_DIR = os.environ.get(
+    "DEPLOYMENT_HELPER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "deployment-helper"),
+)
+
+BLOB_CACHE_MAX_SIZE_BYTES = int(
+    os.environ.get("DEPLOYMENT_HELPER_BLOB_CACHE_MAX_SIZE", 512 * 1024 * 1024)
+)
+
+# Eviction trims the cache down to this fraction of the maximum size so it
+# does not run again on the very next write.
+_EVICTION_LOW_WATERMARK = 0.9
+
+
+class BlobCacheStats(ty.TypedDict):
+    hits: int
+    misses: int
+    hit_ratio: float
+
+
+def git_blob_sha(data: bytes) -> str:
+    """Returns the git blob SHA-1 of `data`, the same value GitHub reports."""
+    header = f"blob {len(data)}\0".encode()
+    return hashlib.sha1(header + data).hexdigest()
+
+
+class BlobCache:
+    """On-disk cache of file contents keyed by git blob SHA.
+
+    Blobs are immutable, so entries never go stale; the cache only has to
+    bound its size. Writes go through a temporary file and an atomic rename,
+    which makes it safe for several worker processes to share one directory.
+    Reads refresh the file mtime, and eviction drops the least recently used
+    blobs first. Eviction runs in a background thread after every
+    `max_size_bytes / 16` written, so writers never wait for its scan.
+    """
+
+    def __init__(
+        self,
+        *,
+        logger=structlog.get_logger(),
+        directory: str = os.path.join(CACHE_DIR, "blobs"),
+        max_size_bytes: int = BLOB_CACHE_MAX_SIZE_BYTES,
+    ):
+        self.logger = logger
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._bytes_since_eviction = 0
+        self._eviction_thread: threading.Thread | None = None
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.directory, sha[:2], sha[2:])
+
+    def __contains__(self, sha: str) -> bool:
+        return os.path.exists(self._blob_path(sha))
+
+    def get(self, sha: str) -> bytes | None:
+        path = self._blob_path(sha)
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = None
+
+        if data is not None and git_blob_sha(data) != sha:
+            self.logger.warning("discarding corrupted blob cache entry", sha=sha)
+            self._unlink(path)
+            data = None
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                CACHE_LOOKUPS_TOTAL.inc(cache="blob", result="miss")
+                return None
+            self.hits += 1
+            CACHE_LOOKUPS_TOTAL.inc(cache="blob", result="hit")
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return data
+
+    def put(self, sha: str, data: bytes):
+        path = self._blob_path(sha)
+        if os.path.exists(path):
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._bytes_since_eviction += len(data)
+            if self._bytes_since_eviction < self.max_size_bytes // 16:
+                return
+            if self._eviction_thread is not None and self._eviction_thread.is_alive():
+                return
+
+            self._bytes_since_eviction = 0
+            self._eviction_thread = threading.Thread(
+                target=self.evict, name="blob-cache-eviction", daemon=True
+            )
+            self._eviction_thread.start()
+
+    def evict(self):
+        """Deletes least recently used blobs until the cache fits its budget."""
+        lock_path = os.path.join(self.directory, ".evict.lock")
+
+        with open(lock_path, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is already evicting.
+                return
+
+            entries: list[tuple[float, int, str]] = []
+            total_size = 0
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+
+            if total_size <= self.max_size_bytes:
+                return
+
+            target_size = self.max_size_bytes * _EVICTION_LOW_WATERMARK
+            evicted_count = 0
+            for _, size, path in sorted(entries):
+                if total_size <= target_size:
+                    break
+                self._unlink(path)
+                total_size -= size
+                evicted_count += 1
+
+            self.logger.info(
+                "evicted blobs from cache",
+                evicted_count=evicted_count,
+                cache_size=total_size,
+            )
+
+    def stats(self) -> BlobCacheStats:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return BlobCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                hit_ratio=self.hits / lookups if lookups else 0.0,
+            )
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+_blob_cache: BlobCache | None = None
+
+
+def get_blob_cache() -> BlobCache | None:
+    """Returns the process-wide blob cache, or None when it is disabled."""
+    global _blob_cache
+
+    if BLOB_CACHE_MAX_SIZE_BYTES <= 0:
+        return None
+
+    if _blob_cache is None:
+        _blob_cache = BlobCache()
+
+    return _blob_cache
+
+
+__ALL__ = ["BlobCache", "get_blob_cache", "git_blob_sha"]
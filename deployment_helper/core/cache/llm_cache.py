@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing as ty
+
+import structlog
+
+from deployment_helper.core.cache.blob_cache import CACHE_DIR
+from deployment_helper.core.metrics import CACHE_LOOKUPS_TOTAL
+
+# "use" reads and writes the cache, "bypass" ignores it entirely and
+# "refresh" skips reads but stores the fresh responses.
+CacheMode = ty.Literal["use", "bypass", "refresh"]
+
+
+
+def _cache_mode(value: str) -> CacheMode:
+    if value not in ty.get_args(CacheMode):
+        raise ValueError(
+            f"unknown llm cache mode {value!r},"
+            f" expected one of {', '.join(ty.get_args(CacheMode))}"
+        )
+    return ty.cast(CacheMode, value)
+
+
+LLM_CACHE_MODE = _cache_mode(
+    os.environ.get("DEPLOYMENT_HELPER_LLM_CACHE_MODE", "use")
+)
+LLM_CACHE_TTL_SECONDS = int(
+    os.environ.get("DEPLOYMENT_HELPER_LLM_CACHE_TTL", 30 * 24 * 60 * 60)
+)
+LLM_CACHE_MAX_SIZE_BYTES = int(
+    os.environ.get("DEPLOYMENT_HELPER_LLM_CACHE_MAX_SIZE", 256 * 1024 * 1024)
+)
+
+# Eviction runs after this many writes rather than on every one.
+_EVICTION_INTERVAL_WRITES = 100
+_EVICTION_LOW_WATERMARK = 0.9
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def llm_cache_key(
+    *,
+    model_name: str,
+    prompt_template: str,
+    source_code: str,
+    **prompt_inputs: ty.Any,
+) -> str:
+    """Builds a cache key from everything that shapes an LLM response.
+
+    The prompt template is part of the key, so editing a prompt invalidates
+    every entry produced with the old wording.
+    """
+    key_material = json.dumps(
+        {
+            "model_name": model_name,
+            "prompt_template": _sha256(prompt_template),
+            "source_code": _sha256(source_code),
+            "prompt_inputs": prompt_inputs,
+        },
+        sort_keys=True,
+        default=sorted,
+    )
+    return _sha256(key_material)
+
+
+class LlmCacheStats(ty.TypedDict):
+    hits: int
+    misses: int
+    hit_ratio: float
+
+
+class LlmCache:
+    """SQLite cache of serialized structured LLM responses.
+
+    Entries expire after `ttl_seconds`, and the least recently used ones are
+    evicted once the stored responses exceed `max_size_bytes`. Lookups block
+    on SQLite, so async callers run them in a thread.
+    """
+
+    def __init__(
+        self,
+        *,
+        logger=structlog.get_logger(),
+        path: str = os.path.join(CACHE_DIR, "llm_cache.sqlite3"),
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        max_size_bytes: int = LLM_CACHE_MAX_SIZE_BYTES,
+    ):
+        self.logger = logger
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_eviction = 0
+        # The connection is shared by the threads lookups run in.
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS llm_responses_accessed_at"
+            " ON llm_responses (accessed_at)"
+        )
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM llm_responses WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                CACHE_LOOKUPS_TOTAL.inc(cache="llm", result="miss")
+                return None
+
+            self.hits += 1
+            CACHE_LOOKUPS_TOTAL.inc(cache="llm", result="hit")
+            self._connection.execute(
+                "UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_responses"
+                " (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+
+            self._writes_since_eviction += 1
+            if self._writes_since_eviction < _EVICTION_INTERVAL_WRITES:
+                return
+            self._writes_since_eviction = 0
+
+        self.evict()
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones over budget."""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        self._connection.execute(
+            "DELETE FROM llm_responses WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+
+        (total_size,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_responses"
+        ).fetchone()
+
+        if total_size <= self.max_size_bytes:
+            return
+
+        excess_size = total_size - self.max_size_bytes * _EVICTION_LOW_WATERMARK
+
+        # Delete the least recently used entries until the excess is covered.
+        self._connection.execute(
+            """
+            DELETE FROM llm_responses WHERE key IN (
+                SELECT key FROM (
+                    SELECT
+                        key,
+                        size,
+                        SUM(size) OVER (ORDER BY accessed_at, key) AS running_size
+                    FROM llm_responses
+                ) WHERE running_size - size < ?
+            )
+            """,
+            (excess_size,),
+        )
+
+        self.logger.info("evicted entries from llm cache", total_size=total_size)
+
+    def stats(self) -> LlmCacheStats:
+        lookups = self.hits + self.misses
+        return LlmCacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=self.hits / lookups if lookups else 0.0,
+        )
+
+
+_llm_cache: LlmCache | None = None
+
+
+def get_llm_cache() -> LlmCache:
+    """Returns the process-wide LLM response cache, opening it on first use."""
+    global _llm_cache
+
+    if _llm_cache is None:
+        _llm_cache = LlmCache()
+
+    return _llm_cache
+
+
+__ALL__ = [
+    "CacheMode",
+    "LLM_CACHE_MODE",
+    "LlmCache",
+    "get_llm_cache",
+    "llm_cache_key",
+]
@@ -1,17 +1,41 @@
+import asyncio
 import typing as ty
 import cohere
 import structlog
 
+from deployment_helper.core.metrics import UPSTREAM_REQUESTS_TOTAL
+
 RERANKER_MODEL_NAME = "rerank-v3.5"
 
+# The rerank API accepts at most this many documents per request; larger
+# document lists are split into batches reranked in parallel.
+RERANKER_MAX_DOCUMENTS_PER_REQUEST = 1000
+RERANKER_MAX_CONCURRENT_REQUESTS = 8
+
 
 class RankedText(ty.TypedDict):
     rank: int
+    # Position of the text in the `documents` passed to the reranker.
+    index: int
     content: str
     relevance_score: float
 
 
-def rerank_documents(
+_clients: dict[str, cohere.AsyncClientV2] = {}
+
+
+def get_cohere_client(api_key: str) -> cohere.AsyncClientV2:
+    """Returns a process-wide async client for `api_key`, reused across calls."""
+    client = _clients.get(api_key)
+
+    if client is None:
+        client = cohere.AsyncClientV2(api_key=api_key)  # type: ignore
+        _clients[api_key] = client
+
+    return client
+
+
+async def rerank_documents(
     *,
     logger=structlog.get_logger(),
     api_key: str,
@@ -19,27 +43,65 @@ def rerank_documents(
     documents: list[str],
     top_n: int | None = None,
     relevance_score_threshold: float,
+    batch_size: int = RERANKER_MAX_DOCUMENTS_PER_REQUEST,
 ) -> list[RankedText]:
+    """Reranks documents without blocking the event loop.
+
+    Batches are scored independently and merged into a single ranking by
+    relevance score before `top_n` and `relevance_score_threshold` apply.
+    """
     logger.info(
         "invoking cohere api for reranking",
         document_count=len(documents),
     )
 
-    co = cohere.ClientV2(api_key=api_key)  # type: ignore
+    if not documents:
+        return []
+
+    co = get_cohere_client(api_key)
+    semaphore = asyncio.Semaphore(RERANKER_MAX_CONCURRENT_REQUESTS)
+
+    async def rerank_batch(offset: int) -> list[tuple[int, float]]:
+        batch = documents[offset : offset + batch_size]
+
+        async with semaphore:
+            try:
+                response = await co.rerank(
+                    model=RERANKER_MODEL_NAME,
+                    query=query,
+                    documents=batch,
+                    # The global top_n can only come from each batch's own top_n.
+                    top_n=min(top_n, len(batch)) if top_n is not None else None,
+                )
+            except cohere.core.ApiError as e:
+                UPSTREAM_REQUESTS_TOTAL.inc(upstream="cohere", status=e.status_code)
+                raise
+            except Exception:
+                UPSTREAM_REQUESTS_TOTAL.inc(upstream="cohere", status="error")
+                raise
+
+        UPSTREAM_REQUESTS_TOTAL.inc(upstream="cohere", status=200)
+
+        return [(offset + r.index, r.relevance_score) for r in response.results]
+
+    batch_results = await asyncio.gather(
+        *(rerank_batch(offset) for offset in range(0, len(documents), batch_size))
+    )
 
-    response = co.rerank(
-        model=RERANKER_MODEL_NAME,
-        query=query,
-        documents=documents,
-        top_n=top_n,
+    ranked_results = sorted(
+        (result for results in batch_results for result in results),
+        key=lambda result: (-result[1], result[0]),
     )
 
     ranked_texts = [
         RankedText(
-            rank=r.index, content=documents[r.index], relevance_score=r.relevance_score
+            rank=rank,
+            index=index,
+            content=documents[index],
+            relevance_score=relevance_score,
         )
-        for r in response.results
-        if r.relevance_score >= relevance_score_threshold
+        for rank, (index, relevance_score) in enumerate(ranked_results[:top_n])
+        if relevance_score >= relevance_score_threshold
     ]
 
     return ranked_texts
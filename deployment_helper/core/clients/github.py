@@ -2,22 +2,134 @@ import time
 import typing as ty
 import asyncio
 import base64
+import contextlib
+import datetime
+import io
+import os
+import queue
+import tarfile
+import threading
+import zlib
 
 import structlog
 import aiohttp
 from jwt import JWT, jwk_from_pem
 
-GITHUB_API_URL = "https://api.github.com"
+from deployment_helper.core.cache.blob_cache import (
+    BlobCache,
+    get_blob_cache,
+    git_blob_sha,
+)
+from deployment_helper.core.metrics import UPSTREAM_REQUESTS_TOTAL
+from deployment_helper.core.stages import stage
+
+GITHUB_API_URL = os.environ.get(
+    "DEPLOYMENT_HELPER_GITHUB_API_URL", "https://api.github.com"
+)
+
+# Connection pool and concurrency limits shared by every call in this module.
+GITHUB_MAX_CONNECTIONS_PER_HOST = 32
+GITHUB_MAX_IN_FLIGHT_REQUESTS = 64
+
+# Archive streaming: network chunk size and how many chunks / parsed files may
+# be buffered between the event loop and the tar parsing thread.
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+ARCHIVE_MAX_BUFFERED_CHUNKS = 16
+ARCHIVE_MAX_BUFFERED_FILES = 64
+
+# In "auto" mode the tarball is only downloaded when more than this many files
+# are missing from the blob cache; fewer misses go through the contents API.
+ARCHIVE_MIN_MISSING_FILES = 50
+
+FetchMode = ty.Literal["auto", "archive", "contents"]
+
+# GitHub App JWTs live at most ten minutes; they and installation tokens are
+# renewed this long before they expire so no request races the expiry.
+GITHUB_APP_JWT_TTL_SECONDS = 600
+GITHUB_APP_JWT_REFRESH_MARGIN_SECONDS = 60
+GITHUB_INSTALLATION_TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+
+class GithubClient:
+    """Long-lived GitHub HTTP client.
+
+    Owns a single keep-alive connection pool (limited per host) and caps the
+    number of requests in flight so large fan-outs queue up instead of opening
+    thousands of sockets at once.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_connections_per_host: int = GITHUB_MAX_CONNECTIONS_PER_HOST,
+        max_in_flight_requests: int = GITHUB_MAX_IN_FLIGHT_REQUESTS,
+    ):
+        self.max_connections_per_host = max_connections_per_host
+        self.max_in_flight_requests = max_in_flight_requests
+
+        self._session: aiohttp.ClientSession | None = None
+        self._semaphore = asyncio.Semaphore(max_in_flight_requests)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=0,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=30,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
 
+        return self._session
 
-def _create_jwt_key(jwt_private_key: bytes, client_id: str) -> str:
-    instance = JWT()
+    @contextlib.asynccontextmanager
+    async def request(
+        self, method: str, url: str, **kwargs: ty.Any
+    ) -> ty.AsyncIterator[aiohttp.ClientResponse]:
+        async with self._semaphore:
+            # Requests that never got a response count as "error".
+            status: int | str = "error"
+            try:
+                async with self.session.request(method, url, **kwargs) as response:
+                    status = response.status
+                    yield response
+            finally:
+                UPSTREAM_REQUESTS_TOTAL.inc(upstream="github", status=status)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_github_client: GithubClient | None = None
+
+
+def get_github_client() -> GithubClient:
+    """Returns the process-wide GitHub client, creating it on first use."""
+    global _github_client
 
-    signing_key = jwk_from_pem(jwt_private_key)
+    if _github_client is None:
+        _github_client = GithubClient()
+
+    return _github_client
+
+
+async def close_github_client():
+    global _github_client
+
+    if _github_client is not None:
+        await _github_client.close()
+        _github_client = None
+
+
+def _create_jwt_key(signing_key: ty.Any, client_id: str, expires_at: int) -> str:
+    instance = JWT()
 
     payload = {
-        "iat": int(time.time()),
-        "exp": int(time.time()) + 600,
+        # Backdated to allow for clock drift, as GitHub recommends.
+        "iat": int(time.time()) - 60,
+        "exp": expires_at,
         "iss": client_id,
     }
 
@@ -26,37 +138,207 @@ def _create_jwt_key(jwt_private_key: bytes, client_id: str) -> str:
     return encoded_jwt
 
 
-async def get_github_apps_access_token(
-    *,
-    repository_path: str,
-    jwt_private_key: bytes,
-    client_id: str,
-) -> str:
-    jwt_key = _create_jwt_key(jwt_private_key, client_id)
+class GithubAppAuth:
+    """Caches everything needed to authenticate as a GitHub App installation.
+
+    The private key is parsed once, the app JWT is reused until shortly
+    before it expires, installation ids are remembered per repository and
+    installation tokens are kept until shortly before their expiry.
+    Concurrent callers share a single refresh.
+    """
+
+    def __init__(
+        self,
+        *,
+        logger=structlog.get_logger(),
+        client_id: str,
+        private_key: bytes,
+    ):
+        self.logger = logger
+        self.client_id = client_id
+
+        self._signing_key = jwk_from_pem(private_key)
+        self._jwt: str | None = None
+        self._jwt_expires_at = 0
+
+        self._installation_ids: dict[str, int] = {}
+        self._installation_tokens: dict[int, tuple[str, float]] = {}
+        self._refreshes: dict[tuple[str, ty.Any], asyncio.Task] = {}
+
+    def app_jwt(self) -> str:
+        now = time.time()
+        if self._jwt is None or now >= (
+            self._jwt_expires_at - GITHUB_APP_JWT_REFRESH_MARGIN_SECONDS
+        ):
+            self._jwt_expires_at = int(now) + GITHUB_APP_JWT_TTL_SECONDS
+            self._jwt = _create_jwt_key(
+                self._signing_key, self.client_id, self._jwt_expires_at
+            )
 
-    installation_info_url = f"{GITHUB_API_URL}/repos/{repository_path}/installation"
+        return self._jwt
 
-    headers = {
-        "Accept": "application/vnd.github+json",
-        "Authorization": f"Bearer {jwt_key}",
-    }
+    async def access_token(
+        self,
+        *,
+        repository_path: str,
+        github_client: GithubClient | None = None,
+    ) -> str:
+        github_client = github_client or get_github_client()
+
+        for attempt in range(2):
+            installation_id = await self._installation_id(
+                repository_path=repository_path,
+                github_client=github_client,
+            )
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(installation_info_url, headers=headers) as response:
+            token = self._installation_tokens.get(installation_id)
+            if token is not None and time.time() < (
+                token[1] - GITHUB_INSTALLATION_TOKEN_REFRESH_MARGIN_SECONDS
+            ):
+                return token[0]
+
+            try:
+                return await self._single_flight(
+                    ("token", installation_id),
+                    lambda: self._create_installation_token(
+                        installation_id=installation_id,
+                        github_client=github_client,
+                    ),
+                )
+            except aiohttp.ClientResponseError as e:
+                if e.status != 404 or attempt > 0:
+                    raise
+
+            # The app was reinstalled under a new installation id.
+            self.logger.info(
+                "installation not found, looking it up again",
+                repository_path=repository_path,
+                installation_id=installation_id,
+            )
+            self._installation_ids.pop(repository_path, None)
+            self._installation_tokens.pop(installation_id, None)
+
+        raise AssertionError("unreachable")
+
+    async def _installation_id(
+        self,
+        *,
+        repository_path: str,
+        github_client: GithubClient,
+    ) -> int:
+        if (installation_id := self._installation_ids.get(repository_path)) is None:
+            installation_id = await self._single_flight(
+                ("installation", repository_path),
+                lambda: self._fetch_installation_id(
+                    repository_path=repository_path,
+                    github_client=github_client,
+                ),
+            )
+
+        return installation_id
+
+    async def _single_flight(
+        self,
+        key: tuple[str, ty.Any],
+        create: ty.Callable[[], ty.Awaitable[ty.Any]],
+    ) -> ty.Any:
+        task = self._refreshes.get(key)
+        if task is None:
+            task = asyncio.ensure_future(create())
+            self._refreshes[key] = task
+            task.add_done_callback(lambda _: self._refreshes.pop(key, None))
+
+        # Shielded so a cancelled caller does not cancel the shared refresh.
+        return await asyncio.shield(task)
+
+    async def _fetch_installation_id(
+        self,
+        *,
+        repository_path: str,
+        github_client: GithubClient,
+    ) -> int:
+        headers = {
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"Bearer {self.app_jwt()}",
+        }
+
+        installation_info_url = (
+            f"{GITHUB_API_URL}/repos/{repository_path}/installation"
+        )
+
+        async with github_client.request(
+            "GET", installation_info_url, headers=headers
+        ) as response:
             response.raise_for_status()
             data = await response.json()
 
-        installation_id = data["id"]
+        self._installation_ids[repository_path] = data["id"]
+        return data["id"]
+
+    async def _create_installation_token(
+        self,
+        *,
+        installation_id: int,
+        github_client: GithubClient,
+    ) -> str:
+        headers = {
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"Bearer {self.app_jwt()}",
+        }
 
         installation_token_url = (
             f"{GITHUB_API_URL}/app/installations/{installation_id}/access_tokens"
         )
 
-        async with session.post(installation_token_url, headers=headers) as response:
+        async with github_client.request(
+            "POST", installation_token_url, headers=headers
+        ) as response:
             response.raise_for_status()
             data = await response.json()
 
-    return data["token"]
+        expires_at = datetime.datetime.fromisoformat(data["expires_at"]).timestamp()
+        self._installation_tokens[installation_id] = (data["token"], expires_at)
+
+        self.logger.info(
+            "created github installation token",
+            installation_id=installation_id,
+            expires_at=data["expires_at"],
+        )
+        return data["token"]
+
+
+_github_app_auths: dict[tuple[str, bytes], GithubAppAuth] = {}
+
+
+def get_github_app_auth(*, client_id: str, private_key: bytes) -> GithubAppAuth:
+    """Returns the process-wide auth cache for a GitHub App."""
+    key = (client_id, private_key)
+
+    if key not in _github_app_auths:
+        _github_app_auths[key] = GithubAppAuth(
+            client_id=client_id,
+            private_key=private_key,
+        )
+
+    return _github_app_auths[key]
+
+
+async def get_github_apps_access_token(
+    *,
+    repository_path: str,
+    jwt_private_key: bytes,
+    client_id: str,
+    github_client: GithubClient | None = None,
+) -> str:
+    github_app_auth = get_github_app_auth(
+        client_id=client_id,
+        private_key=jwt_private_key,
+    )
+
+    return await github_app_auth.access_token(
+        repository_path=repository_path,
+        github_client=github_client,
+    )
 
 
 async def add_comment_to_github_issue(
@@ -65,7 +347,10 @@ async def add_comment_to_github_issue(
     repository_path: str,
     issue_id: int,
     content: ty.Any,
+    github_client: GithubClient | None = None,
 ):
+    github_client = github_client or get_github_client()
+
     headers = {
         "Accept": "application/vnd.github+json",
         "Authorization": f"Bearer {github_access_token}",
@@ -73,22 +358,30 @@ async def add_comment_to_github_issue(
 
     base_url = f"{GITHUB_API_URL}/repos/{repository_path}/issues/{issue_id}/comments"
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            base_url,
-            headers=headers,
-            json=content,
-        ) as response:
-            response.raise_for_status()
+    async with github_client.request(
+        "POST",
+        base_url,
+        headers=headers,
+        json=content,
+    ) as response:
+        response.raise_for_status()
 
 
 class GithubFile(ty.TypedDict):
     path: str
     url: str
     size: ty.NotRequired[int]
+    sha: ty.NotRequired[str]
     content: ty.NotRequired[str]
 
 
+def _decode_file_content(github_file: GithubFile, data: bytes):
+    try:
+        github_file["content"] = data.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+
+
 async def _fetch_github_file(
     *,
     logger=structlog.get_logger(),
@@ -96,10 +389,34 @@ async def _fetch_github_file(
     repository_path: str,
     branch_name: str,
     file_path: str,
-    file_size: int,
+    file_size: int | None = None,
     file_url: str,
+    file_sha: str | None = None,
+    github_client: GithubClient,
+    blob_cache: BlobCache | None = None,
 ) -> GithubFile:
     logger = logger.bind(path=file_path)
+
+    github_file: GithubFile = {
+        "path": file_path,
+        "url": file_url,
+    }
+
+    if file_size is not None:
+        github_file["size"] = file_size
+
+    if file_sha is not None:
+        github_file["sha"] = file_sha
+
+        cached_data = (
+            await asyncio.to_thread(blob_cache.get, file_sha) if blob_cache else None
+        )
+        if cached_data is not None:
+            logger.debug("obtained file content from blob cache")
+            github_file.setdefault("size", len(cached_data))
+            _decode_file_content(github_file, cached_data)
+            return github_file
+
     logger.info("invoking github api to obtain file content")
 
     headers = {
@@ -110,10 +427,9 @@ async def _fetch_github_file(
     # https://docs.github.com/en/rest/repos/contents?apiVersion=2022-11-28
     base_url = f"{GITHUB_API_URL}/repos/{repository_path}/contents/{file_path}?ref={branch_name}"
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(base_url, headers=headers) as response:
-            response.raise_for_status()
-            data = await response.json()
+    async with github_client.request("GET", base_url, headers=headers) as response:
+        response.raise_for_status()
+        data = await response.json()
 
     logger.debug(
         "obtained file content response from github api",
@@ -121,30 +437,382 @@ async def _fetch_github_file(
         status_code=response.status,
     )
 
-    github_file: GithubFile = {
-        "path": file_path,
-        "size": file_size,
-        "url": file_url,
+    if isinstance(data, dict):
+        content = base64.b64decode(data["content"])
+        github_file.setdefault("size", len(content))
+        if blob_cache is not None and "sha" in data:
+            await asyncio.to_thread(blob_cache.put, data["sha"], content)
+        _decode_file_content(github_file, content)
+
+    return github_file
+
+
+class _ArchiveAborted(Exception):
+    pass
+
+
+class _ChunkReader(io.RawIOBase):
+    """Blocking, read-only file object over chunks fed from the event loop."""
+
+    def __init__(self, chunks: queue.Queue[bytes | None], stop: threading.Event):
+        self._chunks = chunks
+        self._stop = stop
+        self._buffer = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer and not self._eof:
+            if self._stop.is_set():
+                raise _ArchiveAborted()
+            try:
+                chunk = self._chunks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer = memoryview(chunk)
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def _put_until_stopped(
+    target: queue.Queue, item: ty.Any, stop: threading.Event
+) -> None:
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _read_archive_members(
+    *,
+    reader: _ChunkReader,
+    repository_path: str,
+    file_filter: ty.Callable,
+    emit: ty.Callable[[GithubFile], None],
+    stop: threading.Event,
+    blob_cache: BlobCache | None,
+):
+    with tarfile.open(fileobj=reader, mode="r|gz") as archive:
+        while (member := archive.next()) is not None:
+            # TarFile indexes every member it reads, which a stream never
+            # revisits; dropping them keeps large archives out of memory.
+            archive.members.clear()
+
+            if stop.is_set():
+                return
+
+            if not member.isfile():
+                continue
+
+            # Every entry is prefixed with a "<owner>-<repo>-<sha>/" directory.
+            _, _, file_path = member.name.partition("/")
+            if not file_path or not file_filter(file_path):
+                continue
+
+            extracted = archive.extractfile(member)
+            if extracted is None:
+                continue
+
+            data = extracted.read()
+            sha = git_blob_sha(data)
+
+            github_file: GithubFile = {
+                "path": file_path,
+                "size": member.size,
+                "url": f"{GITHUB_API_URL}/repos/{repository_path}/git/blobs/{sha}",
+                "sha": sha,
+            }
+            _decode_file_content(github_file, data)
+
+            if blob_cache is not None:
+                blob_cache.put(sha, data)
+
+            emit(github_file)
+
+
+async def iter_github_repository_archive(
+    *,
+    logger=structlog.get_logger(),
+    github_access_token: str,
+    repository_path: str,
+    branch_name: str = "main",
+    file_filter: ty.Callable = lambda _: True,
+    github_client: GithubClient | None = None,
+    blob_cache: BlobCache | None = None,
+) -> ty.AsyncIterator[GithubFile]:
+    """Streams the branch tarball and yields the files that pass `file_filter`.
+
+    The archive is never held in memory: network chunks are handed to a tar
+    parsing thread through a bounded queue, and parsed files come back through
+    another bounded queue as they are found.
+    """
+    github_client = github_client or get_github_client()
+
+    headers = {
+        "Accept": "application/vnd.github+json",
+        "Authorization": f"Bearer {github_access_token}",
     }
 
-    if isinstance(data, dict):
-        content_encoded = data["content"]
+    # https://docs.github.com/en/rest/repos/contents?apiVersion=2022-11-28#download-a-repository-archive-tar
+    base_url = f"{GITHUB_API_URL}/repos/{repository_path}/tarball/{branch_name}"
+
+    logger.info("streaming repository archive from github api")
+
+    loop = asyncio.get_running_loop()
+    stop = threading.Event()
+    chunks: queue.Queue[bytes | None] = queue.Queue(ARCHIVE_MAX_BUFFERED_CHUNKS)
+    files: asyncio.Queue[GithubFile | None] = asyncio.Queue()
+    file_slots = threading.Semaphore(ARCHIVE_MAX_BUFFERED_FILES)
+
+    def emit(github_file: GithubFile):
+        file_slots.acquire()
+        if not stop.is_set():
+            loop.call_soon_threadsafe(files.put_nowait, github_file)
+
+    def parse():
         try:
-            github_file["content"] = base64.b64decode(content_encoded).decode("utf-8")
-        except UnicodeDecodeError:
+            _read_archive_members(
+                reader=_ChunkReader(chunks, stop),
+                repository_path=repository_path,
+                file_filter=file_filter,
+                emit=emit,
+                stop=stop,
+                blob_cache=blob_cache,
+            )
+        except _ArchiveAborted:
             pass
+        except BaseException:
+            # Unblock the downloader, nobody is reading its chunks anymore.
+            stop.set()
+            raise
+        finally:
+            loop.call_soon_threadsafe(files.put_nowait, None)
+
+    async def download():
+        try:
+            async with github_client.request(
+                "GET", base_url, headers=headers
+            ) as response:
+                response.raise_for_status()
+
+                async for chunk in response.content.iter_chunked(ARCHIVE_CHUNK_SIZE):
+                    if stop.is_set():
+                        break
+                    await loop.run_in_executor(
+                        None, _put_until_stopped, chunks, chunk, stop
+                    )
+        finally:
+            await loop.run_in_executor(None, _put_until_stopped, chunks, None, stop)
+
+    download_task = asyncio.ensure_future(download())
+    parse_future = loop.run_in_executor(None, parse)
+
+    file_count = 0
+    try:
+        while (github_file := await files.get()) is not None:
+            file_slots.release()
+            file_count += 1
+            yield github_file
+
+        # Surface download and tar errors once the stream has been drained.
+        await download_task
+        await parse_future
+    finally:
+        stop.set()
+        file_slots.release()
+        if not download_task.done():
+            download_task.cancel()
+        await asyncio.gather(download_task, parse_future, return_exceptions=True)
+
+    logger.info("streamed repository archive from github api", files_count=file_count)
+
+
+async def iter_github_repository_files(
+    *,
+    logger=structlog.get_logger(),
+    github_access_token: str,
+    repository_path: str,
+    branch_name: str = "main",
+    file_filter: ty.Callable = lambda _: True,
+    fetch_mode: FetchMode = "auto",
+    github_client: GithubClient | None = None,
+    blob_cache: BlobCache | None = None,
+) -> ty.AsyncIterator[GithubFile]:
+    """Yields the repository files that pass `file_filter` as they arrive.
+
+    "archive" streams the branch tarball, "contents" lists the tree and fetches
+    each file through the contents API, reusing blobs from the blob cache.
+    "auto" lists the tree first and only streams the tarball when too many
+    blobs are missing from the cache. When the tarball cannot be read, the
+    files it did not yield are fetched through the contents API.
+    """
+    github_client = github_client or get_github_client()
+    blob_cache = blob_cache or get_blob_cache()
+
+    archive_complete = False
+    archive_paths: set[str] = set()
+
+    async def stream_archive() -> ty.AsyncIterator[GithubFile]:
+        nonlocal archive_complete
+        archive = iter_github_repository_archive(
+            logger=logger,
+            github_access_token=github_access_token,
+            repository_path=repository_path,
+            branch_name=branch_name,
+            file_filter=file_filter,
+            github_client=github_client,
+            blob_cache=blob_cache,
+        )
+        try:
+            async with contextlib.aclosing(archive):
+                # Only the fetch is timed, not the time consumers hold a file.
+                while True:
+                    with stage("file_fetch", logger=logger):
+                        github_file = await anext(archive, None)
+                    if github_file is None:
+                        break
+                    archive_paths.add(github_file["path"])
+                    yield github_file
+            archive_complete = True
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            tarfile.TarError,
+            # A truncated or corrupted gzip stream.
+            EOFError,
+            zlib.error,
+        ) as e:
+            logger.warning(
+                "failed to fetch repository archive, falling back to contents api",
+                error=str(e),
+                archive_files_count=len(archive_paths),
+            )
 
-    return github_file
+    async def fetch_tree() -> list[dict[str, ty.Any]]:
+        with stage("tree_fetch", logger=logger):
+            return await _fetch_github_repository_tree(
+                logger=logger,
+                github_access_token=github_access_token,
+                repository_path=repository_path,
+                branch_name=branch_name,
+                file_filter=file_filter,
+                github_client=github_client,
+            )
 
+    tree_entries = None
 
-async def fetch_github_repository_files(
+    if fetch_mode == "archive":
+        async for github_file in stream_archive():
+            yield github_file
+        if archive_complete:
+            return
+
+    if fetch_mode == "auto":
+        tree_entries = await fetch_tree()
+
+        def count_missing(entries: list[dict[str, ty.Any]]) -> int:
+            return sum(
+                1
+                for entry in entries
+                if blob_cache is None or entry["sha"] not in blob_cache
+            )
+
+        missing_count = await asyncio.to_thread(count_missing, tree_entries)
+        logger.info(
+            "checked blob cache for repository files",
+            files_count=len(tree_entries),
+            missing_count=missing_count,
+        )
+
+        if missing_count > ARCHIVE_MIN_MISSING_FILES:
+            # Large listings are not kept while the archive streams, the tree
+            # is listed again if the archive fails.
+            tree_entries = None
+
+            async for github_file in stream_archive():
+                yield github_file
+            if archive_complete:
+                return
+
+    if tree_entries is None:
+        tree_entries = await fetch_tree()
+
+    # Concurrency is bounded by the client, so this fan-out queues up on its
+    # semaphore rather than opening one socket per file.
+    fetches = [
+        asyncio.ensure_future(
+            _fetch_github_file(
+                logger=logger,
+                github_access_token=github_access_token,
+                repository_path=repository_path,
+                branch_name=branch_name,
+                file_path=entry["path"],
+                file_size=entry["size"],
+                file_url=entry["url"],
+                file_sha=entry["sha"],
+                github_client=github_client,
+                blob_cache=blob_cache,
+            )
+        )
+        for entry in tree_entries
+        if entry["path"] not in archive_paths
+    ]
+    try:
+        for fetch in asyncio.as_completed(fetches):
+            with stage("file_fetch", logger=logger):
+                github_file = await fetch
+            yield github_file
+    finally:
+        for fetch in fetches:
+            fetch.cancel()
+        await asyncio.gather(*fetches, return_exceptions=True)
+
+    if blob_cache is not None:
+        logger.info("blob cache statistics", **blob_cache.stats())
+
+
+async def list_github_repository_paths(
     *,
     logger=structlog.get_logger(),
     github_access_token: str,
     repository_path: str,
     branch_name: str = "main",
-    file_filter: ty.Callable = lambda _: True,
-) -> list[GithubFile]:
+    github_client: GithubClient | None = None,
+) -> list[str]:
+    """Lists the paths of every file in the repository, without contents."""
+    with stage("tree_fetch", logger=logger):
+        tree_entries = await _fetch_github_repository_tree(
+            logger=logger,
+            github_access_token=github_access_token,
+            repository_path=repository_path,
+            branch_name=branch_name,
+            file_filter=lambda _: True,
+            github_client=github_client or get_github_client(),
+        )
+
+    return [entry["path"] for entry in tree_entries]
+
+
+async def _fetch_github_repository_tree(
+    *,
+    logger=structlog.get_logger(),
+    github_access_token: str,
+    repository_path: str,
+    branch_name: str,
+    file_filter: ty.Callable,
+    github_client: GithubClient,
+) -> list[dict[str, ty.Any]]:
     headers = {
         "Accept": "application/vnd.github+json",
         "Authorization": f"Bearer {github_access_token}",
@@ -160,30 +828,116 @@ async def fetch_github_repository_files(
         "obtaining file list from github api",
     )
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(base_url, headers=headers) as response:
-            response.raise_for_status()
-            data = await response.json()
+    async with github_client.request("GET", base_url, headers=headers) as response:
+        response.raise_for_status()
+        data = await response.json()
 
+    logger.info(
+        "obtained file list from github api",
+        status_code=response.status,
+    )
+
+    return [
+        entry
+        for entry in data["tree"]
+        if (entry["type"] == "blob") and file_filter(entry["path"])
+    ]
+
+
+class ChangedFile(ty.TypedDict):
+    path: str
+    status: str
+    sha: ty.NotRequired[str]
+    previous_path: ty.NotRequired[str]
+
+
+# The compare API lists at most this many files, larger diffs are truncated.
+GITHUB_COMPARE_MAX_FILES = 300
+
+
+async def fetch_github_changed_files(
+    *,
+    logger=structlog.get_logger(),
+    github_access_token: str,
+    repository_path: str,
+    base_ref: str,
+    head_ref: str,
+    github_client: GithubClient | None = None,
+) -> list[ChangedFile] | None:
+    """Lists files changed between `base_ref` and `head_ref`.
+
+    Returns None when the list cannot be trusted for an incremental update:
+    the head does not descend from the base (e.g. after a force push) or the
+    diff is too large for the compare API to list completely.
+    """
+    github_client = github_client or get_github_client()
+
+    headers = {
+        "Accept": "application/vnd.github+json",
+        "Authorization": f"Bearer {github_access_token}",
+    }
+
+    # https://docs.github.com/en/rest/commits/commits?apiVersion=2022-11-28#compare-two-commits
+    # Files are not paginated, the response lists up to
+    # GITHUB_COMPARE_MAX_FILES of them.
+    base_url = (
+        f"{GITHUB_API_URL}/repos/{repository_path}/compare/{base_ref}...{head_ref}"
+    )
+
+    logger.info("obtaining changed files from github api")
+
+    async with github_client.request("GET", base_url, headers=headers) as response:
+        response.raise_for_status()
+        data = await response.json()
+
+    files = data.get("files", [])
+    if data["status"] not in ("ahead", "identical") or (
+        len(files) >= GITHUB_COMPARE_MAX_FILES
+    ):
         logger.info(
-            "obtained file list from github api",
-            status_code=response.status,
+            "changed files unusable for incremental analysis",
+            compare_status=data["status"],
+            changed_files_count=len(files),
         )
+        return None
 
-        github_files = await asyncio.gather(
-            *(
-                _fetch_github_file(
-                    logger=logger,
-                    github_access_token=github_access_token,
-                    repository_path=repository_path,
-                    branch_name=branch_name,
-                    file_path=file["path"],
-                    file_size=file["size"],
-                    file_url=file["url"],
-                )
-                for file in data["tree"]
-                if (file["type"] != "tree") and file_filter(file["path"])
-            )
-        )
+    changed_files: list[ChangedFile] = []
+    for file in files:
+        changed_file: ChangedFile = {"path": file["filename"], "status": file["status"]}
+        if "sha" in file:
+            changed_file["sha"] = file["sha"]
+        if "previous_filename" in file:
+            changed_file["previous_path"] = file["previous_filename"]
+        changed_files.append(changed_file)
+
+    logger.info(
+        "obtained changed files from github api",
+        changed_files_count=len(changed_files),
+    )
+
+    return changed_files
 
-        return github_files
+
+async def fetch_github_file(
+    *,
+    logger=structlog.get_logger(),
+    github_access_token: str,
+    repository_path: str,
+    branch_name: str,
+    file_path: str,
+    file_sha: str | None = None,
+    github_client: GithubClient | None = None,
+    blob_cache: BlobCache | None = None,
+) -> GithubFile:
+    """Fetches a single file, served from the blob cache when `file_sha` is known."""
+    return await _fetch_github_file(
+        logger=logger,
+        github_access_token=github_access_token,
+        repository_path=repository_path,
+        branch_name=branch_name,
+        file_path=file_path,
+        file_url=f"{GITHUB_API_URL}/repos/{repository_path}/git/blobs/{file_sha}",
+        file_sha=file_sha,
+        github_client=github_client or get_github_client(),
+        blob_cache=blob_cache or get_blob_cache(),
+    )
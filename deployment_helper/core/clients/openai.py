@@ -1,30 +1,270 @@
+import asyncio
+import email.utils
+import os
+import random
+import time
 import typing as ty
+
 import structlog
-from openai import AsyncOpenAI
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    AsyncOpenAI,
+    InternalServerError,
+    RateLimitError,
+)
+
+from deployment_helper.core.metrics import LLM_TOKENS_TOTAL, UPSTREAM_REQUESTS_TOTAL
 
 MODEL_NAME = "gpt-4o-mini"
 
+# Limits applied per API key across the whole process. Set them to the
+# organization's quota so requests are paced instead of bursting into 429s.
+OPENAI_MAX_CONCURRENT_REQUESTS = int(
+    os.environ.get("DEPLOYMENT_HELPER_OPENAI_MAX_CONCURRENT_REQUESTS", 16)
+)
+OPENAI_REQUESTS_PER_MINUTE = int(
+    os.environ.get("DEPLOYMENT_HELPER_OPENAI_REQUESTS_PER_MINUTE", 500)
+)
+OPENAI_TOKENS_PER_MINUTE = int(
+    os.environ.get("DEPLOYMENT_HELPER_OPENAI_TOKENS_PER_MINUTE", 200_000)
+)
+
+OPENAI_MAX_RETRIES = 6
+OPENAI_RETRY_BASE_DELAY_SECONDS = 1.0
+OPENAI_RETRY_MAX_DELAY_SECONDS = 60.0
+
+# Tokens reserved for the completion before the actual usage is known.
+OPENAI_ESTIMATED_COMPLETION_TOKENS = 512
+
 T = ty.TypeVar("T")
 
 logger = structlog.get_logger()
 
 
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English and code)."""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `capacity` units per minute.
+
+    Every acquisition reserves its amount right away and waits until the
+    balance it left behind has refilled, so waiters are served in arrival
+    order without holding the lock while they sleep. The balance may go
+    negative when a reservation turns out to be too small, which delays
+    later acquisitions.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated_at) * self.capacity / 60,
+        )
+        self._updated_at = now
+
+    async def acquire(self, amount: int):
+        amount = min(amount, self.capacity)
+
+        async with self._lock:
+            self._refill()
+            self._tokens -= amount
+            wait = -self._tokens * 60 / self.capacity
+
+        if wait <= 0:
+            return
+
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.adjust(-amount)
+            raise
+
+    def adjust(self, amount: int):
+        """Charges (or refunds, when negative) `amount` after the fact."""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class OpenAIClient:
+    """Process-wide OpenAI client with pacing and retries.
+
+    Requests are limited by a concurrency cap plus requests-per-minute and
+    tokens-per-minute token buckets. The token bucket is corrected with the
+    `usage` reported by each response, and refunded for failed attempts.
+    Rate limit, connection and server errors are retried with jittered
+    exponential backoff, honouring `retry-after`, and a 429 pauses every
+    request on the same key.
+    """
+
+    def __init__(
+        self,
+        *,
+        api_key: str,
+        max_concurrent_requests: int = OPENAI_MAX_CONCURRENT_REQUESTS,
+        requests_per_minute: int = OPENAI_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = OPENAI_TOKENS_PER_MINUTE,
+        max_retries: int = OPENAI_MAX_RETRIES,
+    ):
+        # Retries are handled here so they also go through the rate limits.
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
+        self.max_retries = max_retries
+
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+        self._paused_until = 0.0
+
+    async def request(
+        self,
+        create: ty.Callable[[], ty.Awaitable[T]],
+        *,
+        estimated_tokens: int,
+    ) -> T:
+        for attempt in range(self.max_retries + 1):
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            await self._request_bucket.acquire(1)
+            await self._token_bucket.acquire(estimated_tokens)
+
+            try:
+                async with self._semaphore:
+                    response = await create()
+            except (APIConnectionError, InternalServerError, RateLimitError) as e:
+                # The next attempt reserves its tokens again.
+                self._token_bucket.adjust(-estimated_tokens)
+                UPSTREAM_REQUESTS_TOTAL.inc(
+                    upstream="openai",
+                    status=e.status_code if isinstance(e, APIStatusError) else "error",
+                )
+                if attempt == self.max_retries or _is_quota_exhausted(e):
+                    raise
+
+                delay = _retry_delay(e, attempt)
+                if isinstance(e, RateLimitError):
+                    self._paused_until = max(
+                        self._paused_until, time.monotonic() + delay
+                    )
+
+                logger.warning(
+                    "retrying openai api request",
+                    error=type(e).__name__,
+                    attempt=attempt + 1,
+                    delay=round(delay, 2),
+                )
+                await asyncio.sleep(delay)
+                continue
+            except APIStatusError as e:
+                self._token_bucket.adjust(-estimated_tokens)
+                UPSTREAM_REQUESTS_TOTAL.inc(upstream="openai", status=e.status_code)
+                raise
+
+            UPSTREAM_REQUESTS_TOTAL.inc(upstream="openai", status=200)
+
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                self._token_bucket.adjust(usage.total_tokens - estimated_tokens)
+                LLM_TOKENS_TOTAL.inc(usage.prompt_tokens, kind="prompt")
+                LLM_TOKENS_TOTAL.inc(usage.completion_tokens, kind="completion")
+
+            return response
+
+        raise AssertionError("unreachable")
+
+
+def _is_quota_exhausted(error: Exception) -> bool:
+    # Billing quota errors are reported as 429s but never recover by waiting.
+    return isinstance(error, RateLimitError) and error.code == "insufficient_quota"
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    retry_after = None
+    if isinstance(error, APIStatusError):
+        retry_after = _parse_retry_after(error.response.headers)
+
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 0.25 + retry_after * 0.1)
+
+    # Full jitter keeps concurrent retries from synchronizing.
+    return random.uniform(
+        0,
+        min(
+            OPENAI_RETRY_MAX_DELAY_SECONDS,
+            OPENAI_RETRY_BASE_DELAY_SECONDS * 2**attempt,
+        ),
+    )
+
+
+def _parse_retry_after(headers: ty.Mapping[str, str]) -> float | None:
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+_clients: dict[str, OpenAIClient] = {}
+
+
+def get_openai_client(api_key: str) -> OpenAIClient:
+    """Returns the process-wide client for `api_key`, creating it on first use."""
+    client = _clients.get(api_key)
+
+    if client is None:
+        client = OpenAIClient(api_key=api_key)
+        _clients[api_key] = client
+
+    return client
+
+
 async def invoke(
     *,
     openai_api_key: str,
     user_prompt: str,
 ):
-    client = AsyncOpenAI(api_key=openai_api_key)
-
-    chat_completion = await client.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": user_prompt,
-            },
-        ],
-        model=MODEL_NAME,
-        n=1,
+    openai_client = get_openai_client(openai_api_key)
+
+    chat_completion = await openai_client.request(
+        lambda: openai_client.client.chat.completions.create(
+            messages=[
+                {
+                    "role": "user",
+                    "content": user_prompt,
+                },
+            ],
+            model=MODEL_NAME,
+            n=1,
+        ),
+        estimated_tokens=estimate_tokens(user_prompt)
+        + OPENAI_ESTIMATED_COMPLETION_TOKENS,
     )
 
     message_content = chat_completion.choices[0].message.content
@@ -50,18 +290,22 @@ async def invoke_structured(
         user_prompt=user_prompt,
     )
 
-    client = AsyncOpenAI(api_key=openai_api_key)
-
-    chat_completion = await client.beta.chat.completions.parse(
-        messages=[
-            {
-                "role": "user",
-                "content": user_prompt,
-            },
-        ],
-        model=MODEL_NAME,
-        n=1,
-        response_format=response_format,
+    openai_client = get_openai_client(openai_api_key)
+
+    chat_completion = await openai_client.request(
+        lambda: openai_client.client.beta.chat.completions.parse(
+            messages=[
+                {
+                    "role": "user",
+                    "content": user_prompt,
+                },
+            ],
+            model=MODEL_NAME,
+            n=1,
+            response_format=response_format,
+        ),
+        estimated_tokens=estimate_tokens(user_prompt)
+        + OPENAI_ESTIMATED_COMPLETION_TOKENS,
     )
 
     structured_response = chat_completion.choices[0].message.parsed
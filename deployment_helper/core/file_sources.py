@@ -0,0 +1,191 @@
+import asyncio
+import dataclasses
+import os
+import pathlib
+import typing as ty
+
+import structlog
+
+from deployment_helper.core.cache.blob_cache import git_blob_sha
+from deployment_helper.core.clients.github import (
+    GithubFile,
+    iter_github_repository_files,
+    list_github_repository_paths,
+)
+from deployment_helper.core.gitignore import GitignoreRule, is_ignored, read_gitignore
+from deployment_helper.core.stages import stage
+
+# Files read from a local checkout at once, each in a worker thread.
+LOCAL_MAX_CONCURRENT_READS = int(
+    os.environ.get("DEPLOYMENT_HELPER_LOCAL_MAX_CONCURRENT_READS", 32)
+)
+
+
+class FileSource(ty.Protocol):
+    """Where the files of a repository analysis come from."""
+
+    def iter_files(
+        self,
+        *,
+        logger=structlog.get_logger(),
+        file_filter: ty.Callable[[str], bool] = lambda _: True,
+    ) -> ty.AsyncIterator[GithubFile]:
+        """Yields the files whose path passes `file_filter` as they are read."""
+        ...
+
+    async def list_paths(self, *, logger=structlog.get_logger()) -> list[str]:
+        """Returns the paths of every file, without reading contents."""
+        ...
+
+
+@dataclasses.dataclass(frozen=True)
+class GithubRepositorySource:
+    github_access_token: str
+    repository_path: str
+    branch_name: str = "main"
+
+    def iter_files(
+        self,
+        *,
+        logger=structlog.get_logger(),
+        file_filter: ty.Callable[[str], bool] = lambda _: True,
+    ) -> ty.AsyncIterator[GithubFile]:
+        return iter_github_repository_files(
+            logger=logger,
+            github_access_token=self.github_access_token,
+            repository_path=self.repository_path,
+            branch_name=self.branch_name,
+            file_filter=file_filter,
+        )
+
+    async def list_paths(self, *, logger=structlog.get_logger()) -> list[str]:
+        return await list_github_repository_paths(
+            logger=logger,
+            github_access_token=self.github_access_token,
+            repository_path=self.repository_path,
+            branch_name=self.branch_name,
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class LocalCheckoutSource:
+    """Reads a working tree on disk, skipping what git would ignore.
+
+    Honours .gitignore files at every level and .git/info/exclude. Paths
+    are relative to `path` and "/" separated, like GitHub's.
+    """
+
+    path: str
+    max_concurrent_reads: int = LOCAL_MAX_CONCURRENT_READS
+
+    def list_files(
+        self, file_filter: ty.Callable[[str], bool] = lambda _: True
+    ) -> list[str]:
+        root = os.path.abspath(self.path)
+        exclude_rules = read_gitignore(os.path.join(root, ".git", "info", "exclude"))
+
+        files: list[str] = []
+
+        def walk(directory: str, rules: list[GitignoreRule]):
+            rules = rules + read_gitignore(
+                os.path.join(root, directory, ".gitignore"), base=directory
+            )
+            try:
+                entries = sorted(
+                    os.scandir(os.path.join(root, directory)), key=lambda e: e.name
+                )
+            except OSError:
+                return
+
+            for entry in entries:
+                if entry.is_symlink() or entry.name == ".git":
+                    continue
+
+                path = f"{directory}/{entry.name}" if directory else entry.name
+                is_dir = entry.is_dir()
+                if is_ignored(rules, path, is_dir=is_dir):
+                    continue
+
+                if is_dir:
+                    walk(path, rules)
+                elif entry.is_file() and file_filter(path):
+                    files.append(path)
+
+        walk("", exclude_rules)
+        return files
+
+    async def list_paths(self, *, logger=structlog.get_logger()) -> list[str]:
+        with stage("tree_fetch", logger=logger):
+            return await asyncio.to_thread(self.list_files)
+
+    def _read_file(self, path: str) -> GithubFile | None:
+        full_path = os.path.join(os.path.abspath(self.path), path)
+        try:
+            with open(full_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        github_file = GithubFile(
+            path=path,
+            url=pathlib.Path(full_path).as_uri(),
+            size=len(data),
+            sha=git_blob_sha(data),
+        )
+        try:
+            github_file["content"] = data.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+        return github_file
+
+    async def iter_files(
+        self,
+        *,
+        logger=structlog.get_logger(),
+        file_filter: ty.Callable[[str], bool] = lambda _: True,
+    ) -> ty.AsyncIterator[GithubFile]:
+        with stage("tree_fetch", logger=logger):
+            paths = await asyncio.to_thread(self.list_files, file_filter)
+
+        logger.info("reading files from local checkout", files_count=len(paths))
+
+        pending_paths = iter(paths)
+        reads: set[asyncio.Future[GithubFile | None]] = set()
+
+        def start_reads():
+            while len(reads) < self.max_concurrent_reads:
+                path = next(pending_paths, None)
+                if path is None:
+                    return
+                reads.add(
+                    asyncio.ensure_future(asyncio.to_thread(self._read_file, path))
+                )
+
+        try:
+            start_reads()
+            while reads:
+                # Only the wait for reads is timed, not the time consumers
+                # hold a file.
+                with stage("file_fetch", logger=logger):
+                    done, _ = await asyncio.wait(
+                        reads, return_when=asyncio.FIRST_COMPLETED
+                    )
+                reads.difference_update(done)
+                start_reads()
+
+                for read in done:
+                    github_file = read.result()
+                    if github_file is not None:
+                        yield github_file
+        finally:
+            for read in reads:
+                read.cancel()
+            await asyncio.gather(*reads, return_exceptions=True)
+
+
+__ALL__ = [
+    "FileSource",
+    "GithubRepositorySource",
+    "LOCAL_MAX_CONCURRENT_READS",
+    "LocalCheckoutSource",
+]
@@ -0,0 +1,116 @@
+import re
+import typing as ty
+
+
+class GitignoreRule(ty.NamedTuple):
+    # Directory of the .gitignore, relative to the root, "" for the root.
+    base: str
+    regex: re.Pattern
+    negated: bool
+    directories_only: bool
+
+
+def _translate(pattern: str) -> str:
+    """Translates a gitignore glob to a regex over "/" separated paths."""
+    parts: list[str] = []
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        if pattern.startswith("**/", idx):
+            parts.append("(?:.*/)?")
+            idx += 3
+            continue
+        if pattern.startswith("**", idx) and idx + 2 == len(pattern):
+            parts.append(".*")
+            idx += 2
+            continue
+
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "\\" and idx + 1 < len(pattern):
+            idx += 1
+            parts.append(re.escape(pattern[idx]))
+        elif char == "[":
+            end = pattern.find("]", idx + 2)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[idx + 1 : end].replace("\\", "\\\\")
+                if body[0] == "!":
+                    body = "^" + body[1:]
+                parts.append(f"[{body}]")
+                idx = end
+        else:
+            parts.append(re.escape(char))
+        idx += 1
+
+    return "".join(parts)
+
+
+def parse_gitignore(text: str, *, base: str = "") -> list[GitignoreRule]:
+    rules: list[GitignoreRule] = []
+    for line in text.splitlines():
+        # Trailing spaces are dropped unless escaped.
+        line = re.sub(r"(?<!\\) +$", "", line)
+        if not line or line.startswith("#"):
+            continue
+
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+
+        directories_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+
+        # A slash anywhere but at the end anchors the pattern to `base`.
+        anchored = "/" in line
+        regex = _translate(line.lstrip("/"))
+        if not anchored:
+            regex = "(?:.*/)?" + regex
+
+        rules.append(
+            GitignoreRule(
+                base=base,
+                regex=re.compile(regex, re.DOTALL),
+                negated=negated,
+                directories_only=directories_only,
+            )
+        )
+
+    return rules
+
+
+def is_ignored(rules: ty.Sequence[GitignoreRule], path: str, *, is_dir: bool) -> bool:
+    """Applies rules in order, the last one matching `path` decides."""
+    ignored = False
+    for rule in rules:
+        if rule.directories_only and not is_dir:
+            continue
+
+        if rule.base:
+            if not path.startswith(rule.base + "/"):
+                continue
+            relative_path = path[len(rule.base) + 1 :]
+        else:
+            relative_path = path
+
+        if rule.regex.fullmatch(relative_path):
+            ignored = not rule.negated
+
+    return ignored
+
+
+def read_gitignore(path: str, *, base: str = "") -> list[GitignoreRule]:
+    """Reads rules from an ignore file, none when it cannot be read."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return parse_gitignore(f.read(), base=base)
+    except (OSError, UnicodeDecodeError):
+        return []
+
+
+__ALL__ = ["GitignoreRule", "is_ignored", "parse_gitignore", "read_gitignore"]
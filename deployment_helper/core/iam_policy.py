@@ -0,0 +1,333 @@
+import functools
+import json
+import re
+import typing as ty
+from collections import defaultdict
+
+import structlog
+
+from deployment_helper.core import aws_iam_actions
+from deployment_helper.core.aws_action_index import get_aws_action_index
+
+# Size limit of a customer managed policy, whitespace excluded.
+IAM_POLICY_MAX_SIZE = 6144
+
+IAM_POLICY_VERSION = "2012-10-17"
+
+# Templated values such as ${bucketName}, {table}, <queue-name> or %s.
+_TEMPLATE_PATTERN = re.compile(r"\$\{[^}]*\}|\{[^}]*\}|<[^>]*>|%\(\w+\)s|%s")
+
+# Example names the model copies from documentation, e.g. "bucketName",
+# "my-table", "MyQueue", "BUCKET_NAME" or "example-queue". Only whole
+# placeholder names match, real ones such as "mybucket" or "sampledata" are
+# kept.
+_PLACEHOLDER_PATTERNS = (
+    re.compile(r"[a-z]+(Name|Id|ID|Key|Arn|ARN|Url|URL|Prefix|Path)"),
+    re.compile(r"[A-Z][A-Z0-9]*(_[A-Z0-9]+)+"),
+    re.compile(
+        r"(?i)(my|your|example|sample|placeholder|dummy)[-_]"
+        r"(bucket|table|queue|topic|function|stream|key|object|file|resource)s?"
+    ),
+    re.compile(
+        r"(My|Your|Example|Sample|Placeholder|Dummy)"
+        r"(Bucket|Table|Queue|Topic|Function|Stream|Key|Object|File|Resource)s?"
+    ),
+    re.compile(r"(?i)(.*[-_.])?(example|placeholder)([-_.].*)?"),
+    re.compile(r"(?i)x{3,}"),
+)
+
+_PLACEHOLDER_NAMES = {
+    "account",
+    "bucket",
+    "function",
+    "key",
+    "name",
+    "object",
+    "partition",
+    "queue",
+    "region",
+    "resource",
+    "table",
+    "topic",
+}
+
+_PARTITIONS = {"aws", "aws-cn", "aws-us-gov"}
+_REGION_PATTERN = re.compile(r"[a-z]{2}(-[a-z]+)+-\d+")
+_ACCOUNT_PATTERN = re.compile(r"\d{12}")
+
+# Account ids used throughout the AWS documentation.
+_EXAMPLE_ACCOUNTS = {"000000000000", "111122223333", "123456789012", "444455556666"}
+
+# Splits CamelCase action names into words, "GetObjectAcl" -> Get/Object/Acl.
+_ACTION_WORD_PATTERN = re.compile(r"[A-Z][a-z0-9]*|[a-z0-9]+")
+
+IamPolicyStatement = ty.TypedDict(
+    "IamPolicyStatement",
+    {"Effect": str, "Action": list[str], "Resource": str | list[str]},
+)
+
+
+class IamPolicy(ty.TypedDict):
+    Version: str
+    Statement: list[IamPolicyStatement]
+
+
+def _is_placeholder(segment: str, *, resource_type: bool) -> bool:
+    # A leading "table" or "function" is the resource type, not a name.
+    if not resource_type and segment.lower() in _PLACEHOLDER_NAMES:
+        return True
+    return any(pattern.fullmatch(segment) for pattern in _PLACEHOLDER_PATTERNS)
+
+
+def _normalize_resource_path(resource: str) -> str:
+    # Resource paths are separated by "/" and ":", e.g. "table/name/index/*".
+    segments = re.split(r"([/:])", _TEMPLATE_PATTERN.sub("*", resource))
+    segments = [
+        "*"
+        if idx % 2 == 0
+        and _is_placeholder(segment, resource_type=idx == 0 and len(segments) > 1)
+        else segment
+        for idx, segment in enumerate(segments)
+    ]
+    return re.sub(r"\*+", "*", "".join(segments))
+
+
+def normalize_resource(resource: str) -> str:
+    """Replaces placeholders and example values in a resource ARN with "*".
+
+    Anything that is not an ARN, such as a bare bucket name, becomes "*".
+    """
+    resource = resource.strip()
+    if not resource.startswith("arn:"):
+        return "*"
+
+    fields = resource.split(":", 5)
+    if len(fields) < 6:
+        return "*"
+
+    _, partition, service, region, account, resource_path = fields
+
+    if partition not in _PARTITIONS and partition != "*":
+        partition = "*"
+    if region and region != "*" and not _REGION_PATTERN.fullmatch(region):
+        region = "*"
+    if account and account != "*":
+        if not _ACCOUNT_PATTERN.fullmatch(account) or account in _EXAMPLE_ACCOUNTS:
+            account = "*"
+
+    resource_path = _normalize_resource_path(resource_path) or "*"
+
+    return ":".join(["arn", partition, service, region, account, resource_path])
+
+
+def normalize_action(action: str) -> str:
+    """Lowercases the service prefix and restores the catalog's action case."""
+    service, _, name = action.strip().partition(":")
+    service = service.lower()
+    name = get_aws_action_index().lookup(service, name) or name
+    return f"{service}:{name}"
+
+
+@functools.cache
+def _wildcard_pattern(value: str) -> re.Pattern:
+    # "*" may stand for anything, including another wildcard, but "?" is a
+    # single character and cannot stand for a "*".
+    parts = [
+        ".*" if char == "*" else "[^*?]" if char == "?" else re.escape(char)
+        for char in value
+    ]
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def _covers(pattern: str, value: str) -> bool:
+    return _wildcard_pattern(pattern).fullmatch(value) is not None
+
+
+def _has_wildcard(value: str) -> bool:
+    return "*" in value or "?" in value
+
+
+def _drop_covered_permissions(
+    permissions: set[tuple[str, str]],
+) -> set[tuple[str, str]]:
+    """Drops (action, resource) pairs already allowed by a broader pair."""
+    broad_permissions = [
+        (action, resource)
+        for action, resource in permissions
+        if _has_wildcard(action) or _has_wildcard(resource)
+    ]
+
+    return {
+        (action, resource)
+        for action, resource in permissions
+        if not any(
+            (broad_action, broad_resource) != (action, resource)
+            and _covers(broad_action, action)
+            and _covers(broad_resource, resource)
+            for broad_action, broad_resource in broad_permissions
+        )
+    }
+
+
+def _action_prefixes(name: str) -> list[str]:
+    """Returns the word prefixes of an action name, shortest first."""
+    words = _ACTION_WORD_PATTERN.findall(name)
+    return ["".join(words[:count]) for count in range(len(words) + 1)]
+
+
+def _collapse_actions(actions: list[str], *, complete_only: bool) -> list[str]:
+    """Replaces groups of actions with prefix wildcards, e.g. "s3:Get*".
+
+    With `complete_only` a prefix is used only when every catalog action
+    starting with it is in `actions`, so the allowed actions do not change
+    as of the current catalog. Otherwise each action collapses to its first
+    word, which broadens the policy.
+    """
+    by_service: dict[str, set[str]] = defaultdict(set)
+    for action in actions:
+        service, _, name = action.partition(":")
+        by_service[service].add(name)
+
+    collapsed: set[str] = set()
+    for service, names in by_service.items():
+        catalog = aws_iam_actions.AWS_SERVICES_MAP.get(service)
+
+        for name in names:
+            if _has_wildcard(name) or not catalog or name not in catalog:
+                collapsed.add(f"{service}:{name}")
+                continue
+
+            prefixes = _action_prefixes(name)
+            if not complete_only:
+                collapsed.add(f"{service}:{prefixes[1]}*")
+                continue
+
+            for prefix in prefixes:
+                matching = [action for action in catalog if action.startswith(prefix)]
+                if all(action in names for action in matching):
+                    if len(matching) > 1:
+                        collapsed.add(f"{service}:{prefix}*")
+                    else:
+                        collapsed.add(f"{service}:{name}")
+                    break
+
+    return sorted(collapsed)
+
+
+def _build_statements(
+    permissions: set[tuple[str, str]],
+    *,
+    collapse: ty.Literal["none", "complete", "verbs", "services"],
+) -> list[IamPolicyStatement]:
+    """Groups permissions into one statement per distinct set of resources."""
+    action_resources: dict[str, set[str]] = defaultdict(set)
+    for action, resource in permissions:
+        action_resources[action].add(resource)
+
+    resource_actions: dict[tuple[str, ...], list[str]] = defaultdict(list)
+    for action, resources in action_resources.items():
+        resource_actions[tuple(sorted(resources))].append(action)
+
+    statements: list[IamPolicyStatement] = []
+    for resources, actions in sorted(resource_actions.items()):
+        if collapse == "complete":
+            actions = _collapse_actions(actions, complete_only=True)
+        elif collapse == "verbs":
+            actions = _collapse_actions(actions, complete_only=False)
+        elif collapse == "services":
+            actions = [f"{action.partition(':')[0]}:*" for action in actions]
+
+        statements.append(
+            {
+                "Effect": "Allow",
+                "Action": sorted(set(actions)),
+                "Resource": resources[0] if len(resources) == 1 else list(resources),
+            }
+        )
+
+    return sorted(statements, key=lambda statement: statement["Action"])
+
+
+def iam_policy_size(iam_policy: IamPolicy) -> int:
+    """Returns the size IAM counts against its limit, without whitespace."""
+    return len(json.dumps(iam_policy, separators=(",", ":")))
+
+
+def compile_iam_policy(
+    *,
+    logger=structlog.get_logger(),
+    statements: dict[str, set[str]],
+    collapse_actions: bool = False,
+    max_size: int = IAM_POLICY_MAX_SIZE,
+) -> IamPolicy:
+    """Compiles actions per resource into a minimal, deterministic policy.
+
+    Placeholder ARNs become wildcards, actions are deduplicated and those
+    already allowed on a broader resource are dropped, and statements that
+    share their actions are merged. With `collapse_actions`, groups of
+    actions complete according to the catalog become prefixes such as
+    "s3:Get*".
+
+    A policy over `max_size` is shrunk step by step: complete prefixes,
+    then a single "*" resource, then one wildcard per action verb, then one
+    per service. All but the first allow more than the input, so they are
+    logged as warnings.
+    """
+    permissions = {
+        (normalize_action(action), normalize_resource(resource))
+        for resource, actions in statements.items()
+        for action in actions
+    }
+    permissions = _drop_covered_permissions(permissions)
+
+    def build(
+        permissions: set[tuple[str, str]],
+        collapse: ty.Literal["none", "complete", "verbs", "services"],
+    ) -> IamPolicy:
+        return IamPolicy(
+            Version=IAM_POLICY_VERSION,
+            Statement=_build_statements(permissions, collapse=collapse),
+        )
+
+    iam_policy = build(permissions, "complete" if collapse_actions else "none")
+    if iam_policy_size(iam_policy) <= max_size:
+        return iam_policy
+
+    iam_policy = build(permissions, "complete")
+    if iam_policy_size(iam_policy) <= max_size:
+        return iam_policy
+
+    any_resource = {(action, "*") for action, _ in permissions}
+    for collapse in ("complete", "verbs", "services"):
+        iam_policy = build(any_resource, collapse)
+        logger.warning(
+            "broadened iam policy to fit the size limit",
+            resources="*",
+            collapse=collapse,
+            size=iam_policy_size(iam_policy),
+            max_size=max_size,
+        )
+        if iam_policy_size(iam_policy) <= max_size:
+            return iam_policy
+
+    logger.error(
+        "iam policy exceeds the size limit",
+        size=iam_policy_size(iam_policy),
+        max_size=max_size,
+    )
+    return iam_policy
+
+
+def render_iam_policy(iam_policy: IamPolicy) -> str:
+    return json.dumps(iam_policy, indent=4)
+
+
+__ALL__ = [
+    "IAM_POLICY_MAX_SIZE",
+    "IamPolicy",
+    "compile_iam_policy",
+    "iam_policy_size",
+    "normalize_action",
+    "normalize_resource",
+    "render_iam_policy",
+]
@@ -1,20 +1,48 @@
 import asyncio
-import json
+import contextlib
 import typing as ty
 import structlog
 from collections import defaultdict
 
-from deployment_helper.core.aws_iam_actions import AWS_SERVICES_MAP
-from deployment_helper.core.clients.github import fetch_github_repository_files
+from deployment_helper.core import aws_iam_actions
+from deployment_helper.core.aws_action_index import get_aws_action_index
+from deployment_helper.core.file_sources import FileSource, GithubRepositorySource
+from deployment_helper.core.iam_policy import compile_iam_policy, render_iam_policy
+from deployment_helper.core.metrics import AWS_SDK_CALL_VALIDATIONS_TOTAL
+from deployment_helper.core.stages import stage
+from deployment_helper.core.clients.github import (
+    ChangedFile,
+    GithubFile,
+    fetch_github_changed_files,
+    fetch_github_file,
+)
+from deployment_helper.core.llm_engine.analysis_store import (
+    FileAnalysis,
+    FileResults,
+    get_analysis_store,
+)
 from deployment_helper.core.llm_engine.aws_analyzer import (
     AwsSdkCall,
     find_aws_sdk_calls,
+    find_aws_sdk_calls_for_files,
     find_aws_service_names,
-    refine_iam_policy,
+    find_aws_service_names_for_files,
 )
+from deployment_helper.core.llm_engine.file_store import FileStore
 from deployment_helper.core.llm_engine.github_analyzer import (
-    find_relevant_github_source_files,
+    score_github_source_files,
+)
+from deployment_helper.core.llm_engine.prompt_packing import (
+    PACKED_FILE_MAX_TOKENS,
+    file_tokens,
+    pack_files,
 )
+from deployment_helper.core.llm_engine.service_roots import (
+    ServiceRoots,
+    detect_service_roots,
+)
+from deployment_helper.core.llm_engine.source_chunking import chunk_source_file
+from deployment_helper.core.llm_engine.static_analyzer import extract_aws_sdk_calls
 
 
 def _is_source_code(file_path: str):
@@ -23,23 +51,24 @@ def _is_source_code(file_path: str):
     return any(file_path.endswith(ext) for ext in source_code_ext)
 
 
-def _is_valid_aws_service_action(
-    *,
-    logger=structlog.get_logger(),
-    service: str,
-    action: str,
-) -> bool:
-    """Checks if the action is valid for the given AWS service."""
-    try:
-        return action in AWS_SERVICES_MAP.get(service, [])
-    except KeyError as e:
-        logger.error(
-            "Error validating AWS service action",
-            error=str(e),
-            service=service,
-            action=action,
-        )
-        return False
+# Files scoring below this are dropped by the reranker before LLM analysis.
+RELEVANCE_SCORE_THRESHOLD = 0.01
+RELEVANT_FILES_TOP_N = 15
+
+# Fetched files are reranked in windows of this many files or bytes, or of
+# those that arrived within the wait, so scoring and analysis overlap with
+# fetching.
+RERANK_WINDOW_FILES = 1000
+RERANK_WINDOW_MAX_BYTES = 4 * 1024 * 1024
+RERANK_WINDOW_MAX_WAIT_SECONDS = 0.25
+RERANK_MAX_CONCURRENT_WINDOWS = 8
+
+# Files scoring at least this are analysed as soon as their window is scored,
+# before the scores of the remaining files are known.
+RELEVANCE_SCORE_EARLY_START = 0.5
+
+# Fetched files waiting to be put in a window; fetching pauses when it is full.
+STREAM_QUEUE_MAX_SIZE = 2 * RERANK_WINDOW_FILES
 
 
 async def generate_iam_policy_from_repository(
@@ -57,132 +86,932 @@ async def generate_iam_policy_from_repository(
         repository_name=github_repository_name,
         branch_name=github_branch_name,
     )
-    logger.info("obtaining files from github")
 
-    github_files = await fetch_github_repository_files(
+    return await generate_iam_policy_from_file_source(
         logger=logger,
-        github_access_token=github_access_token,
-        repository_path=github_repository_name,
-        branch_name=github_branch_name,
-        file_filter=_is_source_code,
+        cohere_api_key=cohere_api_key,
+        openai_api_key=openai_api_key,
+        file_source=GithubRepositorySource(
+            github_access_token=github_access_token,
+            repository_path=github_repository_name,
+            branch_name=github_branch_name,
+        ),
     )
 
-    logger = logger.bind(github_files_count=len(github_files))
-    logger.info("obtained files from github successfully")
 
-    logger.info("filtering out irrelevant files using reranker")
-    relevant_source_files = find_relevant_github_source_files(
+async def generate_iam_policy_from_file_source(
+    *,
+    logger=structlog.get_logger(),
+    cohere_api_key: str,
+    openai_api_key: str,
+    file_source: FileSource,
+) -> str:
+    """Processes the files of any source, such as a local checkout."""
+    analysis = await _analyze_repository(
+        logger=logger,
+        cohere_api_key=cohere_api_key,
+        openai_api_key=openai_api_key,
+        file_source=file_source,
+    )
+
+    return _generate_iam_policy_from_file_results(
         logger=logger,
-        reranker_api_key=cohere_api_key,
-        source_code_files=github_files,
-        top_n=15,
-        relevance_score_threshold=0.01,
+        file_results=analysis.results,
     )
 
-    logger = logger.bind(relevant_files_count=len(relevant_source_files))
-    logger.info("relevant source files filtered successfully")
 
-    results = await asyncio.gather(
-        *(
-            _get_relevant_aws_sdk_calls_from_file(
+async def generate_iam_policies_per_service(
+    *,
+    logger=structlog.get_logger(),
+    cohere_api_key: str,
+    openai_api_key: str,
+    file_source: FileSource,
+    service_roots: list[str] | None = None,
+) -> dict[str, str]:
+    """Generates one policy per service of a monorepo in a single pass.
+
+    Without `service_roots` they are detected from marker files. Every file
+    is fetched and analysed once; the best files are picked per service,
+    and shared code outside the roots counts for each service importing it.
+    """
+    if service_roots is None:
+        service_roots = detect_service_roots(
+            await file_source.list_paths(logger=logger)
+        )
+    if not service_roots:
+        logger.warning("no service roots found, treating repository as one")
+        service_roots = [""]
+
+    services = ServiceRoots(service_roots)
+    logger.info("generating policies per service", service_roots=services.roots)
+
+    async def observed_files() -> ty.AsyncIterator[GithubFile]:
+        files = file_source.iter_files(logger=logger, file_filter=_is_source_code)
+        async with contextlib.aclosing(files):
+            async for file in files:
+                services.add_file(file)
+                yield file
+
+    analysis = await _analyze_file_stream(
+        logger=logger,
+        cohere_api_key=cohere_api_key,
+        openai_api_key=openai_api_key,
+        github_files=observed_files(),
+        top_n=RELEVANT_FILES_TOP_N,
+        group_of=services.group_of,
+    )
+    file_results = analysis.results
+
+    logger.info("analysed repository files", relevant_files_count=len(file_results))
+
+    return {
+        service_root: _generate_iam_policy_from_file_results(
+            logger=logger.bind(service_root=service_root),
+            file_results=service_results,
+        )
+        for service_root, service_results in services.split_results(
+            file_results
+        ).items()
+    }
+
+
+async def generate_iam_policy_from_pull_request(
+    *,
+    logger=structlog.get_logger(),
+    github_access_token: str,
+    cohere_api_key: str,
+    openai_api_key: str,
+    github_repository_name: str,
+    github_head_sha: str,
+    github_previous_head_sha: str | None = None,
+) -> str:
+    """Generates the policy for a pull request head, reusing earlier results.
+
+    When the previous head was analysed, only the files changed since then
+    are analysed again; results of deleted files are dropped and everything
+    else is reused, keeping the same best files a full run would. Without a
+    usable baseline the whole repository is analysed. Either way the
+    per-file results are stored for the next push.
+    """
+
+    logger = logger.bind(
+        repository_name=github_repository_name,
+        head_sha=github_head_sha,
+        previous_head_sha=github_previous_head_sha,
+    )
+
+    analysis_store = get_analysis_store()
+
+    analysis = await asyncio.to_thread(
+        analysis_store.get_results,
+        repository=github_repository_name,
+        commit_sha=github_head_sha,
+    )
+
+    if analysis is not None:
+        logger.info("reusing stored analysis of head commit")
+    else:
+        previous_analysis = None
+        if github_previous_head_sha is not None:
+            previous_analysis = await asyncio.to_thread(
+                analysis_store.get_results,
+                repository=github_repository_name,
+                commit_sha=github_previous_head_sha,
+            )
+
+        changed_files = None
+        if github_previous_head_sha is not None and previous_analysis is not None:
+            with stage("fetch", logger=logger):
+                changed_files = await fetch_github_changed_files(
+                    logger=logger,
+                    github_access_token=github_access_token,
+                    repository_path=github_repository_name,
+                    base_ref=github_previous_head_sha,
+                    head_ref=github_head_sha,
+                )
+
+        if previous_analysis is not None and changed_files is not None:
+            analysis = await _analyze_changed_files(
                 logger=logger,
+                github_access_token=github_access_token,
+                cohere_api_key=cohere_api_key,
                 openai_api_key=openai_api_key,
-                file_path=file["path"],
-                file_content=file.get("content", ""),
+                github_repository_name=github_repository_name,
+                github_head_sha=github_head_sha,
+                previous_analysis=previous_analysis,
+                changed_files=changed_files,
+            )
+
+        if analysis is None:
+            logger.info("no usable previous analysis, analysing whole repository")
+            analysis = await _analyze_repository(
+                logger=logger,
+                cohere_api_key=cohere_api_key,
+                openai_api_key=openai_api_key,
+                file_source=GithubRepositorySource(
+                    github_access_token=github_access_token,
+                    repository_path=github_repository_name,
+                    branch_name=github_head_sha,
+                ),
             )
-            for file in relevant_source_files
+
+        await asyncio.to_thread(
+            analysis_store.save_results,
+            repository=github_repository_name,
+            commit_sha=github_head_sha,
+            analysis=analysis,
         )
+
+    return _generate_iam_policy_from_file_results(
+        logger=logger,
+        file_results=analysis.results,
     )
 
-    statements: dict[str, set[str]] = defaultdict(set)
-    for aws_stmts in results:
-        for stmt in aws_stmts:
-            statements[stmt.resource].add(f"{stmt.service}:{stmt.action}")
 
-    iam_policy = _construct_iam_policy(
+async def _analyze_repository(
+    *,
+    logger=structlog.get_logger(),
+    cohere_api_key: str,
+    openai_api_key: str,
+    file_source: FileSource,
+) -> FileAnalysis:
+    logger.info("streaming files", file_source=type(file_source).__name__)
+
+    analysis = await _analyze_file_stream(
         logger=logger,
-        statements=statements,
+        cohere_api_key=cohere_api_key,
+        openai_api_key=openai_api_key,
+        github_files=file_source.iter_files(
+            logger=logger,
+            file_filter=_is_source_code,
+        ),
+        top_n=RELEVANT_FILES_TOP_N,
+    )
+
+    logger.info(
+        "analysed repository files", relevant_files_count=len(analysis.results)
+    )
+
+    return analysis
+
+
+def _merge_analyses(
+    previous_analysis: FileAnalysis,
+    changed_paths: set[str],
+    changed_analysis: FileAnalysis,
+    top_n: int,
+) -> FileAnalysis | None:
+    """Selects the best `top_n` files of the previous and changed ones.
+
+    Unchanged files left out of the previous selection ranked below all of
+    it, so they can only belong to the new selection when it does not fill
+    up with files ranking above the previous last one. The outcome matches
+    a full run of the new head, or is None when it may not.
+    """
+
+    def order(item: tuple[float, str]) -> tuple[float, str]:
+        score, path = item
+        return -score, path
+
+    candidates = [
+        (score, path)
+        for path, score in previous_analysis.scores.items()
+        if path not in changed_paths
+    ]
+    candidates.extend(
+        (score, path) for path, score in changed_analysis.scores.items()
+    )
+    selected = sorted(candidates, key=order)[:top_n]
+
+    if len(previous_analysis.scores) >= top_n:
+        previous_last = max(
+            ((score, path) for path, score in previous_analysis.scores.items()),
+            key=order,
+        )
+        if len(selected) < top_n or order(selected[-1]) > order(previous_last):
+            return None
+
+    results = {**previous_analysis.results, **changed_analysis.results}
+    return FileAnalysis(
+        results={path: results[path] for _, path in selected},
+        scores={path: score for score, path in selected},
+    )
+
+
+async def _analyze_changed_files(
+    *,
+    logger=structlog.get_logger(),
+    github_access_token: str,
+    cohere_api_key: str,
+    openai_api_key: str,
+    github_repository_name: str,
+    github_head_sha: str,
+    previous_analysis: FileAnalysis,
+    changed_files: list[ChangedFile],
+) -> FileAnalysis | None:
+    """Analyses the files changed since a previous analysis and merges them.
+
+    Returns None when the merged selection may differ from a full run.
+    """
+    # Renamed and removed files lose their previous results, so do updated
+    # files that are no longer relevant.
+    changed_paths: set[str] = set()
+    updated_files: list[ChangedFile] = []
+    for changed_file in changed_files:
+        changed_paths.add(changed_file["path"])
+        if "previous_path" in changed_file:
+            changed_paths.add(changed_file["previous_path"])
+
+        if changed_file["status"] not in ("removed", "unchanged") and _is_source_code(
+            changed_file["path"]
+        ):
+            updated_files.append(changed_file)
+
+    logger = logger.bind(
+        changed_files_count=len(changed_files),
+        updated_files_count=len(updated_files),
     )
+    logger.info("analysing changed files only")
+
+    async def fetch_updated_files() -> ty.AsyncIterator[GithubFile]:
+        fetches = [
+            asyncio.ensure_future(
+                fetch_github_file(
+                    logger=logger,
+                    github_access_token=github_access_token,
+                    repository_path=github_repository_name,
+                    branch_name=github_head_sha,
+                    file_path=changed_file["path"],
+                    file_sha=changed_file.get("sha"),
+                )
+            )
+            for changed_file in updated_files
+        ]
+        try:
+            for fetch in asyncio.as_completed(fetches):
+                yield await fetch
+        finally:
+            for fetch in fetches:
+                fetch.cancel()
+            await asyncio.gather(*fetches, return_exceptions=True)
 
-    refined_iam_policy = await refine_iam_policy(
+    # Changed files outside their own best `top_n` cannot make the overall
+    # selection either.
+    changed_analysis = await _analyze_file_stream(
         logger=logger,
+        cohere_api_key=cohere_api_key,
         openai_api_key=openai_api_key,
-        iam_policy=iam_policy,
+        github_files=fetch_updated_files(),
+        top_n=RELEVANT_FILES_TOP_N,
     )
 
-    return json.dumps(json.loads(refined_iam_policy.policy_document), indent=4)
+    analysis = _merge_analyses(
+        previous_analysis, changed_paths, changed_analysis, RELEVANT_FILES_TOP_N
+    )
+    if analysis is None:
+        logger.info("changed files may bring in unchanged files, not merging")
+    return analysis
+
+
+def _file_metadata(file: GithubFile) -> GithubFile:
+    metadata = GithubFile(path=file["path"], url=file["url"])
+    for key in ("size", "sha"):
+        if key in file:
+            metadata[key] = file[key]
+    return metadata
+
+
+def _load_content(file: GithubFile, file_store: FileStore) -> GithubFile:
+    content = file_store.get(file["path"])
+    if content is None:
+        return file
+    return GithubFile(**file, content=content)
 
 
-def _construct_iam_policy(
+async def _iter_file_windows(
     *,
     logger=structlog.get_logger(),
-    statements: dict[str, set[str]],
-) -> ty.Any:
-    logger.info("final list of actions", actions_dict=statements)
+    github_files: ty.AsyncIterator[GithubFile],
+    file_store: FileStore,
+    window_size: int = RERANK_WINDOW_FILES,
+    window_max_bytes: int = RERANK_WINDOW_MAX_BYTES,
+    max_wait: float = RERANK_WINDOW_MAX_WAIT_SECONDS,
+) -> ty.AsyncIterator[list[GithubFile]]:
+    """Groups fetched files into windows while fetching carries on.
 
-    iam_policy = {
-        "Version": "2012-10-17",
-        "Statement": [],
-    }
+    Contents are moved into `file_store` as files arrive, windows only hold
+    metadata. A window is yielded once it holds `window_size` files or
+    `window_max_bytes` of content, or `max_wait` seconds after its first file
+    arrived, whichever comes first.
+    """
+    loop = asyncio.get_running_loop()
+    files: asyncio.Queue[tuple[GithubFile, int] | None] = asyncio.Queue(
+        STREAM_QUEUE_MAX_SIZE
+    )
+
+    async def produce():
+        cancelled = False
+        try:
+            with stage("fetch", logger=logger):
+                async for github_file in github_files:
+                    content = github_file.get("content", "")
+                    if "content" in github_file:
+                        file_store.put(github_file["path"], content)
+                    await files.put((_file_metadata(github_file), len(content)))
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # Only cancelled by the consumer, which no longer reads the queue;
+            # waiting for room for the end marker would block for ever.
+            if not cancelled:
+                await files.put(None)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        window: list[GithubFile] = []
+        window_bytes = 0
+        window_deadline = 0.0
+
+        while True:
+            timeout = max(window_deadline - loop.time(), 0) if window else None
+            try:
+                item = await asyncio.wait_for(files.get(), timeout)
+            except asyncio.TimeoutError:
+                yield window
+                window, window_bytes = [], 0
+                continue
+
+            if item is None:
+                break
+
+            if not window:
+                window_deadline = loop.time() + max_wait
+            github_file, size = item
+            window.append(github_file)
+            window_bytes += size
+
+            if len(window) >= window_size or window_bytes >= window_max_bytes:
+                yield window
+                window, window_bytes = [], 0
+
+        if window:
+            yield window
+
+        # Surface fetch errors once every fetched file has been handed out.
+        await producer
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+async def _analyze_file_stream(
+    *,
+    logger=structlog.get_logger(),
+    cohere_api_key: str,
+    openai_api_key: str,
+    github_files: ty.AsyncIterator[GithubFile],
+    top_n: int | None = None,
+    group_of: ty.Callable[[str], str] | None = None,
+) -> FileAnalysis:
+    """Reranks and analyses files while they are still being fetched.
+
+    Files are reranked in windows as they arrive and only the relevant ones
+    are kept. Without `top_n` every relevant file is final, so each window's
+    files are analysed right away. With `top_n`, files scoring at least
+    RELEVANCE_SCORE_EARLY_START that rank in the best `top_n` so far are
+    analysed early, and the best remaining files are analysed once every
+    window is scored. Only the best `top_n` files are kept between windows.
+    Results of early files that miss the final `top_n` are dropped, so the
+    outcome matches reranking all files at once. With `group_of`, the best
+    `top_n` files are selected within each group of paths it returns rather
+    than overall.
+
+    Contents live in a memory-budgeted file store and are only loaded by
+    the windows being scored and the files being analysed.
+    """
+    relevant_files: dict[str, list[tuple[float, GithubFile]]] = defaultdict(list)
+    relevant_files_count = 0
+    started_counts: dict[str, int] = defaultdict(int)
+    started_paths: set[str] = set()
+    window_slots = asyncio.Semaphore(RERANK_MAX_CONCURRENT_WINDOWS)
+    scoring_tasks: list[asyncio.Future[None]] = []
+    analysis_tasks: list[asyncio.Future[FileResults]] = []
+
+    file_store = FileStore(logger=logger)
+
+    def group(file: GithubFile) -> str:
+        return group_of(file["path"]) if group_of is not None else ""
+
+    def analyze(files: list[GithubFile]):
+        started_paths.update(file["path"] for file in files)
+        for file in files:
+            file_store.discard(file["path"])
+
+        analysis_tasks.append(
+            asyncio.ensure_future(
+                _analyze_files(
+                    logger=logger,
+                    openai_api_key=openai_api_key,
+                    github_files=files,
+                )
+            )
+        )
+
+    async def score_window(window: list[GithubFile]):
+        nonlocal relevant_files_count
+
+        try:
+            with stage("rerank", logger=logger):
+                file_scores = await score_github_source_files(
+                    logger=logger,
+                    reranker_api_key=cohere_api_key,
+                    source_code_files=[
+                        _load_content(file, file_store) for file in window
+                    ],
+                )
+        finally:
+            window_slots.release()
+
+        window_relevant_files: list[tuple[float, GithubFile]] = []
+        for score, file in sorted(file_scores, key=_relevance_order):
+            if score >= RELEVANCE_SCORE_THRESHOLD:
+                window_relevant_files.append((score, file))
+            else:
+                file_store.discard(file["path"])
+
+        # Contents stay in the store, only metadata is kept for later.
+        relevant_files_count += len(window_relevant_files)
+        window_groups: set[str] = set()
+        for score, file in window_relevant_files:
+            window_groups.add(group(file))
+            relevant_files[group(file)].append((score, _file_metadata(file)))
+
+        # Files outside the best `top_n` of their group so far can never be
+        # selected.
+        best_paths: set[str] = set()
+        for name in window_groups:
+            group_files = relevant_files[name]
+            if top_n is not None and len(group_files) > top_n:
+                group_files.sort(key=_relevance_order)
+                for _, file in group_files[top_n:]:
+                    file_store.discard(file["path"])
+                del group_files[top_n:]
+            best_paths.update(file["path"] for _, file in group_files)
 
-    for resource, actions in statements.items():
-        iam_policy["Statement"].append(
-            {
-                "Effect": "Allow",
-                "Action": list(actions),
-                "Resource": resource,
-            }
+        if top_n is None:
+            early_files = [file for _, file in window_relevant_files]
+        else:
+            early_files = []
+            for score, file in window_relevant_files:
+                if (
+                    score >= RELEVANCE_SCORE_EARLY_START
+                    and file["path"] in best_paths
+                    and started_counts[group(file)] < top_n
+                ):
+                    started_counts[group(file)] += 1
+                    early_files.append(file)
+
+        if early_files:
+            logger.info("analysing files early", files_count=len(early_files))
+            analyze(early_files)
+
+    try:
+        windows = _iter_file_windows(
+            logger=logger, github_files=github_files, file_store=file_store
+        )
+        async with contextlib.aclosing(windows):
+            async for window in windows:
+                # Waiting for a slot holds back windows, and through the
+                # bounded queue the fetching, while the reranker is saturated.
+                await window_slots.acquire()
+                scoring_tasks.append(asyncio.ensure_future(score_window(window)))
+
+        await asyncio.gather(*scoring_tasks)
+
+        selected = [
+            item
+            for group_files in relevant_files.values()
+            for item in sorted(group_files, key=_relevance_order)[:top_n]
+        ]
+        selected.sort(key=_relevance_order)
+        selected_files = [file for _, file in selected]
+        remaining_files = [
+            _load_content(file, file_store)
+            for file in selected_files
+            if file["path"] not in started_paths
+        ]
+
+        logger.info(
+            "selected relevant files",
+            relevant_files_count=relevant_files_count,
+            selected_files_count=len(selected_files),
+            early_files_count=len(started_paths),
+            **file_store.stats(),
+        )
+
+        if remaining_files:
+            analyze(remaining_files)
+
+        file_results: FileResults = {}
+        for results in await asyncio.gather(*analysis_tasks):
+            file_results.update(results)
+    finally:
+        for task in (*scoring_tasks, *analysis_tasks):
+            task.cancel()
+        await asyncio.gather(*scoring_tasks, *analysis_tasks, return_exceptions=True)
+        file_store.close()
+
+    # Keep the ranking order, later stages rely on it for stable output.
+    # Files the LLM returned nothing for have no calls, so the selection is
+    # kept whole for incremental runs.
+    return FileAnalysis(
+        results={
+            file["path"]: file_results.get(file["path"], [])
+            for _, file in selected
+        },
+        scores={file["path"]: score for score, file in selected},
+    )
+
+
+def _relevance_order(item: tuple[float, GithubFile]) -> tuple[float, str]:
+    # Ties are broken by path, files arrive in no particular order.
+    score, file = item
+    return -score, file["path"]
+
+
+async def _analyze_files(
+    *,
+    logger=structlog.get_logger(),
+    openai_api_key: str,
+    github_files: list[GithubFile],
+) -> FileResults:
+    """Analyses files, packing small ones into shared LLM requests."""
+    with stage("analyze", logger=logger):
+        return await _analyze_files_in_packs(
+            logger=logger,
+            openai_api_key=openai_api_key,
+            github_files=github_files,
+        )
+
+
+async def _analyze_files_in_packs(
+    *,
+    logger=structlog.get_logger(),
+    openai_api_key: str,
+    github_files: list[GithubFile],
+) -> FileResults:
+    file_results: FileResults = {}
+
+    llm_files: list[GithubFile] = []
+    for file in github_files:
+        static_analysis = extract_aws_sdk_calls(
+            file_path=file["path"],
+            source_code=file.get("content", ""),
+        )
+        if static_analysis is not None and static_analysis["fully_resolved"]:
+            logger.info(
+                "resolved aws sdk calls with static analysis",
+                file_path=file["path"],
+                sdk_calls=static_analysis["sdk_calls"],
+            )
+            file_results[file["path"]] = static_analysis["sdk_calls"]
+        else:
+            llm_files.append(file)
+
+    small_files = [f for f in llm_files if file_tokens(f) <= PACKED_FILE_MAX_TOKENS]
+    packs = pack_files(small_files)
+
+    single_files = [f for f in llm_files if file_tokens(f) > PACKED_FILE_MAX_TOKENS]
+    single_files.extend(pack[0] for pack in packs if len(pack) == 1)
+    packs = [pack for pack in packs if len(pack) > 1]
+
+    logger.info(
+        "scheduled files for llm analysis",
+        static_files_count=len(file_results),
+        single_files_count=len(single_files),
+        packs_count=len(packs),
+        packed_files_count=sum(len(pack) for pack in packs),
+    )
+
+    single_results = await asyncio.gather(
+        *(
+            _find_aws_sdk_calls_in_file(
+                logger=logger.bind(file_path=file["path"]),
+                openai_api_key=openai_api_key,
+                file_path=file["path"],
+                file_content=file.get("content", ""),
+            )
+            for file in single_files
+        )
+    )
+    pack_results = await asyncio.gather(
+        *(
+            _find_aws_sdk_calls_in_pack(
+                logger=logger,
+                openai_api_key=openai_api_key,
+                github_files=pack,
+            )
+            for pack in packs
         )
+    )
+
+    for file, sdk_calls in zip(single_files, single_results):
+        file_results[file["path"]] = sdk_calls
+    for results in pack_results:
+        file_results.update(results)
+
+    # Keep the input order, later stages rely on it for stable output.
+    return {
+        file["path"]: file_results[file["path"]]
+        for file in github_files
+        if file["path"] in file_results
+    }
+
+
+def _generate_iam_policy_from_file_results(
+    *,
+    logger=structlog.get_logger(),
+    file_results: FileResults,
+) -> str:
+    statements: dict[str, set[str]] = defaultdict(set)
+    for aws_stmts in file_results.values():
+        for stmt in aws_stmts:
+            statements[stmt.resource].add(f"{stmt.service}:{stmt.action}")
+
+    logger.info("final list of actions", actions_dict=statements)
+
+    with stage("compile", logger=logger):
+        iam_policy = compile_iam_policy(logger=logger, statements=statements)
+
+    return render_iam_policy(iam_policy)
+
+
+def _relevant_aws_services(service_names: ty.Iterable[str]) -> dict[str, set[str]]:
+    aws_services_map = aws_iam_actions.AWS_SERVICES_MAP
+
+    relevant_aws_services: dict[str, set[str]] = {}
+    for aws_service in service_names:
+        if aws_service not in aws_services_map:
+            continue
+        relevant_aws_services[aws_service] = aws_services_map[aws_service]
+
+    return relevant_aws_services
+
+
+def _validate_aws_sdk_calls(
+    *,
+    logger=structlog.get_logger(),
+    sdk_calls: list[AwsSdkCall],
+) -> list[AwsSdkCall]:
+    """Repairs actions the catalog can match and drops the remaining ones."""
+    action_index = get_aws_action_index()
+
+    valid_sdk_calls: list[AwsSdkCall] = []
+    for sdk_call in sdk_calls:
+        resolved_actions = action_index.resolve(sdk_call.service, sdk_call.action)
+        if not resolved_actions:
+            AWS_SDK_CALL_VALIDATIONS_TOTAL.inc(outcome="dropped")
+            logger.error(
+                "invalid aws service action",
+                invalid_action=sdk_call.action,
+                invalid_service=sdk_call.service,
+            )
+            continue
+
+        for resolved in resolved_actions:
+            AWS_SDK_CALL_VALIDATIONS_TOTAL.inc(outcome=resolved["repair"])
+            if resolved["repair"] == "exact":
+                valid_sdk_calls.append(sdk_call)
+                continue
+
+            logger.info(
+                "repaired aws service action",
+                invalid_action=sdk_call.action,
+                invalid_service=sdk_call.service,
+                action=resolved["action"],
+                service=resolved["service"],
+                repair=resolved["repair"],
+            )
+            valid_sdk_calls.append(
+                sdk_call.model_copy(
+                    update={
+                        "service": resolved["service"],
+                        "action": resolved["action"],
+                    }
+                )
+            )
+
+    return valid_sdk_calls
+
 
-    return iam_policy
+async def _find_aws_sdk_calls_in_file(
+    *,
+    logger=structlog.get_logger(),
+    openai_api_key: str,
+    file_path: str,
+    file_content: str,
+) -> list[AwsSdkCall]:
+    """Analyses a file, splitting large ones into chunks analysed in parallel."""
+    with stage("file_analysis", logger=logger):
+        return await _find_aws_sdk_calls_in_chunks(
+            logger=logger,
+            openai_api_key=openai_api_key,
+            file_path=file_path,
+            file_content=file_content,
+        )
 
 
-async def _get_relevant_aws_sdk_calls_from_file(
+async def _find_aws_sdk_calls_in_chunks(
     *,
     logger=structlog.get_logger(),
     openai_api_key: str,
     file_path: str,
     file_content: str,
 ) -> list[AwsSdkCall]:
-    logger = logger.bind(file_path=file_path)
-    logger.info("processing relevant source file")
+    chunks = chunk_source_file(file_path=file_path, source_code=file_content)
+
+    if len(chunks) == 1:
+        return await _find_aws_sdk_calls_in_source(
+            logger=logger,
+            openai_api_key=openai_api_key,
+            file_path=file_path,
+            source_code=chunks[0],
+        )
+
+    logger.info("analysing large source file in chunks", chunks_count=len(chunks))
+
+    chunk_results = await asyncio.gather(
+        *(
+            _find_aws_sdk_calls_in_source(
+                logger=logger.bind(chunk_index=chunk_index),
+                openai_api_key=openai_api_key,
+                file_path=file_path,
+                source_code=chunk,
+            )
+            for chunk_index, chunk in enumerate(chunks)
+        )
+    )
+
+    return _merge_aws_sdk_calls(chunk_results)
+
 
+def _merge_aws_sdk_calls(results: list[list[AwsSdkCall]]) -> list[AwsSdkCall]:
+    """Merges the calls found in several chunks, keeping the first duplicate."""
+    merged: dict[tuple[str, str, str], AwsSdkCall] = {}
+    for sdk_calls in results:
+        for sdk_call in sdk_calls:
+            key = (sdk_call.service, sdk_call.action, sdk_call.resource)
+            merged.setdefault(key, sdk_call)
+
+    return list(merged.values())
+
+
+async def _find_aws_sdk_calls_in_source(
+    *,
+    logger=structlog.get_logger(),
+    openai_api_key: str,
+    file_path: str,
+    source_code: str,
+) -> list[AwsSdkCall]:
     aws_services = await find_aws_service_names(
         logger=logger,
         openai_api_key=openai_api_key,
-        source_code=file_content,
+        source_code=source_code,
         file_path=file_path,
     )
 
-    relevant_aws_services: dict[str, set[str]] = {}
-    for aws_service in aws_services.service_names:
-        if aws_service not in AWS_SERVICES_MAP:
-            # TODO: add logging behaviour
-            continue
-        relevant_aws_services[aws_service] = AWS_SERVICES_MAP[aws_service]
-
     sdk_calls = await find_aws_sdk_calls(
         logger=logger,
         api_key=openai_api_key,
-        source_code=file_content,
+        source_code=source_code,
         file_path=file_path,
-        aws_services=relevant_aws_services,
+        aws_services=_relevant_aws_services(aws_services.service_names),
     )
 
-    logger.bind(aws_statements=sdk_calls.sdk_calls)
+    return _validate_aws_sdk_calls(logger=logger, sdk_calls=sdk_calls.sdk_calls)
 
-    for idx, stmt in enumerate(sdk_calls.sdk_calls):
-        if not _is_valid_aws_service_action(
+
+async def _find_aws_sdk_calls_in_pack(
+    *,
+    logger=structlog.get_logger(),
+    openai_api_key: str,
+    github_files: list[GithubFile],
+) -> FileResults:
+    with stage("pack_analysis", logger=logger):
+        return await _find_aws_sdk_calls_in_files(
             logger=logger,
-            service=stmt.service,
-            action=stmt.action,
-        ):
-            logger.error(
-                "invalid aws service action",
-                invalid_action=stmt.action,
-                invalid_service=stmt.service,
+            openai_api_key=openai_api_key,
+            github_files=github_files,
+        )
+
+
+async def _find_aws_sdk_calls_in_files(
+    *,
+    logger=structlog.get_logger(),
+    openai_api_key: str,
+    github_files: list[GithubFile],
+) -> FileResults:
+    """Analyses a pack of small files with one request per stage.
+
+    Files the model leaves out of a response are analysed on their own.
+    """
+    logger = logger.bind(file_paths=[file["path"] for file in github_files])
+    logger.info("processing packed relevant source files")
+
+    source_files = {file["path"]: file.get("content", "") for file in github_files}
+
+    service_names = await find_aws_service_names_for_files(
+        logger=logger,
+        openai_api_key=openai_api_key,
+        source_files=source_files,
+    )
+
+    file_results: FileResults = {}
+
+    # Files without any AWS service do not need the second stage.
+    aws_source_files: dict[str, str] = {}
+    for file_path, names in service_names.items():
+        if _relevant_aws_services(names):
+            aws_source_files[file_path] = source_files[file_path]
+        else:
+            file_results[file_path] = []
+
+    if aws_source_files:
+        sdk_calls = await find_aws_sdk_calls_for_files(
+            logger=logger,
+            api_key=openai_api_key,
+            source_files=aws_source_files,
+            service_names=service_names,
+        )
+        for file_path in aws_source_files:
+            if file_path in sdk_calls:
+                file_results[file_path] = _validate_aws_sdk_calls(
+                    logger=logger.bind(file_path=file_path),
+                    sdk_calls=sdk_calls[file_path],
+                )
+
+    missing_files = [
+        file for file in github_files if file["path"] not in file_results
+    ]
+    if missing_files:
+        logger.warning(
+            "packed response missed files, analysing them individually",
+            missing_file_paths=[file["path"] for file in missing_files],
+        )
+
+        missing_results = await asyncio.gather(
+            *(
+                _find_aws_sdk_calls_in_file(
+                    logger=logger.bind(file_path=file["path"]),
+                    openai_api_key=openai_api_key,
+                    file_path=file["path"],
+                    file_content=file.get("content", ""),
+                )
+                for file in missing_files
             )
-            del sdk_calls.sdk_calls[idx]
-            continue
+        )
+        for file, sdk_calls_list in zip(missing_files, missing_results):
+            file_results[file["path"]] = sdk_calls_list
 
-    return sdk_calls.sdk_calls
+    return file_results
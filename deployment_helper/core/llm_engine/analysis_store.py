@@ -0,0 +1,189 @@
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+import typing as ty
+
+import structlog
+
+from deployment_helper.core.cache.blob_cache import CACHE_DIR
+from deployment_helper.core.llm_engine.aws_analyzer import AwsSdkCall, AwsSdkCalls
+
+# Number of analysed commits kept per repository; older ones are pruned.
+ANALYSIS_STORE_MAX_COMMITS_PER_REPOSITORY = 50
+
+FileResults = dict[str, list[AwsSdkCall]]
+FileScores = dict[str, float]
+
+
+class FileAnalysis(ty.NamedTuple):
+    results: FileResults
+    # Relevance score of every selected file, the keys of `results`.
+    scores: FileScores
+
+
+class AnalysisStore:
+    """SQLite store of per-file `AwsSdkCall` results for analysed commits.
+
+    A commit is only considered analysed once its full result set has been
+    saved, so incremental runs never build on a partial baseline. Queries
+    block on SQLite, so async callers run them in a thread.
+    """
+
+    def __init__(
+        self,
+        *,
+        logger=structlog.get_logger(),
+        path: str = os.path.join(CACHE_DIR, "analysis.sqlite3"),
+    ):
+        self.logger = logger
+        # The connection is shared by the threads queries run in.
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS analysed_commits (
+                repository TEXT NOT NULL,
+                commit_sha TEXT NOT NULL,
+                completed_at REAL,
+                PRIMARY KEY (repository, commit_sha)
+            );
+            CREATE TABLE IF NOT EXISTS file_results (
+                repository TEXT NOT NULL,
+                commit_sha TEXT NOT NULL,
+                path TEXT NOT NULL,
+                sdk_calls TEXT NOT NULL,
+                PRIMARY KEY (repository, commit_sha, path)
+            );
+            """
+        )
+
+        # Stores created before scores were kept have results without one,
+        # which incremental runs cannot build on.
+        columns = {
+            row[1]
+            for row in self._connection.execute("PRAGMA table_info(file_results)")
+        }
+        if "score" not in columns:
+            self._connection.execute("ALTER TABLE file_results ADD COLUMN score REAL")
+
+    def get_results(self, *, repository: str, commit_sha: str) -> FileAnalysis | None:
+        """Returns the stored analysis of a fully analysed commit, if any."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT completed_at FROM analysed_commits"
+                " WHERE repository = ? AND commit_sha = ?",
+                (repository, commit_sha),
+            ).fetchone()
+
+            if row is None or row[0] is None:
+                return None
+
+            rows = self._connection.execute(
+                "SELECT path, sdk_calls, score FROM file_results"
+                " WHERE repository = ? AND commit_sha = ?"
+                " ORDER BY score DESC, path",
+                (repository, commit_sha),
+            ).fetchall()
+
+        if any(score is None for _, _, score in rows):
+            return None
+
+        return FileAnalysis(
+            results={
+                path: AwsSdkCalls.model_validate_json(sdk_calls).sdk_calls
+                for path, sdk_calls, _ in rows
+            },
+            scores={path: score for path, _, score in rows},
+        )
+
+    def save_results(
+        self,
+        *,
+        repository: str,
+        commit_sha: str,
+        analysis: FileAnalysis,
+    ):
+        """Replaces the results of `commit_sha` and marks it as analysed."""
+        with self._lock, self._transaction():
+            self._connection.execute(
+                "DELETE FROM file_results WHERE repository = ? AND commit_sha = ?",
+                (repository, commit_sha),
+            )
+            self._connection.executemany(
+                "INSERT INTO file_results"
+                " (repository, commit_sha, path, sdk_calls, score)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        repository,
+                        commit_sha,
+                        path,
+                        AwsSdkCalls(sdk_calls=sdk_calls).model_dump_json(),
+                        analysis.scores[path],
+                    )
+                    for path, sdk_calls in analysis.results.items()
+                ),
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO analysed_commits"
+                " (repository, commit_sha, completed_at) VALUES (?, ?, ?)",
+                (repository, commit_sha, time.time()),
+            )
+            self._prune(repository=repository)
+
+    def _prune(self, *, repository: str):
+        stale_commits = self._connection.execute(
+            "SELECT commit_sha FROM analysed_commits WHERE repository = ?"
+            " ORDER BY completed_at DESC LIMIT -1 OFFSET ?",
+            (repository, ANALYSIS_STORE_MAX_COMMITS_PER_REPOSITORY),
+        ).fetchall()
+
+        for (commit_sha,) in stale_commits:
+            self._connection.execute(
+                "DELETE FROM file_results WHERE repository = ? AND commit_sha = ?",
+                (repository, commit_sha),
+            )
+            self._connection.execute(
+                "DELETE FROM analysed_commits WHERE repository = ? AND commit_sha = ?",
+                (repository, commit_sha),
+            )
+
+    @contextlib.contextmanager
+    def _transaction(self) -> ty.Iterator[None]:
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+
+_analysis_store: AnalysisStore | None = None
+
+
+def get_analysis_store() -> AnalysisStore:
+    """Returns the process-wide analysis store, opening it on first use."""
+    global _analysis_store
+
+    if _analysis_store is None:
+        _analysis_store = AnalysisStore()
+
+    return _analysis_store
+
+
+__ALL__ = [
+    "AnalysisStore",
+    "FileAnalysis",
+    "FileResults",
+    "FileScores",
+    "get_analysis_store",
+]
@@ -1,11 +1,84 @@
+import asyncio
+import hashlib
+
 import yaml
-import json
 import structlog
 import typing as ty
 from pydantic import BaseModel, Field
 
-from deployment_helper.core.aws_iam_actions import AWS_SERVICE_NAMES, AWS_SERVICES_MAP
+from deployment_helper.core import aws_iam_actions
+from deployment_helper.core.cache.llm_cache import (
+    LLM_CACHE_MODE,
+    CacheMode,
+    get_llm_cache,
+    llm_cache_key,
+)
 from deployment_helper.core.clients import openai
+from deployment_helper.core.llm_engine.catalog_pruning import (
+    SourceIdentifiers,
+    prune_aws_services,
+    rank_service_names,
+)
+
+ResponseModel = ty.TypeVar("ResponseModel", bound=BaseModel)
+
+
+async def _invoke_structured_cached(
+    *,
+    logger=structlog.get_logger(),
+    api_key: str,
+    user_prompt: str,
+    response_format: type[ResponseModel],
+    cache_key: str,
+    cache_mode: CacheMode,
+) -> ResponseModel:
+    """Invokes the structured OpenAI api, going through the llm cache."""
+    llm_cache = get_llm_cache() if cache_mode != "bypass" else None
+
+    if llm_cache is not None and cache_mode == "use":
+        cached_response = await asyncio.to_thread(llm_cache.get, cache_key)
+        if cached_response is not None:
+            logger.debug(
+                "obtained response from llm cache",
+                response_format=response_format.__name__,
+            )
+            return response_format.model_validate_json(cached_response)
+
+    response = await openai.invoke_structured(
+        openai_api_key=api_key,
+        user_prompt=user_prompt,
+        response_format=response_format,
+    )
+
+    if llm_cache is not None:
+        await asyncio.to_thread(llm_cache.put, cache_key, response.model_dump_json())
+
+    return response
+
+
+def _format_aws_services(
+    aws_services: dict[str, set[str]] | None,
+    source_code: str,
+    prune_catalog: bool,
+) -> str:
+    """Renders the actions offered to the model, pruned to the likely ones."""
+    if aws_services is None:
+        aws_services = aws_iam_actions.AWS_SERVICES_MAP
+
+    if prune_catalog:
+        return yaml.dump(
+            prune_aws_services(aws_services, SourceIdentifiers(source_code)),
+            sort_keys=False,
+        )
+
+    return yaml.dump(aws_services, sort_keys=False)
+
+
+def _format_aws_service_names(source_code: str, prune_catalog: bool) -> str:
+    if prune_catalog:
+        return yaml.dump(rank_service_names(SourceIdentifiers(source_code)))
+
+    return yaml.dump(aws_iam_actions.AWS_SERVICE_NAMES)
 
 
 AWS_SDK_CALLS_PROMPT = """
@@ -62,19 +135,32 @@ async def find_aws_sdk_calls(
     api_key: str,
     source_code: str,
     file_path: str,
-    aws_services: dict[str, set[str]] = AWS_SERVICES_MAP,
+    aws_services: dict[str, set[str]] | None = None,
+    cache_mode: CacheMode = LLM_CACHE_MODE,
+    prune_catalog: bool = True,
 ) -> AwsSdkCalls:
-    aws_services_with_actions_str = yaml.dump(aws_services, sort_keys=False)
+    aws_services_with_actions_str = _format_aws_services(
+        aws_services, source_code, prune_catalog
+    )
 
     user_prompt = AWS_SDK_CALLS_PROMPT.format(
         source_code=source_code,
         file_path=file_path,
         aws_services=aws_services_with_actions_str,
     )
-    response = await openai.invoke_structured(
-        openai_api_key=api_key,
+    response = await _invoke_structured_cached(
+        logger=logger,
+        api_key=api_key,
         user_prompt=user_prompt,
         response_format=AwsSdkCalls,
+        cache_key=llm_cache_key(
+            model_name=openai.MODEL_NAME,
+            prompt_template=AWS_SDK_CALLS_PROMPT,
+            source_code=source_code,
+            file_path=file_path,
+            aws_services=aws_services_with_actions_str,
+        ),
+        cache_mode=cache_mode,
     )
 
     logger.info(
@@ -130,18 +216,29 @@ async def find_aws_service_names(
     openai_api_key: str,
     source_code: str,
     file_path: str,
+    cache_mode: CacheMode = LLM_CACHE_MODE,
+    prune_catalog: bool = True,
 ) -> AwsServices:
-    aws_service_names_str = yaml.dump(AWS_SERVICE_NAMES)
+    aws_service_names_str = _format_aws_service_names(source_code, prune_catalog)
 
     user_prompt = AWS_SERVICES_PROMPT.format(
         source_code=source_code,
         file_path=file_path,
         aws_service_names=aws_service_names_str,
     )
-    response = await openai.invoke_structured(
-        openai_api_key=openai_api_key,
+    response = await _invoke_structured_cached(
+        logger=logger,
+        api_key=openai_api_key,
         user_prompt=user_prompt,
         response_format=AwsServices,
+        cache_key=llm_cache_key(
+            model_name=openai.MODEL_NAME,
+            prompt_template=AWS_SERVICES_PROMPT,
+            source_code=source_code,
+            file_path=file_path,
+            aws_service_names=aws_service_names_str,
+        ),
+        cache_mode=cache_mode,
     )
 
     logger.info(
@@ -151,46 +248,306 @@ async def find_aws_service_names(
     return response
 
 
-REFINE_IAM_POLICY = """
-I have an AWS IAM policy that contains placeholders and example values. Please
-refine this policy by removing all placeholders or example values and ensuring
-it is valid. The policy should maintain the original intent while being clear
-and concise.
-
-GUIDELINES:
-1. The ARN should not include placeholder or examples such as "bucketName",
-   "objectName" etc.
-2. The ARN should not contain any templated variables such as ${{bucketName}},
-   <bucket-name> etc. Instead replace it with "*" wildcards.
-3. It should not contain duplicate actions or redundant statements.
-4. If there is no actions in the policy, don't try to add any extra actions.
-
+MULTI_FILE_INPUT = """
+The input contains several source files separated by their File Path. Analyze
+every file independently and return exactly one result per file, using the
+File Path exactly as given.
 
 INPUT:
-{policy}
+
+{source_files}
 """
 
+AWS_SERVICES_MULTI_FILE_PROMPT = (
+    AWS_SERVICES_PROMPT.split("INPUT:")[0] + MULTI_FILE_INPUT
+)
+
+AWS_SDK_CALLS_MULTI_FILE_PROMPT = (
+    AWS_SDK_CALLS_PROMPT.split("INPUT:")[0] + MULTI_FILE_INPUT
+)
+
+
+def _format_source_files(source_files: dict[str, str]) -> str:
+    return "\n".join(
+        f"File Path: {file_path}\nSource Code:\n```\n{source_code}\n```\n"
+        for file_path, source_code in source_files.items()
+    )
+
+
+class FileAwsServices(BaseModel):
+    file_path: str
+    service_names: list[str]
+
 
-class AwsIamPolicy(BaseModel):
-    policy_document: str
+class MultiFileAwsServices(BaseModel):
+    files: list[FileAwsServices]
 
 
-async def refine_iam_policy(
+class FileAwsSdkCalls(BaseModel):
+    file_path: str
+    sdk_calls: list[AwsSdkCall]
+
+
+class MultiFileAwsSdkCalls(BaseModel):
+    files: list[FileAwsSdkCalls]
+
+
+FileResponse = ty.TypeVar("FileResponse", FileAwsServices, FileAwsSdkCalls)
+
+
+def _file_cache_key(
+    *,
+    prompt_template: str,
+    file_path: str,
+    source_code: str,
+    catalog: str,
+) -> str:
+    """Keys one file of a pack on its own and the catalog it was shown.
+
+    Results are cached per file rather than per request, so a pack reuses
+    the files it shares with an earlier one. The catalog is pruned for the
+    whole pack, which shapes the answer for every file in it.
+    """
+    return llm_cache_key(
+        model_name=openai.MODEL_NAME,
+        prompt_template=prompt_template,
+        source_code=source_code,
+        file_path=file_path,
+        catalog=hashlib.sha256(catalog.encode("utf-8")).hexdigest(),
+    )
+
+
+async def _get_cached_files(
+    cache_keys: dict[str, str],
+    response_format: type[FileResponse],
+    cache_mode: CacheMode,
+) -> dict[str, FileResponse]:
+    if cache_mode != "use":
+        return {}
+
+    llm_cache = get_llm_cache()
+
+    def get_all() -> dict[str, str | None]:
+        return {
+            file_path: llm_cache.get(cache_key)
+            for file_path, cache_key in cache_keys.items()
+        }
+
+    cached_responses = await asyncio.to_thread(get_all)
+    return {
+        file_path: response_format.model_validate_json(cached_response)
+        for file_path, cached_response in cached_responses.items()
+        if cached_response is not None
+    }
+
+
+async def _put_cached_files(
+    cache_keys: dict[str, str],
+    responses: dict[str, FileResponse],
+    cache_mode: CacheMode,
+):
+    if cache_mode == "bypass":
+        return
+
+    llm_cache = get_llm_cache()
+    values = {
+        cache_keys[file_path]: response.model_dump_json()
+        for file_path, response in responses.items()
+    }
+
+    def put_all():
+        for cache_key, value in values.items():
+            llm_cache.put(cache_key, value)
+
+    await asyncio.to_thread(put_all)
+
+
+async def find_aws_service_names_for_files(
     *,
     logger=structlog.get_logger(),
     openai_api_key: str,
-    iam_policy: ty.Any,
-):
-    iam_policy_str = json.dumps(iam_policy, indent=4)
-    user_prompt = REFINE_IAM_POLICY.format(policy=iam_policy_str)
+    source_files: dict[str, str],
+    cache_mode: CacheMode = LLM_CACHE_MODE,
+    prune_catalog: bool = True,
+) -> dict[str, list[str]]:
+    """Finds the AWS services used by several files in a single request.
+
+    Cached files are left out of the request. Returns the service names per
+    file path; files missing from the response are missing from the result
+    as well.
+    """
+    aws_service_names = _format_aws_service_names(
+        _format_source_files(source_files), prune_catalog
+    )
+    cache_keys = {
+        file_path: _file_cache_key(
+            prompt_template=AWS_SERVICES_MULTI_FILE_PROMPT,
+            file_path=file_path,
+            source_code=source_code,
+            catalog=aws_service_names,
+        )
+        for file_path, source_code in source_files.items()
+    }
+    responses = await _get_cached_files(cache_keys, FileAwsServices, cache_mode)
+
+    missing_files = {
+        file_path: source_code
+        for file_path, source_code in source_files.items()
+        if file_path not in responses
+    }
+    logger.debug(
+        "obtained packed files from llm cache",
+        cached_files_count=len(responses),
+        missing_files_count=len(missing_files),
+    )
 
-    response = await openai.invoke_structured(
-        openai_api_key=openai_api_key,
-        user_prompt=user_prompt,
-        response_format=AwsIamPolicy,
+    if missing_files:
+        user_prompt = AWS_SERVICES_MULTI_FILE_PROMPT.format(
+            source_files=_format_source_files(missing_files),
+            aws_service_names=aws_service_names,
+        )
+        response = await openai.invoke_structured(
+            openai_api_key=openai_api_key,
+            user_prompt=user_prompt,
+            response_format=MultiFileAwsServices,
+        )
+
+        fresh_responses = {
+            file.file_path: file
+            for file in response.files
+            if file.file_path in missing_files
+        }
+        await _put_cached_files(cache_keys, fresh_responses, cache_mode)
+        responses.update(fresh_responses)
+
+    service_names = {
+        file_path: responses[file_path].service_names
+        for file_path in source_files
+        if file_path in responses
+    }
+
+    logger.info(
+        "obtained aws service names used in the files",
+        service_names=service_names,
     )
+    return service_names
 
-    return response
+
+async def find_aws_sdk_calls_for_files(
+    *,
+    logger=structlog.get_logger(),
+    api_key: str,
+    source_files: dict[str, str],
+    service_names: dict[str, list[str]],
+    cache_mode: CacheMode = LLM_CACHE_MODE,
+    prune_catalog: bool = True,
+) -> dict[str, list[AwsSdkCall]]:
+    """Finds the AWS SDK calls of several files in a single request.
+
+    `service_names` holds the services found in each file; the request
+    offers the actions of those used by the pack.
+    """
+    aws_services_map = aws_iam_actions.AWS_SERVICES_MAP
+    # Sorted, so the catalog does not depend on the order of the files.
+    aws_services = {
+        name: aws_services_map[name]
+        for name in sorted(
+            {
+                name
+                for file_path in source_files
+                for name in service_names.get(file_path, ())
+                if name in aws_services_map
+            }
+        )
+    }
+    catalog = _format_aws_services(
+        aws_services, _format_source_files(source_files), prune_catalog
+    )
+
+    cache_keys = {
+        file_path: _file_cache_key(
+            prompt_template=AWS_SDK_CALLS_MULTI_FILE_PROMPT,
+            file_path=file_path,
+            source_code=source_code,
+            catalog=catalog,
+        )
+        for file_path, source_code in source_files.items()
+    }
+    responses = await _get_cached_files(cache_keys, FileAwsSdkCalls, cache_mode)
+
+    missing_files = {
+        file_path: source_code
+        for file_path, source_code in source_files.items()
+        if file_path not in responses
+    }
+    logger.debug(
+        "obtained packed files from llm cache",
+        cached_files_count=len(responses),
+        missing_files_count=len(missing_files),
+    )
+
+    if missing_files:
+        user_prompt = AWS_SDK_CALLS_MULTI_FILE_PROMPT.format(
+            source_files=_format_source_files(missing_files),
+            aws_services=catalog,
+        )
+        response = await openai.invoke_structured(
+            openai_api_key=api_key,
+            user_prompt=user_prompt,
+            response_format=MultiFileAwsSdkCalls,
+        )
+
+        # A file listed more than once gets the calls of every entry.
+        fresh_responses: dict[str, FileAwsSdkCalls] = {}
+        for file in response.files:
+            if file.file_path in missing_files:
+                fresh_responses.setdefault(
+                    file.file_path,
+                    FileAwsSdkCalls(file_path=file.file_path, sdk_calls=[]),
+                ).sdk_calls.extend(file.sdk_calls)
+
+        await _put_cached_files(cache_keys, fresh_responses, cache_mode)
+        responses.update(fresh_responses)
+
+    sdk_calls = {
+        file_path: responses[file_path].sdk_calls
+        for file_path in source_files
+        if file_path in responses
+    }
+
+    logger.info(
+        "obtained aws sdk call statements used in the files",
+        sdk_calls=sdk_calls,
+    )
+
+    return sdk_calls
+
+
+def build_aws_services_prompt(
+    *,
+    source_code: str,
+    file_path: str,
+    prune_catalog: bool = True,
+) -> str:
+    return AWS_SERVICES_PROMPT.format(
+        source_code=source_code,
+        file_path=file_path,
+        aws_service_names=_format_aws_service_names(source_code, prune_catalog),
+    )
+
+
+def build_aws_sdk_calls_prompt(
+    *,
+    source_code: str,
+    file_path: str,
+    aws_services: dict[str, set[str]] | None = None,
+    prune_catalog: bool = True,
+) -> str:
+    return AWS_SDK_CALLS_PROMPT.format(
+        source_code=source_code,
+        file_path=file_path,
+        aws_services=_format_aws_services(aws_services, source_code, prune_catalog),
+    )
 
 
 __ALL__ = ["find_aws_service_names", "AwsServices"]
@@ -0,0 +1,169 @@
+import functools
+import re
+
+from deployment_helper.core import aws_iam_actions
+
+# Actions per detected service embedded in the sdk calls prompt.
+PRUNED_ACTIONS_PER_SERVICE = 40
+
+# Service names embedded in the service detection prompt.
+PRUNED_SERVICE_NAMES = 40
+
+# Always offered to the service detection prompt, so wrappers that do not
+# spell out the service name can still be attributed to the common ones.
+COMMON_SERVICE_NAMES = (
+    "cloudwatch",
+    "dynamodb",
+    "ec2",
+    "ecr",
+    "ecs",
+    "events",
+    "iam",
+    "kinesis",
+    "kms",
+    "lambda",
+    "logs",
+    "rds",
+    "s3",
+    "secretsmanager",
+    "ses",
+    "sns",
+    "sqs",
+    "ssm",
+    "states",
+    "sts",
+)
+
+# SDK naming suffixes around operation names, e.g. PutObjectCommand (JS v3),
+# PutObjectInput / PutObjectWithContext (Go).
+_OPERATION_SUFFIXES = ("command", "input", "output", "request", "withcontext")
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_WORD_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+\d*|[A-Z]+\d*|\d+")
+
+
+def _split_words(identifier: str) -> list[str]:
+    """Splits snake_case and camelCase identifiers into lowercase words."""
+    return [word.lower() for word in _WORD_RE.findall(identifier)]
+
+
+def _normalize(identifier: str) -> str:
+    return identifier.replace("_", "").replace("-", "").lower()
+
+
+class SourceIdentifiers:
+    """Identifiers of a source file, normalized for catalog matching."""
+
+    def __init__(self, source_code: str):
+        self.normalized: set[str] = set()
+        self.words: set[str] = set()
+
+        for identifier in set(_IDENTIFIER_RE.findall(source_code)):
+            normalized = _normalize(identifier)
+            self.normalized.add(normalized)
+
+            for suffix in _OPERATION_SUFFIXES:
+                if normalized.endswith(suffix) and len(normalized) > len(suffix):
+                    self.normalized.add(normalized[: -len(suffix)])
+
+            self.words.update(_split_words(identifier))
+
+        # Hyphenated service names only survive in strings and import paths,
+        # e.g. "cognito-idp" or "@aws-sdk/client-cognito-identity-provider".
+        self.normalized.update(
+            _normalize(token)
+            for token in re.findall(r"[a-z0-9]+(?:-[a-z0-9]+)+", source_code)
+        )
+
+
+@functools.cache
+def _action_words(action: str) -> tuple[str, ...]:
+    return tuple(_split_words(action))
+
+
+def _action_score(action: str, identifiers: SourceIdentifiers) -> float:
+    if action.lower() in identifiers.normalized:
+        return 2.0
+
+    words = _action_words(action)
+    if not words:
+        return 0.0
+
+    return sum(word in identifiers.words for word in words) / len(words)
+
+
+def rank_actions(actions: set[str], identifiers: SourceIdentifiers) -> list[str]:
+    """Orders actions by how well they match the identifiers of the source."""
+    return sorted(
+        actions,
+        key=lambda action: (-_action_score(action, identifiers), len(action), action),
+    )
+
+
+def prune_aws_services(
+    aws_services: dict[str, set[str]],
+    identifiers: SourceIdentifiers,
+    *,
+    max_actions_per_service: int = PRUNED_ACTIONS_PER_SERVICE,
+) -> dict[str, list[str]]:
+    """Keeps the best candidate actions of each service for the prompt.
+
+    Actions named exactly in the source are always kept, even past the limit.
+    """
+    pruned_services: dict[str, list[str]] = {}
+
+    for service, actions in aws_services.items():
+        ranked_actions = rank_actions(actions, identifiers)
+        exact_actions = [
+            action
+            for action in ranked_actions
+            if _action_score(action, identifiers) >= 2
+        ]
+        pruned_services[service] = sorted(
+            set(ranked_actions[:max_actions_per_service]) | set(exact_actions)
+        )
+
+    return pruned_services
+
+
+def _service_score(service: str, identifiers: SourceIdentifiers) -> int:
+    normalized = _normalize(service)
+    if normalized in identifiers.words or normalized in identifiers.normalized:
+        return 2
+    if any(normalized in identifier for identifier in identifiers.normalized):
+        return 1
+    return 0
+
+
+def rank_service_names(
+    identifiers: SourceIdentifiers,
+    *,
+    max_service_names: int = PRUNED_SERVICE_NAMES,
+) -> list[str]:
+    """Returns the candidate service names for the service detection prompt."""
+    scored_services = [
+        (score, service)
+        for service in aws_iam_actions.AWS_SERVICE_NAMES
+        # Short prefixes (e.g. "sns", "a4b") match too much by substring, so
+        # they need an exact match.
+        if (score := _service_score(service, identifiers)) > (len(service) <= 3)
+    ]
+
+    ranked_services = [
+        service for _, service in sorted(scored_services, key=lambda s: (-s[0], s[1]))
+    ]
+
+    candidates = ranked_services[:max_service_names]
+    for service in COMMON_SERVICE_NAMES:
+        if service not in candidates:
+            candidates.append(service)
+
+    return sorted(candidates)
+
+
+__ALL__ = [
+    "SourceIdentifiers",
+    "prune_aws_services",
+    "rank_actions",
+    "rank_service_names",
+]
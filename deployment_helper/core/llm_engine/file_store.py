@@ -0,0 +1,140 @@
+import os
+import tempfile
+import typing as ty
+
+import structlog
+
+FILE_STORE_MEMORY_BUDGET_BYTES = int(
+    os.environ.get("DEPLOYMENT_HELPER_FILE_STORE_MEMORY_BUDGET", 64 * 1024 * 1024)
+)
+
+# Contents at least this large go straight to disk, whatever the budget left.
+FILE_STORE_SPILL_MIN_SIZE_BYTES = 1024 * 1024
+
+
+class FileStoreStats(ty.TypedDict):
+    files_count: int
+    resident_bytes: int
+    spilled_files_count: int
+    spilled_bytes: int
+
+
+class FileStore:
+    """Holds the file contents of one analysis within a memory budget.
+
+    Contents stay in memory while they fit the budget, counted in UTF-8
+    bytes as they are on disk. Large contents, and everything stored once
+    the budget is used up, are appended to an anonymous temporary file and
+    read back when asked for. The file is removed when the store is closed.
+    Discarded entries give their memory back to the budget; their disk
+    space is only reclaimed on close.
+    """
+
+    def __init__(
+        self,
+        *,
+        logger=structlog.get_logger(),
+        memory_budget_bytes: int = FILE_STORE_MEMORY_BUDGET_BYTES,
+        spill_min_size_bytes: int = FILE_STORE_SPILL_MIN_SIZE_BYTES,
+        directory: str | None = None,
+    ):
+        self.logger = logger
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_min_size_bytes = spill_min_size_bytes
+        self.directory = directory
+
+        self.resident_bytes = 0
+        self.spilled_bytes = 0
+
+        # Content and encoded size of each file held in memory.
+        self._resident: dict[str, tuple[str, int]] = {}
+        # Offset and length of each spilled content in the spill file.
+        self._spilled: dict[str, tuple[int, int]] = {}
+        self._spill_file: ty.BinaryIO | None = None
+        self._spill_file_size = 0
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._resident or path in self._spilled
+
+    def __len__(self) -> int:
+        return len(self._resident) + len(self._spilled)
+
+    def put(self, path: str, content: str):
+        self.discard(path)
+
+        data = None
+        if content.isascii():
+            size = len(content)
+        else:
+            data = content.encode("utf-8")
+            size = len(data)
+
+        if (
+            size < self.spill_min_size_bytes
+            and self.resident_bytes + size <= self.memory_budget_bytes
+        ):
+            self._resident[path] = (content, size)
+            self.resident_bytes += size
+            return
+
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(
+                dir=self.directory, prefix="deployment-helper-files-"
+            )
+
+        if data is None:
+            data = content.encode("utf-8")
+        offset = self._spill_file_size
+        os.pwrite(self._spill_file.fileno(), data, offset)
+
+        self._spill_file_size += len(data)
+        self._spilled[path] = (offset, len(data))
+        self.spilled_bytes += len(data)
+
+    def get(self, path: str) -> str | None:
+        resident = self._resident.get(path)
+        if resident is not None:
+            return resident[0]
+
+        location = self._spilled.get(path)
+        if location is None or self._spill_file is None:
+            return None
+
+        offset, length = location
+        return os.pread(self._spill_file.fileno(), length, offset).decode("utf-8")
+
+    def discard(self, path: str):
+        resident = self._resident.pop(path, None)
+        if resident is not None:
+            self.resident_bytes -= resident[1]
+
+        location = self._spilled.pop(path, None)
+        if location is not None:
+            self.spilled_bytes -= location[1]
+
+    def stats(self) -> FileStoreStats:
+        return FileStoreStats(
+            files_count=len(self),
+            resident_bytes=self.resident_bytes,
+            spilled_files_count=len(self._spilled),
+            spilled_bytes=self.spilled_bytes,
+        )
+
+    def close(self):
+        self._resident.clear()
+        self._spilled.clear()
+        self.resident_bytes = self.spilled_bytes = 0
+
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            self._spill_file_size = 0
+
+    def __enter__(self) -> "FileStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+__ALL__ = ["FileStore", "FileStoreStats"]
@@ -1,7 +1,13 @@
+import asyncio
+import functools
+import threading
+import typing as ty
+from collections import defaultdict
+
 import structlog
 import yaml
 
-from deployment_helper.core.aws_iam_actions import AWS_SERVICES_MAP
+from deployment_helper.core import aws_iam_actions
 from deployment_helper.core.clients import github
 from deployment_helper.core.clients import cohere
 
@@ -10,36 +16,128 @@ PROMPT = """
 AWS SDK function calls (boto3, aws-go-sdk, awssdkv3) and wrapper functions
 that interact with AWS services.
 {aws_services}
-""".format(aws_services=yaml.dump(AWS_SERVICES_MAP))
+"""
+
+# Files are split into chunks of at most this many characters so no document
+# exceeds the reranker's context; each chunk is scored on its own.
+RERANK_CHUNK_MAX_CHARS = 4000
+
+# How chunk scores are combined into a file score: the best chunk, or the
+# mean of the `top_k` best chunks.
+ScoreAggregation = ty.Literal["max", "top_k_mean"]
+
+
+# libyaml's dumper produces the same output several times faster.
+_YamlDumper = getattr(yaml, "CDumper", yaml.Dumper)
+
+_reranker_query_lock = threading.Lock()
+
+
+def _reranker_query() -> str:
+    # Built at most once even when several windows are scored in threads.
+    with _reranker_query_lock:
+        return _build_reranker_query()
+
+
+@functools.cache
+def _build_reranker_query() -> str:
+    aws_services = yaml.dump(aws_iam_actions.AWS_SERVICES_MAP, Dumper=_YamlDumper)
+    return PROMPT.format(aws_services=aws_services)
+
+
+def _chunk_file(file: github.GithubFile, max_chars: int) -> list[str]:
+    """Splits file content on line boundaries into bounded-size documents."""
+    header = f"path: {file['path']}\n"
+    budget = max(max_chars - len(header), 1)
+
+    chunks: list[str] = []
+    current: list[str] = []
+    current_size = 0
 
+    for line in file.get("content", "").splitlines(keepends=True):
+        # Lines longer than the budget are split on their own.
+        pieces = [line[i : i + budget] for i in range(0, len(line), budget)]
+        for piece in pieces:
+            if current and current_size + len(piece) > budget:
+                chunks.append(header + "".join(current))
+                current, current_size = [], 0
+            current.append(piece)
+            current_size += len(piece)
 
-def find_relevant_github_source_files(
+    if current or not chunks:
+        chunks.append(header + "".join(current))
+
+    return chunks
+
+
+def _aggregate_scores(
+    scores: list[float],
+    score_aggregation: ScoreAggregation,
+    top_k: int,
+) -> float:
+    if score_aggregation == "max":
+        return max(scores)
+
+    best_scores = sorted(scores, reverse=True)[:top_k]
+    return sum(best_scores) / len(best_scores)
+
+
+async def score_github_source_files(
     *,
     logger=structlog.get_logger(),
     reranker_api_key: str,
     source_code_files: list[github.GithubFile],
-    top_n: int | None = None,
-    relevance_score_threshold: float = 0.1,
-) -> list[github.GithubFile]:
-    plain_files = [yaml.dump(f, sort_keys=False) for f in source_code_files]
+    chunk_max_chars: int = RERANK_CHUNK_MAX_CHARS,
+    score_aggregation: ScoreAggregation = "max",
+    top_k: int = 3,
+) -> list[tuple[float, github.GithubFile]]:
+    """Scores each file by the relevance of its chunks, in input order.
+
+    Scores do not depend on the other files reranked in the same request, so
+    files can be scored in separate batches as they are fetched.
+    """
+    if not source_code_files:
+        return []
+
+    documents: list[str] = []
+    document_files: list[int] = []
+
+    for file_index, file in enumerate(source_code_files):
+        for chunk in _chunk_file(file, chunk_max_chars):
+            documents.append(chunk)
+            document_files.append(file_index)
+
+    logger.info(
+        "chunked source files for reranking",
+        files_count=len(source_code_files),
+        chunks_count=len(documents),
+    )
+
+    # Rerank every chunk using cohere reranker, thresholds apply to the
+    # aggregated file scores instead.
+    # The query is built once, off the event loop so fetching carries on.
+    query = await asyncio.to_thread(_reranker_query)
 
-    # Rerank files using cohere reranker.
-    reranked_texts = cohere.rerank_documents(
+    reranked_texts = await cohere.rerank_documents(
         logger=logger,
         api_key=reranker_api_key,
-        query=PROMPT,
-        documents=plain_files,
-        top_n=top_n,
-        relevance_score_threshold=relevance_score_threshold,
+        query=query,
+        documents=documents,
+        relevance_score_threshold=0.0,
     )
 
-    reranked_files: list[github.GithubFile] = []
+    chunk_scores: dict[int, list[float]] = defaultdict(list)
     for text in reranked_texts:
-        file_dict = yaml.safe_load(text["content"])
-        github_file = github.GithubFile(**file_dict)
-        reranked_files.append(github_file)
+        chunk_scores[document_files[text["index"]]].append(text["relevance_score"])
 
-    return reranked_files
+    return [
+        (
+            _aggregate_scores(chunk_scores[file_index], score_aggregation, top_k),
+            file,
+        )
+        for file_index, file in enumerate(source_code_files)
+        if file_index in chunk_scores
+    ]
 
 
-__ALL__ = ["find_relevant_github_source_files"]
+__ALL__ = ["score_github_source_files"]
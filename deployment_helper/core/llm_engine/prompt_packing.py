@@ -0,0 +1,45 @@
+from deployment_helper.core.clients.github import GithubFile
+from deployment_helper.core.clients.openai import estimate_tokens
+
+# Source tokens packed into one multi-file request. The static preamble and
+# catalog are paid once per pack instead of once per file.
+PROMPT_PACK_TOKEN_BUDGET = 6000
+PROMPT_PACK_MAX_FILES = 8
+
+# Files larger than this are always analysed on their own.
+PACKED_FILE_MAX_TOKENS = 1500
+
+
+def file_tokens(github_file: GithubFile) -> int:
+    return estimate_tokens(github_file.get("content", ""))
+
+
+def pack_files(
+    github_files: list[GithubFile],
+    *,
+    token_budget: int = PROMPT_PACK_TOKEN_BUDGET,
+    max_files: int = PROMPT_PACK_MAX_FILES,
+) -> list[list[GithubFile]]:
+    """Bin-packs files into groups under `token_budget` (first-fit decreasing).
+
+    Files exceeding the budget on their own end up in a group of one.
+    """
+    packs: list[list[GithubFile]] = []
+    pack_tokens: list[int] = []
+
+    for github_file in sorted(github_files, key=file_tokens, reverse=True):
+        tokens = file_tokens(github_file)
+
+        for idx, pack in enumerate(packs):
+            if len(pack) < max_files and pack_tokens[idx] + tokens <= token_budget:
+                pack.append(github_file)
+                pack_tokens[idx] += tokens
+                break
+        else:
+            packs.append([github_file])
+            pack_tokens.append(tokens)
+
+    return packs
+
+
+__ALL__ = ["pack_files", "file_tokens"]
@@ -0,0 +1,374 @@
+import posixpath
+import re
+import typing as ty
+from collections import defaultdict
+
+from deployment_helper.core.clients.github import GithubFile
+from deployment_helper.core.llm_engine.analysis_store import FileResults
+
+# Files marking the root directory of a deployable service.
+SERVICE_ROOT_MARKERS = ("serverless.yml", "serverless.yaml", "Dockerfile", "go.mod")
+
+# Group of files outside every service root; not a valid path.
+SHARED_GROUP = ":shared"
+
+_PYTHON_IMPORT_RE = re.compile(
+    r"^[ \t]*(?:from[ \t]+(\.*[\w.]*)[ \t]+import|import[ \t]+([\w.]+))",
+    re.MULTILINE,
+)
+_JS_IMPORT_RE = re.compile(
+    r"""(?:\bfrom[ \t]*|\brequire\(\s*|\bimport\(\s*|^[ \t]*import[ \t]+)"""
+    r"""['"]([^'"\n]+)['"]""",
+    re.MULTILINE,
+)
+# Single imports and the lines of an import block.
+_GO_IMPORT_RE = re.compile(
+    r'^[ \t]*(?:import[ \t]+)?(?:[\w.]+[ \t]+)?"([^"\n]+)"', re.MULTILINE
+)
+_RUBY_IMPORT_RE = re.compile(
+    r"""^[ \t]*require(_relative)?[ \t(]+['"]([^'"\n]+)['"]""", re.MULTILINE
+)
+_JAVA_IMPORT_RE = re.compile(
+    r"^[ \t]*import[ \t]+(?:static[ \t]+)?([\w.]+)", re.MULTILINE
+)
+_JAVA_PACKAGE_RE = re.compile(r"^[ \t]*package[ \t]+([\w.]+)", re.MULTILINE)
+
+
+class ImportReference(ty.NamedTuple):
+    # Path components the import refers to.
+    components: tuple[str, ...]
+    # Resolved against the importing file, rather than a module search path.
+    relative: bool
+
+
+def _components(path: str) -> tuple[str, ...]:
+    return tuple(part for part in path.split("/") if part and part != ".")
+
+
+def _relative_reference(file_path: str, target: str) -> ImportReference:
+    path = posixpath.normpath(posixpath.join(posixpath.dirname(file_path), target))
+    return ImportReference(_components(path), relative=True)
+
+
+def _absolute_reference(path: str) -> ImportReference:
+    return ImportReference(_components(path), relative=False)
+
+
+def extract_import_references(file_path: str, content: str) -> list[ImportReference]:
+    """Finds the modules a source file imports, as paths where possible."""
+    references: list[ImportReference] = []
+    extension = posixpath.splitext(file_path)[1]
+
+    if extension == ".py":
+        for match in _PYTHON_IMPORT_RE.finditer(content):
+            module = match.group(1) or match.group(2)
+            dots = len(module) - len(module.lstrip("."))
+            path = module[dots:].replace(".", "/")
+            if dots:
+                target = "/".join([".."] * (dots - 1) + [path or "."])
+                references.append(_relative_reference(file_path, target))
+            else:
+                references.append(_absolute_reference(path))
+
+    elif extension in (".js", ".ts"):
+        for match in _JS_IMPORT_RE.finditer(content):
+            target = match.group(1)
+            if target.startswith("."):
+                references.append(_relative_reference(file_path, target))
+            elif target.startswith("@"):
+                # Workspace packages are named after their directory, the
+                # scope is not part of the path.
+                references.append(_absolute_reference(target.partition("/")[2]))
+            else:
+                references.append(_absolute_reference(target))
+
+    elif extension == ".go":
+        for match in _GO_IMPORT_RE.finditer(content):
+            references.append(_absolute_reference(match.group(1)))
+
+    elif extension == ".rb":
+        for match in _RUBY_IMPORT_RE.finditer(content):
+            relative, target = match.group(1), match.group(2)
+            if relative or target.startswith("."):
+                references.append(_relative_reference(file_path, target))
+            else:
+                references.append(_absolute_reference(target))
+
+    elif extension == ".java":
+        for match in _JAVA_IMPORT_RE.finditer(content):
+            references.append(_absolute_reference(match.group(1).replace(".", "/")))
+
+    return [reference for reference in references if reference.components]
+
+
+class SharedDirectory(ty.NamedTuple):
+    path: str
+    # Workspace packages, such as JS ones, count with every subdirectory.
+    recursive: bool
+
+
+# Shared directories by the module paths naming them or a file in them.
+_ModuleIndex = dict[tuple[str, ...], set[SharedDirectory]]
+
+
+def _module_path_start(
+    path: str, known_paths: ty.Container[str], java_package: tuple[str, ...] | None
+) -> int | None:
+    """Returns how many leading directories a module path of `path` omits.
+
+    Module paths start at the source root of their language rather than at
+    the top of the repository, e.g. "common.aws" for libs/common/aws.py when
+    libs/common is a Python package. None when the file has none.
+    """
+    directories = _components(posixpath.dirname(path))
+    extension = posixpath.splitext(path)[1]
+
+    if extension == ".py":
+        # The source root is the parent of the outermost package.
+        start = len(directories)
+        while start and f"{'/'.join(directories[:start])}/__init__.py" in known_paths:
+            start -= 1
+        return start
+
+    if extension in (".js", ".ts"):
+        # Workspace packages sit in one container, e.g. packages/shared-utils.
+        return 1 if len(directories) > 1 else None
+
+    if extension == ".rb":
+        # Required relative to a lib directory on the load path.
+        if "lib" in directories:
+            return len(directories) - directories[::-1].index("lib")
+        return None
+
+    if extension == ".java" and java_package:
+        if directories[-len(java_package) :] == java_package:
+            return len(directories) - len(java_package)
+        return None
+
+    return None
+
+
+def _module_paths(
+    path: str, start: int, *, recursive: bool
+) -> ty.Iterator[tuple[tuple[str, ...], SharedDirectory]]:
+    """Yields a file's module path and its packages from component `start`."""
+    components = _components(posixpath.splitext(path)[0])
+    directory = posixpath.dirname(path)
+
+    yield components[start:], SharedDirectory(directory, recursive=False)
+    for end in range(start + 1, len(components)):
+        yield components[start:end], SharedDirectory(
+            "/".join(components[:end]), recursive=recursive
+        )
+
+
+def detect_service_roots(paths: ty.Iterable[str]) -> list[str]:
+    """Returns the directories holding a service marker such as a Dockerfile."""
+    roots = {
+        posixpath.dirname(path)
+        for path in paths
+        if posixpath.basename(path) in SERVICE_ROOT_MARKERS
+    }
+
+    # A marker at the top usually belongs to the workspace, such as a dev
+    # container, rather than to a service next to the others.
+    if len(roots) > 1:
+        roots.discard("")
+
+    return sorted(roots)
+
+
+def normalize_service_root(root: str) -> str:
+    root = posixpath.normpath(root.strip()).strip("/")
+    return "" if root == "." else root
+
+
+class ServiceRoots:
+    """Assigns files to services and shared files to the services using them.
+
+    A file belongs to the deepest service root containing it. Files outside
+    every root are shared; a shared directory contributes to each service
+    importing a module in it, directly or through other shared code. Imports
+    only count when they name a module path that exists in the repository.
+    Imports are collected from file contents as they stream past, so no file
+    is read twice.
+    """
+
+    def __init__(self, roots: ty.Iterable[str]):
+        self.roots = sorted({normalize_service_root(root) for root in roots})
+
+        # Root of every file seen, None for shared files.
+        self._paths: dict[str, str | None] = {}
+        # Imports of each service, and of each shared file.
+        self._service_references: dict[str, set[ImportReference]] = defaultdict(
+            set
+        )
+        self._shared_references: dict[str, list[ImportReference]] = {}
+        self._java_packages: dict[str, tuple[str, ...]] = {}
+        # First path components under each root without their extension,
+        # the names a service's own absolute imports start with.
+        self._local_names: dict[str, set[str]] = defaultdict(set)
+
+    def root_of(self, path: str) -> str | None:
+        deepest: str | None = None
+        for root in self.roots:
+            if root == "" or path.startswith(root + "/"):
+                if deepest is None or len(root) > len(deepest):
+                    deepest = root
+        return deepest
+
+    def group_of(self, path: str) -> str:
+        root = self.root_of(path)
+        return SHARED_GROUP if root is None else root
+
+    def add_file(self, file: GithubFile):
+        path = file["path"]
+        root = self._paths[path] = self.root_of(path)
+        if root is not None:
+            relative_path = path[len(root) + 1 :] if root else path
+            self._local_names[root].add(
+                posixpath.splitext(relative_path)[0].split("/")[0]
+            )
+
+        content = file.get("content")
+        if content is None:
+            return
+
+        references = extract_import_references(path, content)
+        if root is None:
+            self._shared_references[path] = references
+        else:
+            self._service_references[root].update(references)
+
+        if path.endswith(".java"):
+            match = _JAVA_PACKAGE_RE.search(content)
+            if match:
+                self._java_packages[path] = _components(
+                    match.group(1).replace(".", "/")
+                )
+
+    def _index_module_paths(self) -> tuple[_ModuleIndex, _ModuleIndex]:
+        """Indexes shared files by the paths imports can name them with.
+
+        Returns one index of paths from the top of the repository, which
+        relative imports resolve against, and one of language module paths.
+        """
+        repository_index: _ModuleIndex = defaultdict(set)
+        module_index: _ModuleIndex = defaultdict(set)
+
+        for path, root in self._paths.items():
+            if root is not None:
+                continue
+
+            for module_path, directory in _module_paths(path, 0, recursive=False):
+                repository_index[module_path].add(directory)
+
+            start = _module_path_start(
+                path, self._paths, self._java_packages.get(path)
+            )
+            if start is None:
+                continue
+            recursive = path.endswith((".js", ".ts"))
+            for module_path, directory in _module_paths(
+                path, start, recursive=recursive
+            ):
+                module_index[module_path].add(directory)
+
+        return repository_index, module_index
+
+    def _resolve(
+        self,
+        reference: ImportReference,
+        indexes: tuple[_ModuleIndex, _ModuleIndex],
+    ) -> set[SharedDirectory]:
+        repository_index, module_index = indexes
+        if reference.relative:
+            return repository_index.get(reference.components, set())
+
+        directories = set(module_index.get(reference.components, ()))
+        directories.update(repository_index.get(reference.components, ()))
+
+        # Go imports put the module name in front of the repository path,
+        # e.g. "github.com/org/repo/libs/aws".
+        if "." in reference.components[0]:
+            for offset in range(1, len(reference.components)):
+                directories.update(
+                    repository_index.get(reference.components[offset:], ())
+                )
+
+        return directories
+
+    def _reached_shared_paths(
+        self,
+        root: str,
+        indexes: tuple[_ModuleIndex, _ModuleIndex],
+        shared_paths: dict[str, list[str]],
+    ) -> set[str]:
+        """Returns the shared files a service reaches through imports."""
+        local_names = self._local_names[root]
+
+        pending: list[SharedDirectory] = []
+        for reference in self._service_references[root]:
+            if reference.relative or reference.components[0] not in local_names:
+                pending.extend(self._resolve(reference, indexes))
+
+        reached: set[SharedDirectory] = set()
+        reached_paths: set[str] = set()
+        while pending:
+            directory = pending.pop()
+            if directory in reached:
+                continue
+            reached.add(directory)
+
+            for shared_directory, paths in shared_paths.items():
+                if shared_directory != directory.path and not (
+                    directory.recursive
+                    and shared_directory.startswith(directory.path + "/")
+                ):
+                    continue
+
+                for path in paths:
+                    if path in reached_paths:
+                        continue
+                    reached_paths.add(path)
+                    for reference in self._shared_references.get(path, ()):
+                        pending.extend(self._resolve(reference, indexes))
+
+        return reached_paths
+
+    def split_results(self, file_results: FileResults) -> dict[str, FileResults]:
+        """Returns the results of each service, shared ones included."""
+        service_results: dict[str, FileResults] = {root: {} for root in self.roots}
+        shared_results: FileResults = {}
+        for path, results in file_results.items():
+            root = self.root_of(path)
+            if root is None:
+                shared_results[path] = results
+            else:
+                service_results[root][path] = results
+
+        if not shared_results:
+            return service_results
+
+        shared_paths: dict[str, list[str]] = defaultdict(list)
+        for path, root in self._paths.items():
+            if root is None:
+                shared_paths[posixpath.dirname(path)].append(path)
+
+        indexes = self._index_module_paths()
+        for root in self.roots:
+            reached_paths = self._reached_shared_paths(root, indexes, shared_paths)
+            for path, results in shared_results.items():
+                if path in reached_paths:
+                    service_results[root][path] = results
+
+        return service_results
+
+
+__ALL__ = [
+    "SERVICE_ROOT_MARKERS",
+    "ServiceRoots",
+    "detect_service_roots",
+    "extract_import_references",
+    "normalize_service_root",
+]
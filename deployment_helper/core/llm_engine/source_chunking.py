@@ -0,0 +1,212 @@
+import ast
+import re
+
+from deployment_helper.core.clients.openai import estimate_tokens
+
+# Files above this many source tokens are split into chunks analysed in
+# parallel, so latency follows the chunk size instead of the file size.
+SOURCE_CHUNK_MAX_TOKENS = 3000
+
+# Module level context repeated in every chunk. Past this size only the
+# import lines are kept.
+SOURCE_CHUNK_HEADER_MAX_TOKENS = 600
+
+_IMPORT_LINE_RE = re.compile(
+    r"^\s*(import\b|from\s+\S+\s+import\b|package\b|using\b|#include\b|"
+    r"(const|let|var)\s+.*=\s*require\()"
+)
+
+# Declarations starting a block in languages without a parser here, at the top
+# level or one level deep (methods of a Java or TypeScript class).
+_DECLARATION_RE = re.compile(
+    r"^(\s{0,4}|\t?)"
+    r"(export\s+)?(default\s+)?(public\s+|private\s+|protected\s+)?(static\s+)?"
+    r"(async\s+)?"
+    r"(def|class|function|func|interface|module|fn|impl|struct|type|"
+    r"const\s+\w+\s*=\s*(async\s*)?(\(|function)|"
+    r"[\w<>\[\],\s]+\s+\w+\s*\([^;]*$)"
+)
+
+
+def _source_tokens(lines: list[str]) -> int:
+    return estimate_tokens("".join(lines))
+
+
+def _python_sections(
+    lines: list[str],
+    source_code: str,
+    max_tokens: int,
+) -> tuple[list[str], list[str], list[list[str]]] | None:
+    """Splits Python source on top-level definitions using the ast module.
+
+    Returns the import lines, the remaining module level statements and the
+    definition blocks, or None when the source does not parse.
+    """
+    try:
+        module = ast.parse(source_code)
+    except (SyntaxError, ValueError):
+        return None
+
+    imports: list[str] = []
+    statements: list[str] = []
+    blocks: list[list[str]] = []
+
+    start = 0
+    for node in module.body:
+        # Comments and decorators above a node belong to it.
+        end = node.end_lineno or node.lineno
+        node_lines = lines[start:end]
+        start = end
+
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.extend(node_lines)
+        elif isinstance(node, ast.ClassDef) and _source_tokens(node_lines) > max_tokens:
+            blocks.extend(_python_class_blocks(node, lines, node_lines))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            blocks.append(node_lines)
+        elif _source_tokens(node_lines) > max_tokens:
+            blocks.append(node_lines)
+        else:
+            statements.extend(node_lines)
+
+    if start < len(lines):
+        statements.extend(lines[start:])
+
+    return imports, statements, blocks
+
+
+def _python_class_blocks(
+    node: ast.ClassDef,
+    lines: list[str],
+    node_lines: list[str],
+) -> list[list[str]]:
+    """Splits a large class into its methods, each under the class statement."""
+    first_line = node.body[0].lineno
+    if decorators := getattr(node.body[0], "decorator_list", None):
+        first_line = min(decorator.lineno for decorator in decorators)
+
+    class_start = node.end_lineno - len(node_lines)
+    prefix = lines[class_start : first_line - 1]
+
+    blocks: list[list[str]] = []
+    attributes: list[str] = []
+
+    start = first_line - 1
+    for child in node.body:
+        end = child.end_lineno or child.lineno
+        child_lines = lines[start:end]
+        start = end
+
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            blocks.append(child_lines)
+        else:
+            attributes.extend(child_lines)
+
+    prefix = prefix + attributes
+    return [prefix + block for block in blocks] or [node_lines]
+
+
+def _heuristic_sections(
+    lines: list[str],
+) -> tuple[list[str], list[str], list[list[str]]]:
+    """Splits source on lines that look like declarations."""
+    imports: list[str] = []
+    blocks: list[list[str]] = [[]]
+
+    in_import_block = False
+    for line in lines:
+        # Go style grouped imports: `import (` ... `)`.
+        if in_import_block:
+            imports.append(line)
+            in_import_block = line.strip() != ")"
+            continue
+        if _IMPORT_LINE_RE.match(line):
+            imports.append(line)
+            in_import_block = line.rstrip().endswith("(")
+            continue
+
+        if _DECLARATION_RE.match(line) and blocks[-1]:
+            blocks.append([])
+        blocks[-1].append(line)
+
+    return imports, [], [block for block in blocks if block]
+
+
+def _split_lines(lines: list[str], max_tokens: int) -> list[list[str]]:
+    """Splits a block that does not fit a chunk on line boundaries."""
+    if _source_tokens(lines) <= max_tokens:
+        return [lines]
+
+    pieces: list[list[str]] = [[]]
+    piece_tokens = 0
+    for line in lines:
+        line_tokens = estimate_tokens(line)
+        if pieces[-1] and piece_tokens + line_tokens > max_tokens:
+            pieces.append([])
+            piece_tokens = 0
+        pieces[-1].append(line)
+        piece_tokens += line_tokens
+
+    return pieces
+
+
+def chunk_source_file(
+    *,
+    file_path: str,
+    source_code: str,
+    max_tokens: int = SOURCE_CHUNK_MAX_TOKENS,
+    header_max_tokens: int = SOURCE_CHUNK_HEADER_MAX_TOKENS,
+) -> list[str]:
+    """Splits a large source file on function and class boundaries.
+
+    Every chunk starts with the module header (imports and, when small
+    enough, other module level statements such as client construction) so
+    it can be analysed on its own. Files within `max_tokens` are returned
+    whole.
+    """
+    if estimate_tokens(source_code) <= max_tokens:
+        return [source_code]
+
+    lines = source_code.splitlines(keepends=True)
+
+    sections = None
+    if file_path.endswith(".py"):
+        sections = _python_sections(lines, source_code, max_tokens)
+    if sections is None:
+        sections = _heuristic_sections(lines)
+
+    imports, statements, blocks = sections
+
+    header = imports + statements
+    if _source_tokens(header) > header_max_tokens:
+        header = imports
+        blocks = [statements] + blocks if statements else blocks
+    if _source_tokens(header) > header_max_tokens:
+        header = []
+        blocks = [imports] + blocks
+
+    header_str = "".join(header)
+    if header_str and not header_str.endswith("\n"):
+        header_str += "\n"
+
+    body_max_tokens = max(max_tokens - estimate_tokens(header_str), 1)
+
+    chunks: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for block in blocks:
+        for piece in _split_lines(block, body_max_tokens):
+            piece_tokens = _source_tokens(piece)
+            if current and current_tokens + piece_tokens > body_max_tokens:
+                chunks.append(header_str + "".join(current))
+                current, current_tokens = [], 0
+            current.extend(piece)
+            current_tokens += piece_tokens
+
+    if current or not chunks:
+        chunks.append(header_str + "".join(current))
+
+    return chunks
+
+
+__ALL__ = ["chunk_source_file"]
@@ -0,0 +1,53 @@
+import os
+import typing as ty
+
+from deployment_helper.core.llm_engine.aws_analyzer import AwsSdkCall
+
+
+class StaticAnalysisResult(ty.TypedDict):
+    sdk_calls: list[AwsSdkCall]
+    # False when the file uses the SDK in ways the extractor cannot follow,
+    # in which case it has to go through the LLM instead.
+    fully_resolved: bool
+
+
+Extractor = ty.Callable[[str, str], StaticAnalysisResult | None]
+
+_EXTRACTORS: dict[str, Extractor] = {}
+
+
+def register_extractor(*extensions: str) -> ty.Callable[[Extractor], Extractor]:
+    """Registers a static extractor for files with the given extensions.
+
+    An extractor receives the file path and source code and returns None when
+    the file does not use an SDK it understands.
+    """
+
+    def decorator(extractor: Extractor) -> Extractor:
+        for extension in extensions:
+            _EXTRACTORS[extension] = extractor
+        return extractor
+
+    return decorator
+
+
+def extract_aws_sdk_calls(
+    *,
+    file_path: str,
+    source_code: str,
+) -> StaticAnalysisResult | None:
+    """Extracts AWS SDK calls locally, without invoking the LLM."""
+    _, extension = os.path.splitext(file_path)
+
+    extractor = _EXTRACTORS.get(extension)
+    if extractor is None:
+        return None
+
+    return extractor(file_path, source_code)
+
+
+# Extractors register themselves on import.
+from deployment_helper.core.llm_engine.static_analyzer import python  # noqa: E402,F401
+
+
+__ALL__ = ["StaticAnalysisResult", "extract_aws_sdk_calls", "register_extractor"]
@@ -0,0 +1,412 @@
+import ast
+import functools
+import re
+
+from deployment_helper.core import aws_iam_actions
+from deployment_helper.core.aws_action_index import (
+    BOTO3_SERVICE_PREFIXES,
+    METHOD_ACTION_OVERRIDES,
+)
+from deployment_helper.core.iam_policy import normalize_resource
+from deployment_helper.core.llm_engine.aws_analyzer import AwsSdkCall
+from deployment_helper.core.llm_engine.static_analyzer import (
+    StaticAnalysisResult,
+    register_extractor,
+)
+
+# Client methods that never reach an AWS API.
+LOCAL_CLIENT_METHODS = {"can_paginate", "close"}
+
+# Client methods that name the operation they perform in their first argument.
+OPERATION_NAME_METHODS = {"get_paginator": "operation_name"}
+
+# Client attributes that are safe to reference without calling an API, such
+# as `except s3.exceptions.NoSuchKey`.
+CLIENT_STATIC_ATTRIBUTES = {"exceptions"}
+
+_S3_OBJECT_ACTIONS = {"AbortMultipartUpload", "ListMultipartUploadParts"}
+
+# Resource names in tests and mocks are not the ones deployed.
+_TEST_PATH_PATTERN = re.compile(
+    r"(^|/)(tests?|__tests__|testing|mocks?|fixtures)/"
+    r"|(^|/)(test_[^/]*|[^/]*_test|conftest)\.py$"
+)
+
+
+@functools.cache
+def _lowercase_actions(service: str) -> dict[str, str]:
+    return {
+        action.lower(): action
+        for action in aws_iam_actions.AWS_SERVICES_MAP.get(service, ())
+    }
+
+
+@functools.cache
+def _all_lowercase_actions() -> frozenset[str]:
+    return frozenset(
+        action.lower()
+        for actions in aws_iam_actions.AWS_SERVICES_MAP.values()
+        for action in actions
+    )
+
+
+def _method_actions(service: str, method: str) -> tuple[str, ...] | None:
+    """Maps a boto3 client method to IAM actions, None when it is unknown."""
+    override = METHOD_ACTION_OVERRIDES.get((service, method))
+    if override is not None:
+        return override
+
+    # Comparing lowercased names also covers acronyms such as PutBucketCORS.
+    action = _lowercase_actions(service).get(method.replace("_", ""))
+    if action is None:
+        return None
+
+    return (action,)
+
+
+def _literal_str(node: ast.expr | None) -> str | None:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _argument(call: ast.Call, position: int, keyword: str) -> ast.expr | None:
+    for kw in call.keywords:
+        if kw.arg == keyword:
+            return kw.value
+    if len(call.args) > position:
+        return call.args[position]
+    return None
+
+
+def _resource_arn(service: str, action: str, call: ast.Call) -> str:
+    """Infers a resource ARN from literal arguments, "*" otherwise.
+
+    Placeholder and example names are replaced like those from the LLM.
+    """
+    return normalize_resource(_literal_resource_arn(service, action, call))
+
+
+def _literal_resource_arn(service: str, action: str, call: ast.Call) -> str:
+    keywords = {kw.arg: _literal_str(kw.value) for kw in call.keywords if kw.arg}
+
+    if service == "s3" and keywords.get("Bucket"):
+        if "Object" in action or action in _S3_OBJECT_ACTIONS:
+            return f"arn:aws:s3:::{keywords['Bucket']}/*"
+        return f"arn:aws:s3:::{keywords['Bucket']}"
+
+    if service == "dynamodb" and keywords.get("TableName"):
+        return f"arn:aws:dynamodb:*:*:table/{keywords['TableName']}"
+
+    if service == "sns" and (keywords.get("TopicArn") or "").startswith("arn:"):
+        return keywords["TopicArn"]  # type: ignore
+
+    if service == "sqs" and keywords.get("QueueUrl"):
+        match = re.fullmatch(
+            r"https://sqs\.([a-z0-9-]+)\.amazonaws\.com/(\d+)/([\w.-]+)",
+            keywords["QueueUrl"],  # type: ignore
+        )
+        if match:
+            region, account_id, queue_name = match.groups()
+            return f"arn:aws:sqs:{region}:{account_id}:{queue_name}"
+
+    if service == "lambda" and keywords.get("FunctionName"):
+        function_name: str = keywords["FunctionName"]  # type: ignore
+        if function_name.startswith("arn:"):
+            return function_name
+        return f"arn:aws:lambda:*:*:function:{function_name}"
+
+    return "*"
+
+
+class _Boto3Visitor(ast.NodeVisitor):
+    """Resolves boto3 clients to services and their method calls to actions.
+
+    Anything it cannot follow (resources, dynamic service names, clients
+    escaping into other scopes or referenced other than by calling one of
+    their methods, waiters, ...) marks the file unresolved.
+    """
+
+    def __init__(self, *, scoped_resources: bool = True):
+        self.scoped_resources = scoped_resources
+
+        self.boto3_aliases: set[str] = set()
+        self.client_factories: set[str] = set()
+        self.session_factories: set[str] = set()
+        self.resource_factories: set[str] = set()
+
+        self.sessions: set[str] = set()
+        self.clients: dict[str, set[str]] = {}
+
+        self.sdk_calls: dict[tuple[str, str, str], AwsSdkCall] = {}
+        self.unresolved_reasons: list[str] = []
+
+        self._consumed_client_calls: set[int] = set()
+        self._client_calls: list[ast.Call] = []
+        self._attribute_calls: list[ast.Call] = []
+
+    # Imports
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            if alias.name in ("boto3", "boto3.session"):
+                self.boto3_aliases.add(alias.asname or "boto3")
+            elif alias.name.split(".")[0] in ("aioboto3", "aiobotocore"):
+                self.unresolved_reasons.append(f"unsupported sdk {alias.name}")
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        module = node.module or ""
+
+        if module.split(".")[0] in ("aioboto3", "aiobotocore"):
+            self.unresolved_reasons.append(f"unsupported sdk {module}")
+            return
+
+        if module not in ("boto3", "boto3.session"):
+            return
+
+        for alias in node.names:
+            name = alias.asname or alias.name
+            if alias.name == "client":
+                self.client_factories.add(name)
+            elif alias.name == "Session":
+                self.session_factories.add(name)
+            elif alias.name == "resource":
+                self.resource_factories.add(name)
+            elif alias.name == "session":
+                self.boto3_aliases.add(name)
+
+    # Assignments
+
+    def visit_Assign(self, node: ast.Assign):
+        for target in node.targets:
+            self._track_assignment(target, node.value)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign):
+        if node.value is not None:
+            self._track_assignment(node.target, node.value)
+        self.generic_visit(node)
+
+    def _track_assignment(self, target: ast.expr, value: ast.expr):
+        if not isinstance(target, (ast.Name, ast.Attribute)):
+            return
+
+        key = ast.unparse(target)
+
+        if self._is_session(value):
+            self.sessions.add(key)
+            return
+
+        service = self._client_service(value)
+        if service is not None:
+            self.clients.setdefault(key, set()).add(service)
+            self._consumed_client_calls.add(id(value))
+
+    # Calls
+
+    def visit_Call(self, node: ast.Call):
+        if self._is_resource(node):
+            self.unresolved_reasons.append(f"boto3 resource {ast.unparse(node)}")
+        elif self._is_client_creation(node):
+            self._client_calls.append(node)
+        elif isinstance(node.func, ast.Attribute):
+            self._attribute_calls.append(node)
+
+        self.generic_visit(node)
+
+    def _is_boto3(self, node: ast.expr) -> bool:
+        if isinstance(node, ast.Name):
+            return node.id in self.boto3_aliases
+        if isinstance(node, ast.Attribute) and node.attr == "session":
+            return self._is_boto3(node.value)
+        return False
+
+    def _is_session(self, node: ast.expr) -> bool:
+        if isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Name):
+                return func.id in self.session_factories
+            if isinstance(func, ast.Attribute) and func.attr == "Session":
+                return self._is_boto3(func.value)
+            return False
+
+        return ast.unparse(node) in self.sessions
+
+    def _is_factory_call(self, node: ast.Call, attr: str, factories: set[str]) -> bool:
+        func = node.func
+        if isinstance(func, ast.Name):
+            return func.id in factories
+        if isinstance(func, ast.Attribute) and func.attr == attr:
+            return self._is_boto3(func.value) or self._is_session(func.value)
+        return False
+
+    def _is_client_creation(self, node: ast.Call) -> bool:
+        return self._is_factory_call(node, "client", self.client_factories)
+
+    def _is_resource(self, node: ast.Call) -> bool:
+        return self._is_factory_call(node, "resource", self.resource_factories)
+
+    def _client_service(self, node: ast.expr) -> str | None:
+        if not isinstance(node, ast.Call) or not self._is_client_creation(node):
+            return None
+
+        service_name = _literal_str(_argument(node, 0, "service_name"))
+        if service_name is None:
+            self.unresolved_reasons.append(f"dynamic client {ast.unparse(node)}")
+            return None
+
+        return BOTO3_SERVICE_PREFIXES.get(service_name, service_name)
+
+    # Resolution
+
+    def resolve(self, tree: ast.AST):
+        for call in self._attribute_calls:
+            self._resolve_method_call(call)
+
+        self._check_client_references(tree)
+
+        for call in self._client_calls:
+            if id(call) not in self._consumed_client_calls:
+                self.unresolved_reasons.append(
+                    f"client escapes its assignment {ast.unparse(call)}"
+                )
+
+    def _check_client_references(self, tree: ast.AST):
+        """Marks the file unresolved when a client is used other than by a call.
+
+        Aliasing a method (`put = s3.put_object`), getattr, passing a client
+        on or returning it all reach APIs the visitor cannot see.
+        """
+        if not self.clients:
+            return
+
+        parents: dict[int, ast.AST] = {}
+        for node in ast.walk(tree):
+            for child in ast.iter_child_nodes(node):
+                parents[id(child)] = node
+
+        for node in ast.walk(tree):
+            if not isinstance(node, (ast.Name, ast.Attribute)):
+                continue
+            if isinstance(node.ctx, (ast.Store, ast.Del)):
+                continue
+            if ast.unparse(node) not in self.clients:
+                continue
+
+            attribute = parents.get(id(node))
+            if isinstance(attribute, ast.Attribute) and attribute.value is node:
+                if attribute.attr in CLIENT_STATIC_ATTRIBUTES:
+                    continue
+                call = parents.get(id(attribute))
+                if isinstance(call, ast.Call) and call.func is attribute:
+                    continue
+
+            self.unresolved_reasons.append(
+                f"client referenced outside a call, line {node.lineno}"
+            )
+            return
+
+    def _resolve_method_call(self, call: ast.Call):
+        func = call.func
+        assert isinstance(func, ast.Attribute)
+        method = func.attr
+
+        if isinstance(func.value, ast.Call) and self._is_client_creation(func.value):
+            service = self._client_service(func.value)
+            self._consumed_client_calls.add(id(func.value))
+            services = {service} if service else set()
+        else:
+            services = self.clients.get(ast.unparse(func.value), set())
+
+        if not services:
+            if self._looks_like_sdk_call(method):
+                self.unresolved_reasons.append(f"untracked client {ast.unparse(func)}")
+            return
+
+        if method in LOCAL_CLIENT_METHODS:
+            return
+
+        operation_argument = OPERATION_NAME_METHODS.get(method)
+        if operation_argument is not None:
+            method = _literal_str(_argument(call, 0, operation_argument)) or ""
+        elif method == "generate_presigned_url":
+            method = _literal_str(_argument(call, 0, "ClientMethod")) or ""
+
+        for service in services:
+            actions = _method_actions(service, method) if method else None
+            if actions is None:
+                self.unresolved_reasons.append(
+                    f"unknown {service} method {ast.unparse(func)}"
+                )
+                continue
+
+            for action in actions:
+                # Multi-action methods (copies) touch two resources, e.g. the
+                # source and destination bucket, so keep them unscoped.
+                resource = (
+                    _resource_arn(service, action, call)
+                    if len(actions) == 1 and self.scoped_resources
+                    else "*"
+                )
+                self.sdk_calls.setdefault(
+                    (service, action, resource),
+                    AwsSdkCall(
+                        service=service,
+                        action=action,
+                        resource=resource,
+                        reasoning=(
+                            f"Static analysis, line {call.lineno}: "
+                            f"{ast.unparse(call)[:200]}"
+                        ),
+                    ),
+                )
+
+    def _looks_like_sdk_call(self, method: str) -> bool:
+        normalized = method.replace("_", "")
+
+        # Multi-word methods are checked against every service; single words
+        # such as "get" or "update" only against the services in use here.
+        if "_" in method:
+            return normalized in _all_lowercase_actions()
+
+        return any(
+            normalized in _lowercase_actions(service)
+            for services in self.clients.values()
+            for service in services
+        )
+
+
+@register_extractor(".py")
+def extract_python_aws_sdk_calls(
+    file_path: str,
+    source_code: str,
+) -> StaticAnalysisResult | None:
+    """Extracts boto3 client calls from Python source code."""
+    try:
+        tree = ast.parse(source_code, filename=file_path)
+    except (SyntaxError, ValueError):
+        return None
+
+    visitor = _Boto3Visitor(
+        scoped_resources=not _TEST_PATH_PATTERN.search(file_path)
+    )
+    visitor.visit(tree)
+
+    uses_boto3 = bool(
+        visitor.boto3_aliases
+        or visitor.client_factories
+        or visitor.session_factories
+        or visitor.resource_factories
+    )
+    if not uses_boto3 and not visitor.unresolved_reasons:
+        return None
+
+    visitor.resolve(tree)
+
+    return StaticAnalysisResult(
+        sdk_calls=list(visitor.sdk_calls.values()),
+        fully_resolved=not visitor.unresolved_reasons,
+    )
+
+
+__ALL__ = ["extract_python_aws_sdk_calls"]
@@ -0,0 +1,217 @@
+import bisect
+import math
+import typing as ty
+
+from deployment_helper.core.stages import add_stage_listener
+
+# Upper bounds of the stage duration histogram buckets, in seconds.
+STAGE_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(v)}"' for name, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type_name: str
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+        REGISTRY.register(self)
+
+    def _label_values(self, labels: dict[str, ty.Any]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> ty.Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = (
+            f"# HELP {self.name} {_escape(self.documentation)}\n"
+            f"# TYPE {self.name} {self.type_name}\n"
+        )
+        return header + "".join(f"{sample}\n" for sample in self._samples())
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: ty.Any):
+        key = self._label_values(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> ty.Iterator[str]:
+        for key, value in list(self._values.items()):
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: ty.Any):
+        self._values[self._label_values(labels)] = value
+
+    def _samples(self) -> ty.Iterator[str]:
+        for key, value in list(self._values.items()):
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        buckets: tuple[float, ...],
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: non-cumulative bucket counts, then sum.
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: ty.Any):
+        key = self._label_values(labels)
+        if (state := self._values.get(key)) is None:
+            state = self._values[key] = ([0] * len(self.buckets), [0.0])
+
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1][0] += value
+
+    def _samples(self) -> ty.Iterator[str]:
+        labelnames = self.labelnames + ("le",)
+
+        for key, (counts, total) in list(self._values.items()):
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(labelnames, key + (_format_value(upper_bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total[0])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """Metrics of the process, rendered in the Prometheus text format.
+
+    Collectors run before rendering, for values that are cheaper to read at
+    scrape time than to keep up to date, such as queue depth.
+    """
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[ty.Callable[[], None]] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collector: ty.Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+
+        return "".join(metric.render() for metric in self._metrics)
+
+
+REGISTRY = Registry()
+
+STAGE_DURATION_SECONDS = Histogram(
+    "deployment_helper_stage_duration_seconds",
+    "Duration of pipeline stages.",
+    ("stage",),
+    buckets=STAGE_DURATION_BUCKETS,
+)
+UPSTREAM_REQUESTS_TOTAL = Counter(
+    "deployment_helper_upstream_requests_total",
+    "HTTP requests made to upstream APIs by response status.",
+    ("upstream", "status"),
+)
+LLM_TOKENS_TOTAL = Counter(
+    "deployment_helper_llm_tokens_total",
+    "LLM tokens reported in response usage.",
+    ("kind",),
+)
+AWS_SDK_CALL_VALIDATIONS_TOTAL = Counter(
+    "deployment_helper_aws_sdk_call_validations_total",
+    "AWS SDK calls found by the LLM, by how their action was validated.",
+    ("outcome",),
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "deployment_helper_job_queue_depth",
+    "Jobs waiting for a worker.",
+)
+CACHE_LOOKUPS_TOTAL = Counter(
+    "deployment_helper_cache_lookups_total",
+    "Cache lookups by result.",
+    ("cache", "result"),
+)
+CACHE_HIT_RATIO = Gauge(
+    "deployment_helper_cache_hit_ratio",
+    "Share of cache lookups that were hits since the process started.",
+    ("cache",),
+)
+
+
+class _StageMetrics:
+    def stage_started(self, name: str):
+        pass
+
+    def stage_finished(self, name: str, started_at: float, duration: float):
+        STAGE_DURATION_SECONDS.observe(duration, stage=name)
+
+
+add_stage_listener(_StageMetrics())
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+__ALL__ = [
+    "AWS_SDK_CALL_VALIDATIONS_TOTAL",
+    "CACHE_HIT_RATIO",
+    "CACHE_LOOKUPS_TOTAL",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "JOB_QUEUE_DEPTH",
+    "LLM_TOKENS_TOTAL",
+    "REGISTRY",
+    "STAGE_DURATION_SECONDS",
+    "UPSTREAM_REQUESTS_TOTAL",
+    "render_metrics",
+]
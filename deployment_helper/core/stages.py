@@ -0,0 +1,58 @@
+import contextlib
+import contextvars
+import time
+import typing as ty
+
+import structlog
+
+
+class StageListener(ty.Protocol):
+    def stage_started(self, name: str): ...
+
+    def stage_finished(self, name: str, started_at: float, duration: float): ...
+
+
+# Listeners for every stage in the process, such as metrics.
+_global_stage_listeners: list[StageListener] = []
+
+# Listeners follow the asyncio context, so every task spawned while a job
+# runs reports to that job.
+_stage_listeners: contextvars.ContextVar[tuple[StageListener, ...]] = (
+    contextvars.ContextVar("stage_listeners", default=())
+)
+
+
+def add_stage_listener(listener: StageListener):
+    """Reports every stage run in the process to `listener`."""
+    _global_stage_listeners.append(listener)
+
+
+@contextlib.contextmanager
+def track_stages(listener: StageListener) -> ty.Iterator[None]:
+    """Reports the stages run within the block to `listener`."""
+    token = _stage_listeners.set(_stage_listeners.get() + (listener,))
+    try:
+        yield
+    finally:
+        _stage_listeners.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name: str, *, logger=structlog.get_logger()) -> ty.Iterator[None]:
+    """Times a pipeline stage and reports it to the current listeners."""
+    listeners = (*_global_stage_listeners, *_stage_listeners.get())
+    for listener in listeners:
+        listener.stage_started(name)
+
+    started_at = time.time()
+    started_perf = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started_perf
+        logger.debug("stage finished", stage=name, duration=duration)
+        for listener in listeners:
+            listener.stage_finished(name, started_at, duration)
+
+
+__ALL__ = ["StageListener", "add_stage_listener", "stage", "track_stages"]
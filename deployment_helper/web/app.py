@@ -5,22 +5,112 @@ import hashlib
 from sanic import Sanic, json
 from sanic.request import Request
 from sanic.response import HTTPResponse, text
-from sanic.exceptions import BadRequest, HeaderNotFound
+from sanic.exceptions import BadRequest, HeaderNotFound, NotFound, ServiceUnavailable
 
-from deployment_helper.core import run_with_github_apps_installation
+from deployment_helper.core import metrics, run_with_github_apps_installation
+from deployment_helper.core.cache.blob_cache import get_blob_cache
+from deployment_helper.core.cache.llm_cache import get_llm_cache
+from deployment_helper.core.clients import github
+from deployment_helper.web.job_store import JobStore
+from deployment_helper.web.jobs import JobQueue, JobQueueFull, PullRequestJob
 
 SECRET_TOKEN = b"regmicmahesh"
 
+# Routes that are not GitHub webhooks and so carry no signature.
+UNSIGNED_ROUTES = {"healthz", "job_status", "metrics"}
+
+# Fields of a job shown on its unsigned status route; anyone may guess a
+# delivery id, so the repository, error and policy are left out.
+PUBLIC_JOB_FIELDS = (
+    "job_id",
+    "state",
+    "stage",
+    "created_at",
+    "started_at",
+    "finished_at",
+)
+
 app = Sanic("DeploymentHelperApp")
 
 
-@app.get("/healthz")
+async def run_pull_request_job(job: PullRequestJob) -> str:
+    return await run_with_github_apps_installation(
+        github_repository_name=job.repository_name,
+        github_head_sha=job.head_sha,
+        github_previous_head_sha=job.previous_head_sha,
+        pull_request_id=job.pull_request_id,
+    )
+
+
+@app.before_server_start
+async def setup_github_client(app: Sanic):
+    # One pooled client per worker, shared by every webhook event.
+    github.get_github_client()
+
+    app.ctx.job_store = JobStore()
+    app.ctx.job_queue = JobQueue(
+        runner=run_pull_request_job,
+        job_store=app.ctx.job_store,
+    )
+    app.ctx.job_queue.start()
+
+    metrics.REGISTRY.add_collector(lambda: collect_metrics(app))
+
+
+def collect_metrics(app: Sanic):
+    metrics.JOB_QUEUE_DEPTH.set(app.ctx.job_queue.depth)
+
+    caches = {"blob": get_blob_cache(), "llm": get_llm_cache()}
+    for cache_name, cache in caches.items():
+        if cache is None:
+            continue
+
+        metrics.CACHE_HIT_RATIO.set(cache.stats()["hit_ratio"], cache=cache_name)
+
+
+@app.after_server_stop
+async def close_github_client(app: Sanic):
+    await app.ctx.job_queue.stop()
+    await github.close_github_client()
+
+
+@app.get("/healthz", name="healthz")
 async def healthz(request: Request):
     return text("Server is up and running.")
 
 
+@app.get("/metrics", name="metrics")
+async def metrics_endpoint(request: Request) -> HTTPResponse:
+    return text(
+        metrics.render_metrics(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.get("/jobs/<job_id>", name="job_status")
+async def job_status(request: Request, job_id: str) -> HTTPResponse:
+    job_store: JobStore = request.app.ctx.job_store
+
+    job = job_store.get(job_id)
+    if job is None:
+        raise NotFound(f"job {job_id} not found")
+
+    stages = job_store.get_stages(job_id)
+
+    return json(
+        {
+            **{field: job[field] for field in PUBLIC_JOB_FIELDS},
+            "stages": stages,
+        }
+    )
+
+
 @app.on_request
 async def verify_signature(request: Request) -> HTTPResponse | None:
+    route_name = request.route.name if request.route is not None else ""
+    if route_name.rpartition(".")[2] in UNSIGNED_ROUTES:
+        return None
+
     signature_header = request.headers.get("x-hub-signature-256")
 
     payload_body = request.body
@@ -54,13 +144,28 @@ async def process_events(request: Request) -> HTTPResponse:
 
     pull_request_head = pull_request["head"]
 
-    repository_branch = pull_request_head["ref"]
     repository_name = pull_request_head["repo"]["full_name"]
 
-    await run_with_github_apps_installation(
-        github_repository_name=repository_name,
-        github_branch_name=repository_branch,
+    # "synchronize" events carry the previous head, which lets the analysis
+    # reuse its results and only look at the files changed since then.
+    previous_head_sha = data.get("before") if data["action"] == "synchronize" else None
+
+    # Redeliveries keep the delivery id, which is how duplicates are spotted.
+    delivery_id = request.headers.get("x-github-delivery") or pull_request_head["sha"]
+
+    job = PullRequestJob(
+        delivery_id=delivery_id,
+        repository_name=repository_name,
         pull_request_id=data["number"],
+        head_sha=pull_request_head["sha"],
+        previous_head_sha=previous_head_sha,
     )
 
-    return json({"ack": True, "op": "no-op"})
+    # The analysis outlives GitHub's webhook timeout, so it runs in the
+    # background and the delivery is acknowledged right away.
+    try:
+        op = app.ctx.job_queue.submit(job)
+    except JobQueueFull:
+        raise ServiceUnavailable("too many pending jobs, retry later")
+
+    return json({"ack": True, "op": op}, status=202)
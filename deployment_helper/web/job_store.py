@@ -0,0 +1,265 @@
+import contextlib
+import os
+import sqlite3
+import time
+import typing as ty
+import uuid
+
+import structlog
+
+from deployment_helper.core.cache.blob_cache import CACHE_DIR
+
+# Finished jobs are kept this long for status lookups and delivery dedup.
+JOB_STORE_RETENTION_SECONDS = int(
+    os.environ.get("DEPLOYMENT_HELPER_JOB_RETENTION", 7 * 24 * 60 * 60)
+)
+
+JobState = ty.Literal["queued", "running", "succeeded", "failed", "superseded"]
+
+UNFINISHED_JOB_STATES = ("queued", "running")
+
+# Tells this process apart from an earlier one that had the same pid, as
+# happens when a container restarts.
+_OWNER_TOKEN = uuid.uuid4().hex
+
+
+class JobRecord(ty.TypedDict):
+    job_id: str
+    repository_name: str
+    pull_request_id: int
+    head_sha: str
+    previous_head_sha: str | None
+    state: JobState
+    stage: str | None
+    attempts: int
+    created_at: float
+    started_at: float | None
+    finished_at: float | None
+    error: str | None
+    result: str | None
+
+
+class StageRecord(ty.TypedDict):
+    stage: str
+    # When the stage first started, and the time spent over all its runs.
+    started_at: float
+    duration: float
+    count: int
+
+
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite store of webhook jobs, their stages and results.
+
+    Every job is owned by the process that queued or resumed it. Unfinished
+    jobs of processes that are gone are claimed by the next one to boot, so
+    workers can be restarted or scaled without losing pull requests.
+    """
+
+    def __init__(
+        self,
+        *,
+        logger=structlog.get_logger(),
+        path: str = os.path.join(CACHE_DIR, "jobs.sqlite3"),
+    ):
+        self.logger = logger
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                repository_name TEXT NOT NULL,
+                pull_request_id INTEGER NOT NULL,
+                head_sha TEXT NOT NULL,
+                previous_head_sha TEXT,
+                state TEXT NOT NULL,
+                stage TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner_pid INTEGER NOT NULL,
+                owner_token TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                error TEXT,
+                result TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+            CREATE TABLE IF NOT EXISTS job_stages (
+                job_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                duration REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS job_stages_job_id ON job_stages (job_id);
+            """
+        )
+
+        # Stores created before stages were aggregated per job lack a count.
+        columns = {
+            row["name"]
+            for row in self._connection.execute("PRAGMA table_info(job_stages)")
+        }
+        if "count" not in columns:
+            self._connection.execute(
+                "ALTER TABLE job_stages ADD COLUMN count INTEGER NOT NULL DEFAULT 1"
+            )
+
+    def create(
+        self,
+        *,
+        job_id: str,
+        repository_name: str,
+        pull_request_id: int,
+        head_sha: str,
+        previous_head_sha: str | None,
+    ) -> bool:
+        """Records a queued job; returns False if the job id is already known."""
+        cursor = self._connection.execute(
+            "INSERT OR IGNORE INTO jobs (job_id, repository_name, pull_request_id,"
+            " head_sha, previous_head_sha, state, owner_pid, owner_token,"
+            " created_at) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (
+                job_id,
+                repository_name,
+                pull_request_id,
+                head_sha,
+                previous_head_sha,
+                os.getpid(),
+                _OWNER_TOKEN,
+                time.time(),
+            ),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, job_id: str):
+        self._connection.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def mark_running(self, job_id: str):
+        self._connection.execute(
+            "UPDATE jobs SET state = 'running', stage = NULL,"
+            " attempts = attempts + 1, started_at = ? WHERE job_id = ?",
+            (time.time(), job_id),
+        )
+
+    def mark_stage(self, job_id: str, stage: str):
+        self._connection.execute(
+            "UPDATE jobs SET stage = ? WHERE job_id = ?", (stage, job_id)
+        )
+
+    def record_stages(self, job_id: str, stages: ty.Iterable[StageRecord]):
+        """Stores the stages of a run in one transaction."""
+        with self._transaction():
+            self._connection.executemany(
+                "INSERT INTO job_stages (job_id, stage, started_at, duration, count)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        job_id,
+                        stage["stage"],
+                        stage["started_at"],
+                        stage["duration"],
+                        stage["count"],
+                    )
+                    for stage in stages
+                ),
+            )
+
+    @contextlib.contextmanager
+    def _transaction(self) -> ty.Iterator[None]:
+        # The connection is in autocommit mode, so transactions are explicit.
+        self._connection.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def finish(
+        self,
+        job_id: str,
+        state: JobState,
+        *,
+        error: str | None = None,
+        result: str | None = None,
+    ):
+        self._connection.execute(
+            "UPDATE jobs SET state = ?, finished_at = ?, error = ?, result = ?"
+            " WHERE job_id = ?",
+            (state, time.time(), error, result, job_id),
+        )
+
+    def get(self, job_id: str) -> JobRecord | None:
+        row = self._connection.execute(
+            "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        record = dict(row)
+        del record["owner_pid"], record["owner_token"]
+        return ty.cast(JobRecord, record)
+
+    def get_stages(self, job_id: str) -> list[StageRecord]:
+        rows = self._connection.execute(
+            "SELECT stage, started_at, duration, count FROM job_stages"
+            " WHERE job_id = ? ORDER BY started_at",
+            (job_id,),
+        ).fetchall()
+        return [ty.cast(StageRecord, dict(row)) for row in rows]
+
+    def claim_orphaned_jobs(self) -> list[JobRecord]:
+        """Takes over unfinished jobs whose owning process has exited.
+
+        Jobs are returned in creation order. The ownership update only
+        succeeds if no other process claimed the job in the meantime.
+        """
+        rows = self._connection.execute(
+            "SELECT job_id, owner_pid, owner_token FROM jobs WHERE state IN (?, ?)"
+            " ORDER BY created_at",
+            UNFINISHED_JOB_STATES,
+        ).fetchall()
+
+        claimed_jobs: list[JobRecord] = []
+        for row in rows:
+            if row["owner_token"] == _OWNER_TOKEN:
+                continue
+            if row["owner_pid"] != os.getpid() and _is_process_alive(row["owner_pid"]):
+                continue
+
+            cursor = self._connection.execute(
+                "UPDATE jobs SET owner_pid = ?, owner_token = ?, state = 'queued'"
+                " WHERE job_id = ? AND owner_token = ?",
+                (os.getpid(), _OWNER_TOKEN, row["job_id"], row["owner_token"]),
+            )
+            if cursor.rowcount == 1 and (job := self.get(row["job_id"])) is not None:
+                claimed_jobs.append(job)
+
+        return claimed_jobs
+
+    def prune(self):
+        """Drops finished jobs past the retention period."""
+        cutoff = time.time() - JOB_STORE_RETENTION_SECONDS
+        self._connection.execute(
+            "DELETE FROM job_stages WHERE job_id IN"
+            " (SELECT job_id FROM jobs WHERE finished_at < ?)",
+            (cutoff,),
+        )
+        self._connection.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+
+
+__ALL__ = ["JobRecord", "JobState", "JobStore", "StageRecord"]
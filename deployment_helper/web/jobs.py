@@ -0,0 +1,268 @@
+import asyncio
+import dataclasses
+import os
+import time
+import typing as ty
+from collections import deque
+
+import structlog
+
+from deployment_helper.core.stages import track_stages
+from deployment_helper.web.job_store import JobRecord, JobStore, StageRecord
+
+# Jobs waiting for a worker; webhooks are rejected with 503 past this.
+JOB_QUEUE_MAX_SIZE = int(os.environ.get("DEPLOYMENT_HELPER_JOB_QUEUE_MAX_SIZE", "100"))
+JOB_WORKERS = int(os.environ.get("DEPLOYMENT_HELPER_JOB_WORKERS", "4"))
+
+
+@dataclasses.dataclass
+class PullRequestJob:
+    delivery_id: str
+    repository_name: str
+    pull_request_id: int
+    head_sha: str
+    previous_head_sha: str | None = None
+
+    @property
+    def key(self) -> tuple[str, int]:
+        return self.repository_name, self.pull_request_id
+
+    @classmethod
+    def from_record(cls, record: JobRecord) -> "PullRequestJob":
+        return cls(
+            delivery_id=record["job_id"],
+            repository_name=record["repository_name"],
+            pull_request_id=record["pull_request_id"],
+            head_sha=record["head_sha"],
+            previous_head_sha=record["previous_head_sha"],
+        )
+
+
+SubmitResult = ty.Literal["queued", "duplicate", "coalesced"]
+
+JobRunner = ty.Callable[[PullRequestJob], ty.Awaitable[ty.Any]]
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class _JobStageRecorder:
+    """Aggregates the stages of a run per name, stored once the run ends.
+
+    Stages such as file analysis run once per file, so only the first start
+    of each stage is written through as the job's current stage.
+    """
+
+    def __init__(self, job_store: JobStore, job_id: str):
+        self._job_store = job_store
+        self._job_id = job_id
+        self.stages: dict[str, StageRecord] = {}
+
+    def stage_started(self, name: str):
+        if name not in self.stages:
+            self.stages[name] = StageRecord(
+                stage=name, started_at=time.time(), duration=0.0, count=0
+            )
+            self._job_store.mark_stage(self._job_id, name)
+
+    def stage_finished(self, name: str, started_at: float, duration: float):
+        stage = self.stages.setdefault(
+            name,
+            StageRecord(stage=name, started_at=started_at, duration=0.0, count=0),
+        )
+        stage["started_at"] = min(stage["started_at"], started_at)
+        stage["duration"] += duration
+        stage["count"] += 1
+
+
+class JobQueue:
+    """Runs pull request jobs on a pool of in-process workers.
+
+    Jobs are recorded in the job store under their webhook delivery id,
+    which also deduplicates redeliveries. A job for a pull request that is
+    already waiting replaces the waiting one, and a job for a pull request
+    that is being analysed cancels the superseded run. Jobs left unfinished
+    by a process that exited are resumed on start.
+    """
+
+    def __init__(
+        self,
+        *,
+        logger=structlog.get_logger(),
+        runner: JobRunner,
+        job_store: JobStore,
+        workers: int = JOB_WORKERS,
+        max_size: int = JOB_QUEUE_MAX_SIZE,
+    ):
+        self._logger = logger
+        self._runner = runner
+        self._job_store = job_store
+        self._workers_count = workers
+
+        self._queue: asyncio.Queue[PullRequestJob] = asyncio.Queue(maxsize=max_size)
+        self._workers: list[asyncio.Task] = []
+
+        # Resumed jobs bypass the bound, they were accepted before.
+        self._resumed: deque[PullRequestJob] = deque()
+        self._pending: dict[tuple[str, int], PullRequestJob] = {}
+        self._running: dict[tuple[str, int], tuple[PullRequestJob, asyncio.Task]] = {}
+
+    def start(self):
+        self._job_store.prune()
+
+        for record in self._job_store.claim_orphaned_jobs():
+            job = PullRequestJob.from_record(record)
+            self._logger.info(
+                "resuming unfinished job",
+                delivery_id=job.delivery_id,
+                repository_name=job.repository_name,
+                pull_request_id=job.pull_request_id,
+                stage=record["stage"],
+            )
+            self._resumed.append(job)
+            self._pending[job.key] = job
+
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"job-worker-{idx}")
+            for idx in range(self._workers_count)
+        ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() + len(self._resumed)
+
+    def submit(self, job: PullRequestJob) -> SubmitResult:
+        """Schedules a job, raising `JobQueueFull` when no slot is left."""
+        logger = self._logger.bind(
+            delivery_id=job.delivery_id,
+            repository_name=job.repository_name,
+            pull_request_id=job.pull_request_id,
+            head_sha=job.head_sha,
+        )
+
+        pending_job = self._pending.get(job.key)
+        running = self._running.get(job.key)
+
+        # The waiting job never ran and the superseded run may not have
+        # stored its results, so their baseline is kept.
+        if pending_job is not None:
+            job.previous_head_sha = pending_job.previous_head_sha
+        elif running is not None:
+            job.previous_head_sha = running[0].previous_head_sha
+
+        if not self._job_store.create(
+            job_id=job.delivery_id,
+            repository_name=job.repository_name,
+            pull_request_id=job.pull_request_id,
+            head_sha=job.head_sha,
+            previous_head_sha=job.previous_head_sha,
+        ):
+            logger.info("dropping duplicate webhook delivery")
+            return "duplicate"
+
+        if pending_job is not None:
+            self._job_store.finish(pending_job.delivery_id, "superseded")
+            pending_job.delivery_id = job.delivery_id
+            pending_job.head_sha = job.head_sha
+            logger.info("coalesced job into waiting job for the pull request")
+            return "coalesced"
+
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            # Forget the delivery so GitHub's redelivery is accepted later.
+            self._job_store.delete(job.delivery_id)
+            logger.warning("job queue is full", queue_depth=self.depth)
+            raise JobQueueFull()
+
+        if running is not None:
+            running_job, running_task = running
+            logger.info(
+                "cancelling superseded run", superseded_head_sha=running_job.head_sha
+            )
+            running_task.cancel()
+
+        self._pending[job.key] = job
+        logger.info("queued job", queue_depth=self.depth)
+        return "queued"
+
+    async def _work(self):
+        while True:
+            from_queue = not self._resumed
+            job = await self._queue.get() if from_queue else self._resumed.popleft()
+            try:
+                await self._run(job)
+            except Exception:
+                # A failing job store must not take the worker down with it.
+                self._logger.exception(
+                    "job worker failed to run job", delivery_id=job.delivery_id
+                )
+            finally:
+                if from_queue:
+                    self._queue.task_done()
+
+    async def _run(self, job: PullRequestJob):
+        if self._pending.get(job.key) is job:
+            del self._pending[job.key]
+
+        logger = self._logger.bind(
+            delivery_id=job.delivery_id,
+            repository_name=job.repository_name,
+            pull_request_id=job.pull_request_id,
+            head_sha=job.head_sha,
+        )
+
+        self._job_store.mark_running(job.delivery_id)
+
+        stage_recorder = _JobStageRecorder(self._job_store, job.delivery_id)
+        task = asyncio.create_task(self._run_tracked(job, stage_recorder))
+        self._running[job.key] = (job, task)
+
+        try:
+            # Waiting keeps the cancellation of a superseded run from
+            # propagating into the worker.
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            # Shutting down: the job stays unfinished and is resumed by the
+            # next process to start.
+            task.cancel()
+            raise
+        finally:
+            if self._running.get(job.key, (None,))[0] is job:
+                del self._running[job.key]
+
+        self._job_store.record_stages(
+            job.delivery_id,
+            (stage for stage in stage_recorder.stages.values() if stage["count"]),
+        )
+
+        if task.cancelled():
+            self._job_store.finish(job.delivery_id, "superseded")
+            logger.info("job cancelled by a newer head")
+        elif (error := task.exception()) is not None:
+            self._job_store.finish(job.delivery_id, "failed", error=repr(error))
+            logger.error("job failed", exc_info=error)
+        else:
+            result = task.result()
+            self._job_store.finish(
+                job.delivery_id,
+                "succeeded",
+                result=result if isinstance(result, str) else None,
+            )
+            logger.info("job finished")
+
+    async def _run_tracked(
+        self, job: PullRequestJob, stage_recorder: _JobStageRecorder
+    ) -> ty.Any:
+        with track_stages(stage_recorder):
+            return await self._runner(job)
+
+
+__ALL__ = ["JobQueue", "JobQueueFull", "PullRequestJob"]
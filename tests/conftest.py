@@ -0,0 +1,5 @@
+import os
+
+# deployment_helper.core reads these at import time.
+os.environ.setdefault("COHERE_API_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,35 @@
+import asyncio
+import json
+import types
+
+from deployment_helper.web.app import job_status
+from deployment_helper.web.job_store import JobStore, StageRecord
+
+
+def test_job_status_leaves_out_policy_and_repository(tmp_path):
+    job_store = JobStore(path=str(tmp_path / "jobs.sqlite3"))
+    job_store.create(
+        job_id="delivery",
+        repository_name="org/private-repo",
+        pull_request_id=1,
+        head_sha="abc",
+        previous_head_sha=None,
+    )
+    job_store.record_stages(
+        "delivery",
+        [StageRecord(stage="file_fetch", started_at=1.0, duration=2.0, count=3)],
+    )
+    job_store.finish("delivery", "failed", error="token for org/private-repo")
+    request = types.SimpleNamespace(
+        app=types.SimpleNamespace(ctx=types.SimpleNamespace(job_store=job_store))
+    )
+
+    response = asyncio.run(job_status(request, "delivery"))
+
+    body = json.loads(response.body)
+    assert body["state"] == "failed"
+    assert body["stages"] == [
+        {"stage": "file_fetch", "started_at": 1.0, "duration": 2.0, "count": 3}
+    ]
+    assert "private-repo" not in response.body.decode()
+    assert not {"repository_name", "error", "result"} & body.keys()
@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from deployment_helper.core.aws_action_index import AwsActionIndex, get_aws_action_index
+
+CORPUS_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "benchmarks", "data", "bad_aws_sdk_calls.jsonl"
+)
+
+# Calls the index cannot repair yet; dropping them is safe, a wrong action
+# is not.
+KNOWN_MISSES = {("logs", "PutMetricData"), ("dynamodb", "SendMessage")}
+
+
+def _corpus() -> list:
+    with open(CORPUS_PATH) as f:
+        calls = [json.loads(line) for line in f if line.strip()]
+
+    return [
+        pytest.param(
+            call,
+            id=f"{call['service']}:{call['action']}",
+            marks=(
+                [pytest.mark.xfail(strict=True, reason="not repaired yet")]
+                if (call["service"], call["action"]) in KNOWN_MISSES
+                else []
+            ),
+        )
+        for call in calls
+    ]
+
+
+@pytest.mark.parametrize("call", _corpus())
+def test_corpus_calls_are_repaired(call: dict):
+    resolved = get_aws_action_index().resolve(call["service"], call["action"])
+    found = [f"{entry['service']}:{entry['action']}" for entry in resolved]
+    assert found == call["expected"]
+
+
+def test_wildcards_expand_to_catalog_actions():
+    action_index = AwsActionIndex({"s3": ["GetObject", "GetBucketPolicy", "PutObject"]})
+
+    resolved = action_index.resolve("s3", "Get*")
+
+    assert [(entry["action"], entry["repair"]) for entry in resolved] == [
+        ("GetBucketPolicy", "wildcard"),
+        ("GetObject", "wildcard"),
+    ]
+
+
+@pytest.mark.parametrize("action", ["*", "s3:*", "?*", "*Object*"])
+def test_service_wide_wildcards_are_dropped(action: str):
+    action_index = AwsActionIndex({"s3": ["GetObject", "PutObject"]})
+    assert action_index.resolve("s3", action) == []
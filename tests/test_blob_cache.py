@@ -0,0 +1,68 @@
+import os
+
+from deployment_helper.core.cache.blob_cache import BlobCache, git_blob_sha
+
+
+# Entries are written through a cache with the default budget, so writes do
+# not start a background eviction racing with the mtimes set here.
+def _put(blob_cache: BlobCache, data: bytes, mtime: float) -> str:
+    sha = git_blob_sha(data)
+    blob_cache.put(sha, data)
+    os.utime(blob_cache._blob_path(sha), (mtime, mtime))
+    return sha
+
+
+def test_eviction_drops_least_recently_used_blobs(tmp_path):
+    shas = [
+        _put(BlobCache(directory=str(tmp_path)), bytes([idx]) * 300, mtime=1000 + idx)
+        for idx in range(4)
+    ]
+    blob_cache = BlobCache(directory=str(tmp_path), max_size_bytes=1000)
+    # Reading the oldest blob makes it the most recently used one.
+    assert blob_cache.get(shas[0]) is not None
+
+    blob_cache.evict()
+
+    # 1200 bytes are trimmed to 90% of the budget, dropping the blob used
+    # longest ago.
+    assert [sha in blob_cache for sha in shas] == [True, False, True, True]
+
+
+def test_eviction_keeps_a_cache_within_budget(tmp_path):
+    shas = [
+        _put(BlobCache(directory=str(tmp_path)), bytes([idx]) * 300, mtime=1000 + idx)
+        for idx in range(3)
+    ]
+    blob_cache = BlobCache(directory=str(tmp_path), max_size_bytes=1000)
+
+    blob_cache.evict()
+
+    assert all(sha in blob_cache for sha in shas)
+
+
+def test_writes_start_eviction_in_the_background(tmp_path):
+    shas = [
+        _put(BlobCache(directory=str(tmp_path)), bytes([idx]) * 400, mtime=1000 + idx)
+        for idx in range(4)
+    ]
+    blob_cache = BlobCache(directory=str(tmp_path), max_size_bytes=1600)
+
+    # A write of more than a sixteenth of the budget starts an eviction.
+    sha = git_blob_sha(b"new" * 100)
+    blob_cache.put(sha, b"new" * 100)
+    assert blob_cache._eviction_thread is not None
+    blob_cache._eviction_thread.join(timeout=5)
+
+    assert shas[0] not in blob_cache
+    assert sha in blob_cache
+
+
+def test_corrupted_blobs_are_discarded(tmp_path):
+    blob_cache = BlobCache(directory=str(tmp_path))
+    sha = _put(blob_cache, b"print('hello')\n", mtime=1000)
+    with open(blob_cache._blob_path(sha), "wb") as f:
+        f.write(b"truncated")
+
+    assert blob_cache.get(sha) is None
+    assert sha not in blob_cache
+    assert blob_cache.stats()["misses"] == 1
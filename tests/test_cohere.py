@@ -0,0 +1,92 @@
+import asyncio
+import types
+
+import pytest
+
+from deployment_helper.core.clients import cohere
+
+
+class FakeCohereClient:
+    """Scores each document by the number it holds, e.g. "0.7" -> 0.7."""
+
+    def __init__(self):
+        self.requests: list[tuple[list[str], int | None]] = []
+        self.active_requests = 0
+        self.max_active_requests = 0
+
+    async def rerank(self, *, model, query, documents, top_n):
+        self.requests.append((documents, top_n))
+        self.active_requests += 1
+        self.max_active_requests = max(self.max_active_requests, self.active_requests)
+        await asyncio.sleep(0.01)
+        self.active_requests -= 1
+
+        results = sorted(
+            (
+                types.SimpleNamespace(index=index, relevance_score=float(document))
+                for index, document in enumerate(documents)
+            ),
+            key=lambda result: -result.relevance_score,
+        )
+        return types.SimpleNamespace(results=results[:top_n])
+
+
+@pytest.fixture
+def cohere_client(monkeypatch) -> FakeCohereClient:
+    client = FakeCohereClient()
+    monkeypatch.setattr(cohere, "get_cohere_client", lambda api_key: client)
+    return client
+
+
+def _rerank(documents: list[str], **kwargs) -> list[cohere.RankedText]:
+    return asyncio.run(
+        cohere.rerank_documents(
+            api_key="test", query="aws", documents=documents, **kwargs
+        )
+    )
+
+
+def test_batches_are_merged_into_one_ranking(cohere_client: FakeCohereClient):
+    documents = ["0.1", "0.9", "0.3", "0.8", "0.05", "0.7", "0.6"]
+
+    ranked = _rerank(documents, batch_size=3, relevance_score_threshold=0.0)
+
+    assert [len(batch) for batch, _ in cohere_client.requests] == [3, 3, 1]
+    assert [(text["rank"], text["index"]) for text in ranked] == [
+        (0, 1),
+        (1, 3),
+        (2, 5),
+        (3, 6),
+        (4, 2),
+        (5, 0),
+        (6, 4),
+    ]
+    assert all(documents[text["index"]] == text["content"] for text in ranked)
+
+
+def test_top_n_and_threshold_apply_to_the_merged_ranking(
+    cohere_client: FakeCohereClient,
+):
+    documents = ["0.1", "0.9", "0.3", "0.8", "0.05", "0.7", "0.6"]
+
+    ranked = _rerank(documents, batch_size=3, top_n=3, relevance_score_threshold=0.75)
+
+    # Each batch only has to return its own best three.
+    assert [top_n for _, top_n in cohere_client.requests] == [3, 3, 1]
+    assert [text["content"] for text in ranked] == ["0.9", "0.8"]
+
+
+def test_batches_run_concurrently_within_the_limit(
+    monkeypatch, cohere_client: FakeCohereClient
+):
+    monkeypatch.setattr(cohere, "RERANKER_MAX_CONCURRENT_REQUESTS", 2)
+
+    _rerank(["0.5"] * 10, batch_size=1, relevance_score_threshold=0.0)
+
+    assert len(cohere_client.requests) == 10
+    assert cohere_client.max_active_requests == 2
+
+
+def test_no_documents_make_no_request(cohere_client: FakeCohereClient):
+    assert _rerank([], relevance_score_threshold=0.0) == []
+    assert cohere_client.requests == []
@@ -0,0 +1,83 @@
+import asyncio
+
+from deployment_helper.core import llm_engine
+from deployment_helper.core.clients.github import GithubFile
+from deployment_helper.core.llm_engine.file_store import FileStore
+
+
+async def _endless_files():
+    idx = 0
+    while True:
+        yield GithubFile(
+            path=f"src/file_{idx}.py",
+            url=f"file:///src/file_{idx}.py",
+            content="print('hello')\n",
+        )
+        idx += 1
+
+
+def test_cancelling_with_full_queue_finishes(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm_engine, "STREAM_QUEUE_MAX_SIZE", 2)
+
+    async def consume(first_window: asyncio.Event):
+        windows = llm_engine._iter_file_windows(
+            github_files=_endless_files(),
+            file_store=FileStore(directory=str(tmp_path)),
+            window_size=1,
+        )
+        try:
+            async for _ in windows:
+                first_window.set()
+                # Stop reading so the producer fills the queue.
+                await asyncio.sleep(3600)
+        finally:
+            await windows.aclose()
+
+    async def main():
+        first_window = asyncio.Event()
+        consumer = asyncio.ensure_future(consume(first_window))
+        await asyncio.wait_for(first_window.wait(), timeout=5)
+        await asyncio.sleep(0.05)
+
+        consumer.cancel()
+        done, _ = await asyncio.wait({consumer}, timeout=5)
+        assert done, "cancelled stream did not finish"
+
+    asyncio.run(main())
+
+
+def test_streamed_contents_stay_within_memory_budget(tmp_path):
+    # Three bytes per character in UTF-8.
+    content = "# 日本語のコメント\n" * 100
+    files_count = 200
+    file_store = FileStore(memory_budget_bytes=64 * 1024, directory=str(tmp_path))
+    resident_bytes: list[int] = []
+
+    async def files():
+        for idx in range(files_count):
+            yield GithubFile(
+                path=f"src/file_{idx}.py",
+                url=f"file:///src/file_{idx}.py",
+                content=content,
+            )
+            resident_bytes.append(file_store.resident_bytes)
+
+    async def main():
+        windows = llm_engine._iter_file_windows(
+            github_files=files(), file_store=file_store, window_size=10
+        )
+        return [file async for window in windows for file in window]
+
+    streamed_files = asyncio.run(main())
+
+    stats = file_store.stats()
+    resident_files_count = stats["files_count"] - stats["spilled_files_count"]
+    assert len(streamed_files) == files_count
+    assert file_store.resident_bytes == resident_files_count * len(
+        content.encode("utf-8")
+    )
+    assert max(resident_bytes) <= file_store.memory_budget_bytes
+    assert file_store.resident_bytes <= file_store.memory_budget_bytes
+    assert file_store.spilled_bytes > 0
+    assert file_store.get("src/file_199.py") == content
+    file_store.close()
@@ -0,0 +1,137 @@
+import asyncio
+import contextlib
+import datetime
+import types
+
+import aiohttp
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from deployment_helper.core.clients import github
+from deployment_helper.core.clients.github import GithubAppAuth
+
+
+@pytest.fixture(scope="module")
+def private_key() -> bytes:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    )
+
+
+class FakeGithubClient:
+    """Answers installation lookups and token creations for org/repo."""
+
+    def __init__(self, token_ttl: datetime.timedelta = datetime.timedelta(hours=1)):
+        self.requests: list[tuple[str, str]] = []
+        self.installation_id = 1
+        self.missing_installation_ids: set[int] = set()
+        self._token_ttl = token_ttl
+
+    @contextlib.asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs):
+        self.requests.append((method, url.removeprefix(github.GITHUB_API_URL)))
+        # Lets concurrent callers pile up behind the first request.
+        await asyncio.sleep(0.01)
+
+        status, data = 200, {"id": self.installation_id}
+        if method == "POST":
+            installation_id = int(url.split("/")[-2])
+            if installation_id in self.missing_installation_ids:
+                status = 404
+            expires_at = datetime.datetime.now(datetime.timezone.utc) + self._token_ttl
+            data = {
+                "token": f"token-{len(self.requests)}",
+                "expires_at": expires_at.isoformat(),
+            }
+
+        def raise_for_status():
+            if status >= 400:
+                raise aiohttp.ClientResponseError(None, (), status=status)
+
+        async def json():
+            return data
+
+        yield types.SimpleNamespace(raise_for_status=raise_for_status, json=json)
+
+
+def test_app_jwt_is_reused_until_it_nears_expiry(private_key: bytes, monkeypatch):
+    now = 1_700_000_000.0
+    monkeypatch.setattr(github.time, "time", lambda: now)
+    github_app_auth = GithubAppAuth(client_id="app", private_key=private_key)
+
+    app_jwt = github_app_auth.app_jwt()
+    now += (
+        github.GITHUB_APP_JWT_TTL_SECONDS
+        - github.GITHUB_APP_JWT_REFRESH_MARGIN_SECONDS
+        - 1
+    )
+    assert github_app_auth.app_jwt() == app_jwt
+
+    now += 1
+    assert github_app_auth.app_jwt() != app_jwt
+
+
+def test_concurrent_callers_share_one_token(private_key: bytes):
+    github_app_auth = GithubAppAuth(client_id="app", private_key=private_key)
+    github_client = FakeGithubClient()
+
+    async def access_token() -> str:
+        return await github_app_auth.access_token(
+            repository_path="org/repo", github_client=github_client
+        )
+
+    async def main() -> list[str]:
+        tokens = await asyncio.gather(*(access_token() for _ in range(5)))
+        return [*tokens, await access_token()]
+
+    assert asyncio.run(main()) == ["token-2"] * 6
+    assert github_client.requests == [
+        ("GET", "/repos/org/repo/installation"),
+        ("POST", "/app/installations/1/access_tokens"),
+    ]
+
+
+def test_tokens_are_refreshed_before_they_expire(private_key: bytes):
+    github_app_auth = GithubAppAuth(client_id="app", private_key=private_key)
+    # Expires within the refresh margin, so it is never handed out twice.
+    github_client = FakeGithubClient(token_ttl=datetime.timedelta(seconds=60))
+
+    async def main() -> list[str]:
+        return [
+            await github_app_auth.access_token(
+                repository_path="org/repo", github_client=github_client
+            )
+            for _ in range(2)
+        ]
+
+    assert asyncio.run(main()) == ["token-2", "token-3"]
+    # The installation id is still remembered.
+    assert [method for method, _ in github_client.requests] == ["GET", "POST", "POST"]
+
+
+def test_reinstalled_apps_are_looked_up_again(private_key: bytes):
+    github_app_auth = GithubAppAuth(client_id="app", private_key=private_key)
+    github_client = FakeGithubClient()
+
+    async def access_token() -> str:
+        return await github_app_auth.access_token(
+            repository_path="org/repo", github_client=github_client
+        )
+
+    async def main() -> str:
+        await access_token()
+        github_client.missing_installation_ids.add(1)
+        github_client.installation_id = 2
+        github_app_auth._installation_tokens.clear()
+        return await access_token()
+
+    assert asyncio.run(main()) == "token-5"
+    assert github_client.requests[2:] == [
+        ("POST", "/app/installations/1/access_tokens"),
+        ("GET", "/repos/org/repo/installation"),
+        ("POST", "/app/installations/2/access_tokens"),
+    ]
@@ -0,0 +1,101 @@
+import asyncio
+import base64
+import contextlib
+import io
+import tarfile
+import types
+
+import pytest
+
+from deployment_helper.core.cache.blob_cache import BlobCache, git_blob_sha
+from deployment_helper.core.clients import github
+
+FILES = {f"src/module_{idx}.py": f"print({idx})\n".encode() * 5000 for idx in range(4)}
+
+
+def _tarball() -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for path, data in FILES.items():
+            member = tarfile.TarInfo(f"org-repo-abc/{path}")
+            member.size = len(data)
+            archive.addfile(member, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class FakeGithubClient:
+    """Serves org/repo, failing the tarball download halfway through."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+        self.contents_requests: list[str] = []
+
+    async def _iter_chunked(self, size: int):
+        tarball = _tarball()
+        yield tarball[: len(tarball) // 2]
+        raise self.error
+
+    @contextlib.asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs):
+        path = url.removeprefix(f"{github.GITHUB_API_URL}/repos/org/repo/")
+        data = None
+        if path.startswith("git/trees/"):
+            data = {
+                "tree": [
+                    {
+                        "path": file_path,
+                        "type": "blob",
+                        "size": len(content),
+                        "url": f"{github.GITHUB_API_URL}/{file_path}",
+                        "sha": git_blob_sha(content),
+                    }
+                    for file_path, content in FILES.items()
+                ]
+            }
+        elif path.startswith("contents/"):
+            file_path = path.removeprefix("contents/").partition("?")[0]
+            self.contents_requests.append(file_path)
+            data = {"content": base64.b64encode(FILES[file_path]).decode()}
+
+        async def json():
+            return data
+
+        yield types.SimpleNamespace(
+            status=200,
+            raise_for_status=lambda: None,
+            json=json,
+            content=types.SimpleNamespace(iter_chunked=self._iter_chunked),
+        )
+
+
+@pytest.mark.parametrize(
+    "error", [asyncio.TimeoutError(), EOFError("Compressed file ended")]
+)
+def test_failed_archives_fall_back_to_the_contents_api(tmp_path, error):
+    github_client = FakeGithubClient(error)
+
+    async def main() -> list[github.GithubFile]:
+        return [
+            github_file
+            async for github_file in github.iter_github_repository_files(
+                github_access_token="token",
+                repository_path="org/repo",
+                fetch_mode="archive",
+                github_client=github_client,
+                blob_cache=BlobCache(directory=str(tmp_path)),
+            )
+        ]
+
+    github_files = asyncio.run(main())
+
+    assert sorted(github_file["path"] for github_file in github_files) == sorted(FILES)
+    assert all(
+        github_file["content"].encode() == FILES[github_file["path"]]
+        for github_file in github_files
+    )
+    # Files the archive yielded before failing are not fetched again.
+    archive_files_count = len(FILES) - len(github_client.contents_requests)
+    assert 0 < archive_files_count < len(FILES)
+    assert sorted(
+        github_file["path"] for github_file in github_files[archive_files_count:]
+    ) == sorted(github_client.contents_requests)
@@ -0,0 +1,55 @@
+import pytest
+
+from deployment_helper.core.gitignore import is_ignored, parse_gitignore
+
+
+@pytest.mark.parametrize(
+    "gitignore, path, is_dir, expected",
+    [
+        # Negation re-includes, the last matching rule wins.
+        ("*.log\n!keep.log\n", "debug.log", False, True),
+        ("*.log\n!keep.log\n", "logs/keep.log", False, False),
+        ("!keep.log\n*.log\n", "keep.log", False, True),
+        # `**` spans any number of directories.
+        ("docs/**/*.md\n", "docs/index.md", False, True),
+        ("docs/**/*.md\n", "docs/guide/setup/index.md", False, True),
+        ("docs/**/*.md\n", "site/docs/index.md", False, False),
+        ("**/build\n", "build", True, True),
+        ("**/build\n", "packages/app/build", True, True),
+        ("vendor/**\n", "vendor/lib/client.py", False, True),
+        # A slash other than a trailing one anchors the pattern.
+        ("/config.py\n", "config.py", False, True),
+        ("/config.py\n", "src/config.py", False, False),
+        ("src/generated\n", "src/generated", True, True),
+        ("src/generated\n", "lib/src/generated", True, False),
+        ("config.py\n", "src/config.py", False, True),
+        # A trailing slash only matches directories.
+        ("build/\n", "build", True, True),
+        ("build/\n", "build", False, False),
+        ("build/\n", "src/build", True, True),
+        # Wildcards stay within one path component.
+        ("*.py\n", "src/app.py", False, True),
+        ("src/*.py\n", "src/lib/app.py", False, False),
+        ("file[!0-9].txt\n", "filea.txt", False, True),
+        ("file[!0-9].txt\n", "file1.txt", False, False),
+        # Comments, escapes and trailing spaces.
+        ("# notes\n", "# notes", False, False),
+        ("\\#notes\n", "#notes", False, True),
+        ("notes.txt   \n", "notes.txt", False, True),
+    ],
+)
+def test_gitignore_rules(gitignore: str, path: str, is_dir: bool, expected: bool):
+    assert is_ignored(parse_gitignore(gitignore), path, is_dir=is_dir) == expected
+
+
+def test_nested_gitignore_rules_apply_below_their_directory():
+    rules = parse_gitignore("*.tmp\n") + parse_gitignore(
+        "/out\n!keep.tmp\n", base="pkg"
+    )
+
+    assert is_ignored(rules, "pkg/out", is_dir=True)
+    assert not is_ignored(rules, "out", is_dir=True)
+    assert not is_ignored(rules, "pkg/src/out", is_dir=True)
+    assert is_ignored(rules, "pkg/a.tmp", is_dir=False)
+    assert not is_ignored(rules, "pkg/keep.tmp", is_dir=False)
+    assert is_ignored(rules, "keep.tmp", is_dir=False)
@@ -0,0 +1,35 @@
+import pytest
+
+from deployment_helper.core.iam_policy import normalize_resource
+
+
+@pytest.mark.parametrize(
+    "resource, expected",
+    [
+        ("arn:aws:s3:::my-bucket/*", "arn:aws:s3:::*/*"),
+        ("arn:aws:s3:::example-bucket", "arn:aws:s3:::*"),
+        ("arn:aws:s3:::bucketName/*", "arn:aws:s3:::*/*"),
+        ("arn:aws:s3:::${BucketName}/*", "arn:aws:s3:::*/*"),
+        ("arn:aws:dynamodb:*:*:table/MyTable", "arn:aws:dynamodb:*:*:table/*"),
+        ("arn:aws:sqs:us-east-1:*:your_queue", "arn:aws:sqs:us-east-1:*:*"),
+        ("arn:aws:sns:*:*:TOPIC_NAME", "arn:aws:sns:*:*:*"),
+    ],
+)
+def test_placeholders_are_replaced(resource: str, expected: str):
+    assert normalize_resource(resource) == expected
+
+
+@pytest.mark.parametrize(
+    "resource",
+    [
+        "arn:aws:s3:::mybucket",
+        "arn:aws:s3:::sampledata/*",
+        "arn:aws:s3:::mybucket-prod/uploads/*",
+        "arn:aws:s3:::counterexample",
+        "arn:aws:dynamodb:us-east-1:*:table/myorders",
+        "arn:aws:dynamodb:*:*:table/sample_orders",
+        "arn:aws:sqs:*:*:dummy-queue-dlq",
+    ],
+)
+def test_real_names_are_kept(resource: str):
+    assert normalize_resource(resource) == resource
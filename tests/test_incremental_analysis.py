@@ -0,0 +1,88 @@
+import sqlite3
+
+from deployment_helper.core.llm_engine import _merge_analyses
+from deployment_helper.core.llm_engine.analysis_store import (
+    AnalysisStore,
+    FileAnalysis,
+)
+from deployment_helper.core.llm_engine.aws_analyzer import AwsSdkCall
+
+
+def _analysis(scores: dict[str, float]) -> FileAnalysis:
+    return FileAnalysis(
+        results={path: [] for path in scores},
+        scores=scores,
+    )
+
+
+def _full_selection(scores: dict[str, float], top_n: int) -> list[str]:
+    return [
+        path
+        for path, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    ][:top_n]
+
+
+def test_merge_matches_a_full_run():
+    head_scores = {"a.py": 0.9, "b.py": 0.8, "c.py": 0.7, "d.py": 0.2, "e.py": 0.75}
+    previous = _analysis({"a.py": 0.9, "b.py": 0.5, "c.py": 0.7})
+    # b.py now ranks higher and the new e.py pushes c.py out.
+    changed = _analysis({"b.py": 0.8, "e.py": 0.75})
+
+    merged = _merge_analyses(previous, {"b.py", "e.py"}, changed, top_n=3)
+
+    assert merged is not None
+    assert list(merged.results) == _full_selection(head_scores, top_n=3)
+
+
+def test_merge_gives_up_when_unstored_files_may_rank_higher():
+    previous = _analysis({"a.py": 0.9, "b.py": 0.8})
+    # b.py dropped out, an unchanged file ranked third before may now be
+    # second, but its score was never stored.
+    changed = _analysis({})
+
+    assert _merge_analyses(previous, {"b.py"}, changed, top_n=2) is None
+
+
+def test_merge_of_a_partial_selection_needs_no_full_run():
+    # Fewer files than top_n were relevant, the others scored below the
+    # threshold and cannot be selected.
+    previous = _analysis({"a.py": 0.9, "b.py": 0.8})
+
+    merged = _merge_analyses(previous, {"b.py"}, _analysis({}), top_n=3)
+
+    assert merged is not None
+    assert list(merged.results) == ["a.py"]
+
+
+def test_store_round_trips_scores(tmp_path):
+    analysis_store = AnalysisStore(path=str(tmp_path / "analysis.sqlite3"))
+    sdk_call = AwsSdkCall(
+        service="s3", action="GetObject", resource="*", reasoning="reads"
+    )
+    analysis = FileAnalysis(
+        results={"a.py": [sdk_call], "b.py": []},
+        scores={"a.py": 0.9, "b.py": 0.4},
+    )
+
+    analysis_store.save_results(
+        repository="org/repo", commit_sha="abc", analysis=analysis
+    )
+
+    assert analysis_store.get_results(repository="org/repo", commit_sha="abc") == (
+        analysis
+    )
+
+
+def test_results_stored_without_scores_are_not_reused(tmp_path):
+    path = str(tmp_path / "analysis.sqlite3")
+    analysis_store = AnalysisStore(path=path)
+    analysis_store.save_results(
+        repository="org/repo",
+        commit_sha="abc",
+        analysis=_analysis({"a.py": 0.9}),
+    )
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("UPDATE file_results SET score = NULL")
+
+    assert analysis_store.get_results(repository="org/repo", commit_sha="abc") is None
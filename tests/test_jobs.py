@@ -0,0 +1,135 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from deployment_helper.web.job_store import JobStore
+from deployment_helper.web.jobs import JobQueue, JobQueueFull, PullRequestJob
+
+
+def _job(delivery_id: str, pull_request_id: int = 1, head_sha: str = "a"):
+    return PullRequestJob(
+        delivery_id=delivery_id,
+        repository_name="org/repo",
+        pull_request_id=pull_request_id,
+        head_sha=head_sha,
+    )
+
+
+@pytest.fixture
+def job_store(tmp_path) -> JobStore:
+    return JobStore(path=str(tmp_path / "jobs.sqlite3"))
+
+
+class RecordingRunner:
+    def __init__(self, expected_count: int):
+        self.jobs: list[PullRequestJob] = []
+        self.done = asyncio.Event()
+        self._expected_count = expected_count
+
+    async def __call__(self, job: PullRequestJob) -> str:
+        self.jobs.append(job)
+        if len(self.jobs) == self._expected_count:
+            self.done.set()
+        return "ok"
+
+
+async def _run_queue(job_queue: JobQueue, runner: RecordingRunner):
+    job_queue.start()
+    try:
+        await asyncio.wait_for(runner.done.wait(), timeout=5)
+        # Let the workers store the results of the last job.
+        await asyncio.sleep(0.01)
+    finally:
+        await job_queue.stop()
+
+
+def test_redelivered_webhooks_are_dropped(job_store: JobStore):
+    runner = RecordingRunner(expected_count=1)
+    job_queue = JobQueue(runner=runner, job_store=job_store)
+
+    assert job_queue.submit(_job("delivery-1")) == "queued"
+    assert job_queue.submit(_job("delivery-1")) == "duplicate"
+
+    asyncio.run(_run_queue(job_queue, runner))
+
+    assert [job.delivery_id for job in runner.jobs] == ["delivery-1"]
+
+
+def test_jobs_for_a_waiting_pull_request_are_coalesced(job_store: JobStore):
+    runner = RecordingRunner(expected_count=2)
+    job_queue = JobQueue(runner=runner, job_store=job_store)
+
+    assert job_queue.submit(_job("delivery-1", head_sha="a")) == "queued"
+    assert job_queue.submit(_job("delivery-2", pull_request_id=2)) == "queued"
+    assert job_queue.submit(_job("delivery-3", head_sha="b")) == "coalesced"
+
+    asyncio.run(_run_queue(job_queue, runner))
+
+    assert [(job.delivery_id, job.head_sha) for job in runner.jobs] == [
+        ("delivery-3", "b"),
+        ("delivery-2", "a"),
+    ]
+    assert job_store.get("delivery-1")["state"] == "superseded"
+    assert job_store.get("delivery-3")["state"] == "succeeded"
+
+
+def test_full_queue_rejects_jobs_and_forgets_the_delivery(job_store: JobStore):
+    job_queue = JobQueue(runner=RecordingRunner(1), job_store=job_store, max_size=1)
+
+    async def main():
+        job_queue.submit(_job("delivery-1", pull_request_id=1))
+        with pytest.raises(JobQueueFull):
+            job_queue.submit(_job("delivery-2", pull_request_id=2))
+
+    asyncio.run(main())
+
+    assert job_store.get("delivery-2") is None
+    assert job_queue.depth == 1
+
+
+def test_unfinished_jobs_of_exited_processes_are_resumed(job_store: JobStore):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    for job_id in ("orphaned", "owned"):
+        job_store.create(
+            job_id=job_id,
+            repository_name="org/repo",
+            pull_request_id=1 if job_id == "orphaned" else 2,
+            head_sha="a",
+            previous_head_sha=None,
+        )
+    job_store._connection.execute(
+        "UPDATE jobs SET owner_pid = ?, owner_token = 'exited', state = 'running'"
+        " WHERE job_id = 'orphaned'",
+        (exited.pid,),
+    )
+
+    runner = RecordingRunner(expected_count=1)
+    job_queue = JobQueue(runner=runner, job_store=job_store)
+    asyncio.run(_run_queue(job_queue, runner))
+
+    # Jobs of this process are its own to run, not orphans.
+    assert [job.delivery_id for job in runner.jobs] == ["orphaned"]
+    assert job_store.get("orphaned")["state"] == "succeeded"
+    assert job_store.get("owned")["state"] == "queued"
+
+
+def test_workers_survive_job_store_errors(job_store: JobStore, monkeypatch):
+    mark_running = job_store.mark_running
+
+    def fail_first_job(job_id: str):
+        if job_id == "delivery-1":
+            raise RuntimeError("database is locked")
+        mark_running(job_id)
+
+    monkeypatch.setattr(job_store, "mark_running", fail_first_job)
+    runner = RecordingRunner(expected_count=1)
+    job_queue = JobQueue(runner=runner, job_store=job_store, workers=1)
+
+    job_queue.submit(_job("delivery-1", pull_request_id=1))
+    job_queue.submit(_job("delivery-2", pull_request_id=2))
+    asyncio.run(_run_queue(job_queue, runner))
+
+    assert [job.delivery_id for job in runner.jobs] == ["delivery-2"]
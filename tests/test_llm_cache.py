@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from deployment_helper.core.cache import llm_cache as llm_cache_module
+from deployment_helper.core.cache.llm_cache import LlmCache
+
+
+def test_cache_is_usable_from_worker_threads(tmp_path):
+    llm_cache = LlmCache(path=str(tmp_path / "llm_cache.sqlite3"))
+
+    async def main():
+        await asyncio.gather(
+            *(
+                asyncio.to_thread(llm_cache.put, f"key-{idx}", "value")
+                for idx in range(150)
+            )
+        )
+        return await asyncio.to_thread(llm_cache.get, "key-149")
+
+    assert asyncio.run(main()) == "value"
+    assert llm_cache.stats()["hits"] == 1
+
+
+def test_unknown_cache_mode_fails_fast():
+    with pytest.raises(ValueError, match="refersh"):
+        llm_cache_module._cache_mode("refersh")
@@ -0,0 +1,84 @@
+import asyncio
+import types
+
+import pytest
+
+from deployment_helper.core import metrics
+from deployment_helper.core.stages import stage
+from deployment_helper.web import app as app_module
+from deployment_helper.web.app import collect_metrics, metrics_endpoint
+
+
+@pytest.fixture
+def registry(monkeypatch) -> metrics.Registry:
+    registry = metrics.Registry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    return registry
+
+
+def test_counters_and_gauges_render_one_sample_per_label_set(
+    registry: metrics.Registry,
+):
+    counter = metrics.Counter("requests_total", "Requests.", ("status",))
+    gauge = metrics.Gauge("queue_depth", "Waiting jobs.")
+    counter.inc(status=200)
+    counter.inc(2, status=200)
+    counter.inc(status='bad "gateway"\n')
+    gauge.set(3)
+
+    assert registry.render() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{status="200"} 3.0\n'
+        'requests_total{status="bad \\"gateway\\"\\n"} 1.0\n'
+        "# HELP queue_depth Waiting jobs.\n"
+        "# TYPE queue_depth gauge\n"
+        "queue_depth 3.0\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative(registry: metrics.Registry):
+    histogram = metrics.Histogram(
+        "duration_seconds", "Durations.", ("stage",), buckets=(1, 0.5)
+    )
+    for value in (0.2, 0.5, 0.7, 4):
+        histogram.observe(value, stage="fetch")
+
+    assert registry.render().splitlines()[2:] == [
+        'duration_seconds_bucket{stage="fetch",le="0.5"} 2',
+        'duration_seconds_bucket{stage="fetch",le="1.0"} 3',
+        'duration_seconds_bucket{stage="fetch",le="+Inf"} 4',
+        'duration_seconds_sum{stage="fetch"} 5.4',
+        'duration_seconds_count{stage="fetch"} 4',
+    ]
+
+
+def test_collectors_run_at_scrape_time(registry: metrics.Registry):
+    gauge = metrics.Gauge("queue_depth", "Waiting jobs.")
+    depths = iter([1, 5])
+    registry.add_collector(lambda: gauge.set(next(depths)))
+
+    assert "queue_depth 1.0\n" in registry.render()
+    assert "queue_depth 5.0\n" in registry.render()
+
+
+def test_metrics_endpoint_exposes_stages_and_queue_depth(monkeypatch):
+    monkeypatch.setattr(metrics.JOB_QUEUE_DEPTH, "_values", {})
+    monkeypatch.setattr(app_module, "get_blob_cache", lambda: None)
+    monkeypatch.setattr(app_module, "get_llm_cache", lambda: None)
+    app = types.SimpleNamespace(
+        ctx=types.SimpleNamespace(job_queue=types.SimpleNamespace(depth=7))
+    )
+    collect_metrics(app)
+    with stage("metrics_test"):
+        pass
+
+    response = asyncio.run(metrics_endpoint(types.SimpleNamespace()))
+
+    assert response.content_type == "text/plain; version=0.0.4; charset=utf-8"
+    body = response.body.decode()
+    assert "deployment_helper_job_queue_depth 7.0\n" in body
+    assert (
+        'deployment_helper_stage_duration_seconds_count{stage="metrics_test"} 1\n'
+        in body
+    )
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from openai import APIConnectionError
+
+from deployment_helper.core.clients import openai
+from deployment_helper.core.clients.openai import OpenAIClient, TokenBucket
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({"retry-after-ms": "1500"}, 1.5),
+        ({"retry-after": "2"}, 2.0),
+        ({"retry-after": "Thu, 01 Jan 1970 00:00:00 GMT"}, 0.0),
+        ({"retry-after": "soon"}, None),
+        ({}, None),
+    ],
+)
+def test_parse_retry_after(headers: dict, expected: float | None):
+    assert openai._parse_retry_after(headers) == expected
+
+
+def test_token_bucket_waiters_sleep_concurrently():
+    # 6000 per minute refills 100 per second.
+    bucket = TokenBucket(6000)
+
+    async def main() -> float:
+        await bucket.acquire(6000)
+        started_at = time.monotonic()
+        await asyncio.gather(bucket.acquire(10), bucket.acquire(10))
+        return time.monotonic() - started_at
+
+    # Holding the lock while sleeping would wait 0.1 + 0.2 seconds.
+    assert asyncio.run(main()) < 0.28
+
+
+def test_failed_attempts_are_refunded(monkeypatch):
+    monkeypatch.setattr(openai, "_retry_delay", lambda error, attempt: 0.0)
+    client = OpenAIClient(api_key="test", tokens_per_minute=1000, max_retries=2)
+    attempts = 0
+
+    async def create():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise APIConnectionError(request=httpx.Request("POST", "http://test"))
+        return "response"
+
+    async def main():
+        return await client.request(create, estimated_tokens=400)
+
+    assert asyncio.run(main()) == "response"
+    # Only the successful attempt keeps its reservation.
+    assert 590 <= client._token_bucket._tokens <= 610
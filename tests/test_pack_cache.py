@@ -0,0 +1,95 @@
+import asyncio
+import re
+
+import pytest
+
+from deployment_helper.core.cache.llm_cache import LlmCache
+from deployment_helper.core.llm_engine import aws_analyzer
+from deployment_helper.core.llm_engine.aws_analyzer import (
+    AwsSdkCall,
+    FileAwsSdkCalls,
+    FileAwsServices,
+    MultiFileAwsSdkCalls,
+    MultiFileAwsServices,
+)
+
+SOURCE_FILES = {
+    "a.py": "import boto3\nboto3.client('s3').get_object()\n",
+    "b.py": "import boto3\nboto3.client('sqs').send_message()\n",
+    "c.py": "import boto3\nboto3.client('sns').publish()\n",
+}
+SERVICES = {"a.py": ["s3"], "b.py": ["sqs"], "c.py": ["sns"]}
+
+
+@pytest.fixture
+def requested_files(monkeypatch, tmp_path) -> list[list[str]]:
+    llm_cache = LlmCache(path=str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(aws_analyzer, "get_llm_cache", lambda: llm_cache)
+
+    requests: list[list[str]] = []
+
+    async def invoke_structured(*, openai_api_key, user_prompt, response_format):
+        file_paths = re.findall(r"^File Path: (\S+)$", user_prompt, re.MULTILINE)
+        requests.append(file_paths)
+        if response_format is MultiFileAwsServices:
+            return MultiFileAwsServices(
+                files=[
+                    FileAwsServices(file_path=path, service_names=SERVICES[path])
+                    for path in file_paths
+                ]
+            )
+        return MultiFileAwsSdkCalls(
+            files=[
+                FileAwsSdkCalls(
+                    file_path=path,
+                    sdk_calls=[
+                        AwsSdkCall(
+                            service=SERVICES[path][0],
+                            action="Call",
+                            resource="*",
+                            reasoning="",
+                        )
+                    ],
+                )
+                for path in file_paths
+            ]
+        )
+
+    monkeypatch.setattr(aws_analyzer.openai, "invoke_structured", invoke_structured)
+    return requests
+
+
+def _analyze(file_paths: list[str]):
+    source_files = {path: SOURCE_FILES[path] for path in file_paths}
+
+    async def run():
+        service_names = await aws_analyzer.find_aws_service_names_for_files(
+            openai_api_key="test",
+            source_files=source_files,
+        )
+        sdk_calls = await aws_analyzer.find_aws_sdk_calls_for_files(
+            api_key="test",
+            source_files=source_files,
+            service_names=service_names,
+        )
+        return service_names, sdk_calls
+
+    return asyncio.run(run())
+
+
+def test_packed_files_are_cached_per_file(requested_files: list[list[str]]):
+    _analyze(["a.py", "b.py"])
+    assert requested_files == [["a.py", "b.py"], ["a.py", "b.py"]]
+
+    # A different pack only sends the files that were not analysed with the
+    # same catalog: the service names offered are the same, the actions of
+    # the pack's services are not.
+    requested_files.clear()
+    service_names, sdk_calls = _analyze(["b.py", "c.py"])
+    assert requested_files == [["c.py"], ["b.py", "c.py"]]
+    assert service_names == {"b.py": ["sqs"], "c.py": ["sns"]}
+    assert [call.service for call in sdk_calls["b.py"]] == ["sqs"]
+
+    requested_files.clear()
+    _analyze(["c.py", "b.py"])
+    assert requested_files == []
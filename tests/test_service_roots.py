@@ -0,0 +1,77 @@
+from deployment_helper.core.llm_engine.service_roots import (
+    ServiceRoots,
+    detect_service_roots,
+)
+
+FILES = {
+    # Python service importing a shared package, which imports another.
+    "services/orders/app.py": "from common.aws import storage\nimport json\n",
+    "services/orders/handlers/h.py": "import boto3\n",
+    "libs/common/__init__.py": "",
+    "libs/common/aws/__init__.py": "",
+    "libs/common/aws/storage.py": "from common.queues import publish\n",
+    "libs/common/queues/__init__.py": "",
+    "libs/common/queues/publish.py": "import boto3\n",
+    # Same-named modules in unrelated places are not imported by anyone.
+    "tools/json/encoder.py": "import boto3\n",
+    "libs/handlers/h.py": "import boto3\n",
+    # Python service importing its own module named like a shared one.
+    "services/billing/main.py": "from handlers import h\n",
+    "services/billing/handlers/h.py": "",
+    # JS service importing a scoped workspace package.
+    "services/web/index.ts": "import { put } from '@acme/shared-utils';\n",
+    "packages/shared-utils/src/put.ts": "import '../../db/client';\n",
+    "packages/db/client.ts": "export {};\n",
+    # Go service importing by module path.
+    "services/worker/main.go": 'import (\n\t"fmt"\n\t"github.com/acme/mono/libs/awsx"\n)\n',
+    "libs/awsx/client.go": "package awsx\n",
+}
+
+
+def _split() -> dict[str, set[str]]:
+    service_roots = ServiceRoots(
+        ["services/orders", "services/billing", "services/web", "services/worker"]
+    )
+    for path, content in FILES.items():
+        service_roots.add_file({"path": path, "url": path, "content": content})
+
+    results = service_roots.split_results({path: [] for path in FILES})
+    return {root: set(paths) for root, paths in results.items()}
+
+
+def test_detect_service_roots():
+    assert detect_service_roots(
+        ["Dockerfile", "a/Dockerfile", "b/serverless.yml", "c/go.mod", "d/x.py"]
+    ) == ["a", "b", "c"]
+
+
+def test_shared_imports_resolve_transitively():
+    results = _split()
+
+    assert results["services/orders"] == {
+        "services/orders/app.py",
+        "services/orders/handlers/h.py",
+        "libs/common/aws/__init__.py",
+        "libs/common/aws/storage.py",
+        "libs/common/queues/__init__.py",
+        "libs/common/queues/publish.py",
+    }
+    assert results["services/web"] == {
+        "services/web/index.ts",
+        "packages/shared-utils/src/put.ts",
+        "packages/db/client.ts",
+    }
+    assert results["services/worker"] == {
+        "services/worker/main.go",
+        "libs/awsx/client.go",
+    }
+
+
+def test_same_named_modules_are_not_shared():
+    results = _split()
+
+    assert results["services/billing"] == {
+        "services/billing/main.py",
+        "services/billing/handlers/h.py",
+    }
+    assert not any("tools/json" in path for paths in results.values() for path in paths)
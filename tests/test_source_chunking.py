@@ -0,0 +1,106 @@
+from deployment_helper.core.clients.openai import estimate_tokens
+from deployment_helper.core.llm_engine import _merge_aws_sdk_calls
+from deployment_helper.core.llm_engine.aws_analyzer import AwsSdkCall
+from deployment_helper.core.llm_engine.source_chunking import chunk_source_file
+
+PYTHON_HEADER = 'import boto3\n\ns3 = boto3.client("s3")\n'
+
+
+def _python_function(idx: int) -> str:
+    body = "".join(f"    value_{line} = {line} * {idx}\n" for line in range(8))
+    return f"\n\ndef handler_{idx}(event):\n{body}    return value_0\n"
+
+
+def _python_source(functions_count: int) -> str:
+    return PYTHON_HEADER + "".join(
+        _python_function(idx) for idx in range(functions_count)
+    )
+
+
+def test_small_files_are_not_chunked():
+    source_code = _python_source(2)
+
+    assert chunk_source_file(file_path="app.py", source_code=source_code) == [
+        source_code
+    ]
+
+
+def test_python_files_split_on_definitions_under_the_module_header():
+    chunks = chunk_source_file(
+        file_path="app.py", source_code=_python_source(12), max_tokens=200
+    )
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith(PYTHON_HEADER) for chunk in chunks)
+    assert all(estimate_tokens(chunk) <= 200 for chunk in chunks)
+    for idx in range(12):
+        # Every definition lands whole in exactly one chunk.
+        assert sum(_python_function(idx) in chunk for chunk in chunks) == 1
+
+
+def test_large_classes_split_into_methods_under_the_class_statement():
+    methods = "".join(
+        f"\n    def method_{idx}(self):\n"
+        + "".join(f"        self.value_{line} = {line}\n" for line in range(10))
+        for idx in range(8)
+    )
+    source_code = (
+        f"{PYTHON_HEADER}\n\nclass Store:\n    table_name = 'orders'\n{methods}"
+    )
+
+    chunks = chunk_source_file(
+        file_path="store.py", source_code=source_code, max_tokens=200
+    )
+
+    assert len(chunks) > 1
+    assert all("class Store:\n    table_name = 'orders'\n" in c for c in chunks)
+    for idx in range(8):
+        assert sum(f"def method_{idx}(self)" in chunk for chunk in chunks) == 1
+
+
+def test_other_languages_split_on_declarations():
+    header = "import { S3Client } from '@aws-sdk/client-s3';\n"
+    functions = [
+        f"export async function handler{idx}(event) {{\n"
+        + "".join(f"  const value{line} = event.value{line};\n" for line in range(8))
+        + "}\n"
+        for idx in range(8)
+    ]
+
+    chunks = chunk_source_file(
+        file_path="app.ts", source_code=header + "".join(functions), max_tokens=200
+    )
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith(header) for chunk in chunks)
+    for function in functions:
+        assert sum(function in chunk for chunk in chunks) == 1
+
+
+def test_python_files_that_do_not_parse_fall_back_to_declarations():
+    source_code = _python_source(12) + "\ndef broken(:\n    pass\n"
+
+    chunks = chunk_source_file(
+        file_path="app.py", source_code=source_code, max_tokens=200
+    )
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith("import boto3\n") for chunk in chunks)
+    assert sum("def broken(:" in chunk for chunk in chunks) == 1
+
+
+def test_merged_chunk_results_drop_duplicate_calls():
+    get_object = AwsSdkCall(
+        service="s3", action="GetObject", resource="*", reasoning="first chunk"
+    )
+    put_object = AwsSdkCall(
+        service="s3", action="PutObject", resource="*", reasoning="second chunk"
+    )
+    duplicate = AwsSdkCall(
+        service="s3", action="GetObject", resource="*", reasoning="second chunk"
+    )
+
+    assert _merge_aws_sdk_calls([[get_object], [duplicate, put_object]]) == [
+        get_object,
+        put_object,
+    ]
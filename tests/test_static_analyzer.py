@@ -0,0 +1,65 @@
+import pytest
+
+from deployment_helper.core.llm_engine.static_analyzer import extract_aws_sdk_calls
+
+
+def _extract(source_code: str, file_path: str = "app/handler.py"):
+    result = extract_aws_sdk_calls(file_path=file_path, source_code=source_code)
+    assert result is not None
+    return result
+
+
+def test_direct_calls_are_resolved():
+    result = _extract(
+        "import boto3\n"
+        "s3 = boto3.client('s3')\n"
+        "s3.put_object(Bucket='invoices', Key='a', Body=b'')\n"
+    )
+    assert result["fully_resolved"]
+    assert [(c.action, c.resource) for c in result["sdk_calls"]] == [
+        ("PutObject", "arn:aws:s3:::invoices/*")
+    ]
+
+
+@pytest.mark.parametrize(
+    "usage",
+    [
+        "put = s3.put_object\nput(Bucket='b', Key='k')\n",
+        "getattr(s3, 'delete_object')(Bucket='b', Key='k')\n",
+        "upload(s3)\n",
+        "def get():\n    return s3\n",
+        "class Store:\n    def __init__(self):\n        self.client = s3\n",
+    ],
+)
+def test_untracked_client_references_are_unresolved(usage: str):
+    result = _extract("import boto3\ns3 = boto3.client('s3')\n" + usage)
+    assert not result["fully_resolved"]
+
+
+def test_client_exceptions_stay_resolved():
+    result = _extract(
+        "import boto3\n"
+        "s3 = boto3.client('s3')\n"
+        "try:\n"
+        "    s3.get_object(Bucket='invoices', Key='a')\n"
+        "except s3.exceptions.NoSuchKey:\n"
+        "    pass\n"
+    )
+    assert result["fully_resolved"]
+
+
+@pytest.mark.parametrize(
+    "file_path, bucket",
+    [
+        ("app/handler.py", "my-bucket"),
+        ("app/handler.py", "example-bucket"),
+        ("tests/test_handler.py", "invoices"),
+    ],
+)
+def test_placeholder_and_test_resources_are_unscoped(file_path: str, bucket: str):
+    result = _extract(
+        f"import boto3\nboto3.client('s3').list_objects_v2(Bucket='{bucket}')\n",
+        file_path,
+    )
+    [sdk_call] = result["sdk_calls"]
+    assert bucket not in sdk_call.resource